@@ -1,4 +1,9 @@
-"""ASGI config for cleaning_site project."""
+"""ASGI config for cleaning_site project.
+
+Serve the site through this application (for example
+``uvicorn cleaning_site.asgi:application``) to enable the live booking
+stream at ``/live/bookings/``.
+"""
 
 import os
 
@@ -26,6 +26,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "scheduler.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -55,9 +56,22 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+    },
+    # Optional home for admin page views and request profiles, used only once
+    # SCHEDULER_TELEMETRY_DB is set; see scheduler/telemetry.py.
+    "telemetry": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "telemetry.sqlite3",
+    },
 }
 
+DATABASE_ROUTERS = ["scheduler.telemetry.TelemetryRouter"]
+
+# The roster and availability caches coordinate through version numbers in
+# the default cache. The local-memory default is only correct for a single
+# process; configure a shared backend (Redis, Memcached) when running more.
+# See scheduler/roster.py and scheduler/availability.py.
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -87,6 +101,16 @@ STATICFILES_DIRS = [BASE_DIR / "scheduler" / "static"]
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Opt-in request profiling; see scheduler/profiling.py.
+SCHEDULER_PROFILING = {
+    "SAMPLE_RATE": 0.0,
+    "THRESHOLD_MS": 500,
+}
+
+# Run ``migrate --database telemetry`` before uncommenting.
+# SCHEDULER_TELEMETRY_DB = "telemetry"
+SCHEDULER_TELEMETRY_RETENTION_DAYS = 90
+
 LOGIN_REDIRECT_URL = "dashboard"
 LOGOUT_REDIRECT_URL = "landing"
 LOGIN_URL = "login"
@@ -1,15 +1,46 @@
+import hashlib
+import json
 from datetime import datetime, timedelta
 
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.admin import AdminSite
-from django.contrib.auth import get_user_model
-from django.db.models import Avg, Count, F, Q
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Q, Sum
 from django.db.models.expressions import ExpressionWrapper
 from django.db.models.fields import DurationField
-from django.db.models.functions import ExtractHour, ExtractWeekDay, TruncWeek
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
 from django.utils import timezone
-
-from .models import AdminPageView, Application, Booking, Worker, SERVICE_CHOICES
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date
+from django.utils.html import format_html, format_html_join
+
+from .analytics import CACHE_SECONDS, AnalyticsQueryError, build_series
+from .archive import count_sources
+from .capacity import build_forecast
+from .clients import cohort_report
+from .geo import plan_day_route
+from .ical import feed_url as ical_feed_url
+from .live import publish_booking
+from .models import (
+    AdminPageView,
+    Application,
+    ArchivedBooking,
+    Booking,
+    ClientProfile,
+    RequestProfile,
+    SERVICE_CHOICES,
+    Worker,
+)
+from .profiling import COOKIE_NAME as PROFILE_COOKIE_NAME
+from .profiling import SESSION_KEY as PROFILE_SESSION_KEY
+from .profiling import decompress_stats
+from .profiling import get_setting as get_profiling_setting
+from .snapshot import load as load_snapshot
 
 
 class BookingAdmin(admin.ModelAdmin):
@@ -24,6 +55,27 @@ class BookingAdmin(admin.ModelAdmin):
     list_filter = ("status", "worker_response", "service_type")
     search_fields = ("user__username", "address", "service_type")
     ordering = ("-scheduled_for",)
+    list_select_related = ("user", "worker")
+
+    def save_model(self, request, obj, form, change):
+        if change and "address" in form.changed_data and not (
+            {"latitude", "longitude"} & set(form.changed_data)
+        ):
+            # Re-geocode the new address instead of keeping stale coordinates.
+            obj.latitude = obj.longitude = None
+        super().save_model(request, obj, form, change)
+        # changeform_view runs in a transaction, so the event commits with the save.
+        publish_booking(obj, "booking.updated" if change else "booking.created")
+
+    def delete_model(self, request, obj):
+        publish_booking(obj, "booking.deleted")
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            for booking in queryset:
+                publish_booking(booking, "booking.deleted")
+            super().delete_queryset(request, queryset)
 
 
 class WorkerAdmin(admin.ModelAdmin):
@@ -34,17 +86,29 @@ class WorkerAdmin(admin.ModelAdmin):
         "contact_email",
         "phone_number",
         "is_active",
+        "booking_count",
     )
     list_filter = ("service_focus", "is_active")
     search_fields = ("name", "headline", "contact_email", "phone_number")
     change_form_template = "admin/scheduler/worker/change_form.html"
 
+    def save_model(self, request, obj, form, change):
+        if change and "home_base" in form.changed_data and not (
+            {"home_latitude", "home_longitude"} & set(form.changed_data)
+        ):
+            obj.home_latitude = obj.home_longitude = None
+        if change and "photo_url" in form.changed_data:
+            # Rebuilt from the new photo by the next build_thumbnails run.
+            obj.photo_thumb = ""
+        super().save_model(request, obj, form, change)
+
     def changeform_view(self, request, object_id=None, form_url="", extra_context=None):
         extra_context = extra_context or {}
         upcoming = []
         past_due = []
         week_days = []
         week_total = 0
+        route = None
         if object_id:
             now = timezone.now()
             schedule_qs = (
@@ -74,17 +138,192 @@ class WorkerAdmin(admin.ModelAdmin):
                 week_total += 1
 
             week_days = [{"date": day, "bookings": week_day_map.get(day, [])} for day in calendar_dates]
+
+            try:
+                route_date = parse_date(request.GET.get("route_date") or "")
+            except ValueError:
+                route_date = None
+            route_date = route_date or local_now.date()
+            route_start = timezone.make_aware(
+                datetime.combine(route_date, datetime.min.time()), tz
+            )
+            worker = Worker.objects.filter(pk=object_id).first()
+            if worker is not None:
+                day_bookings = list(
+                    schedule_qs.filter(
+                        scheduled_for__gte=route_start,
+                        scheduled_for__lt=route_start + timedelta(days=1),
+                    ).exclude(status="cancelled")
+                )
+                stops, total_km, unlocated = plan_day_route(worker, day_bookings)
+                route = {
+                    "date": route_date,
+                    "previous": route_date - timedelta(days=1),
+                    "next": route_date + timedelta(days=1),
+                    "stops": stops,
+                    "total_km": total_km,
+                    "unlocated": unlocated,
+                    "has_home": worker.home_latitude is not None,
+                }
         extra_context.update(
             {
+                "worker_route": route,
                 "worker_upcoming_schedule": upcoming,
                 "worker_recent_history": past_due,
                 "worker_week_days": week_days,
                 "worker_week_total": week_total,
+                "worker_calendar_url": (
+                    request.build_absolute_uri(ical_feed_url(object_id)) if object_id else None
+                ),
             }
         )
         return super().changeform_view(request, object_id, form_url, extra_context)
 
 
+class ArchivedBookingAdmin(admin.ModelAdmin):
+    list_display = (
+        "service_type",
+        "user",
+        "scheduled_for",
+        "status",
+        "worker",
+        "archived_at",
+    )
+    list_filter = ("status", "service_type")
+    search_fields = ("user__username", "address")
+    ordering = ("-scheduled_for",)
+    list_select_related = ("user", "worker")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        "path",
+        "method",
+        "duration_ms",
+        "status_code",
+        "trigger",
+        "hottest_function",
+        "user",
+        "created_at",
+    )
+    list_filter = ("trigger", "method", "status_code")
+    search_fields = ("path",)
+    ordering = ("-duration_ms",)
+    # Profiles may live in the telemetry database, so users cannot be joined in.
+    list_select_related = False
+    exclude = ("stats", "top_functions")
+    readonly_fields = (
+        "method",
+        "path",
+        "status_code",
+        "duration_ms",
+        "trigger",
+        "user",
+        "created_at",
+        "top_functions_table",
+        "download_link",
+    )
+    change_list_template = "admin/scheduler/requestprofile/change_list.html"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        # The compressed stats are only read by the download view.
+        return super().get_queryset(request).defer("stats").prefetch_related("user")
+
+    def get_urls(self):
+        info = self.opts.app_label, self.opts.model_name
+        urls = [
+            path(
+                "toggle/",
+                self.admin_site.admin_view(self.toggle_view),
+                name="%s_%s_toggle" % info,
+            ),
+            path(
+                "<int:object_id>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="%s_%s_download" % info,
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        extra_context.update(
+            {
+                "profiling_enabled": bool(request.session.get(PROFILE_SESSION_KEY)),
+                "profiling_sample_rate": get_profiling_setting("SAMPLE_RATE"),
+                "profiling_threshold_ms": get_profiling_setting("THRESHOLD_MS"),
+            }
+        )
+        return super().changelist_view(request, extra_context)
+
+    def toggle_view(self, request):
+        info = self.opts.app_label, self.opts.model_name
+        response = redirect("%s:%s_%s_changelist" % ((self.admin_site.name,) + info))
+        if request.method == "POST":
+            enabled = not request.session.get(PROFILE_SESSION_KEY)
+            request.session[PROFILE_SESSION_KEY] = enabled
+            if enabled:
+                # The session stays authoritative; the cookie only tells the
+                # middleware the session is worth reading.
+                response.set_cookie(PROFILE_COOKIE_NAME, "1", httponly=True, samesite="Lax")
+                messages.info(request, "Every request in this session will now be profiled.")
+            else:
+                response.delete_cookie(PROFILE_COOKIE_NAME, samesite="Lax")
+                messages.info(request, "Profiling is off for this session.")
+        return response
+
+    def download_view(self, request, object_id):
+        profile = get_object_or_404(RequestProfile, pk=object_id)
+        response = HttpResponse(
+            decompress_stats(profile.stats), content_type="application/octet-stream"
+        )
+        response["Content-Disposition"] = f'attachment; filename="request-{profile.pk}.prof"'
+        return response
+
+    @admin.display(description="Hottest function")
+    def hottest_function(self, obj):
+        # Skip the middleware and handler frames that wrap every request.
+        for row in obj.top_functions:
+            if "/django/" not in row["location"] and "profiling.py" not in row["location"]:
+                return f"{row['function']} ({row['cumtime_ms']} ms)"
+        return "-"
+
+    @admin.display(description="Top cumulative functions")
+    def top_functions_table(self, obj):
+        rows = format_html_join(
+            "",
+            "<tr><td>{}</td><td>{}</td><td class=\"text-end\">{}</td>"
+            "<td class=\"text-end\">{}</td><td class=\"text-end\">{}</td></tr>",
+            (
+                (row["function"], row["location"], row["calls"], row["tottime_ms"], row["cumtime_ms"])
+                for row in obj.top_functions
+            ),
+        )
+        return format_html(
+            "<table><thead><tr><th>Function</th><th>Location</th><th>Calls</th>"
+            "<th>Own ms</th><th>Cumulative ms</th></tr></thead><tbody>{}</tbody></table>",
+            rows,
+        )
+
+    @admin.display(description="Full profile")
+    def download_link(self, obj):
+        info = self.opts.app_label, self.opts.model_name
+        url = reverse("%s:%s_%s_download" % ((self.admin_site.name,) + info), args=[obj.pk])
+        return format_html('<a href="{}">Download .prof</a> (open with pstats or snakeviz)', url)
+
+
 @admin.register(Application)
 class ApplicationAdmin(admin.ModelAdmin):
     list_display = ("full_name", "email", "phone", "created_at", "reviewed")
@@ -103,6 +342,94 @@ class SuperuserAdminSite(AdminSite):
     def has_permission(self, request):
         return bool(request.user and request.user.is_active and request.user.is_superuser)
 
+    def get_urls(self):
+        urls = [
+            path(
+                "analytics/<slug:series>/",
+                self.admin_view(self.analytics_view, cacheable=True),
+                name="analytics_series",
+            ),
+            path(
+                "reports/capacity/",
+                self.admin_view(self.capacity_report_view),
+                name="capacity_report",
+            ),
+            path(
+                "reports/cohorts/",
+                self.admin_view(self.cohort_report_view),
+                name="cohort_report",
+            ),
+            path(
+                "reports/snapshot/",
+                self.admin_view(self.snapshot_report_view),
+                name="snapshot_report",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def capacity_report_view(self, request):
+        try:
+            weeks = min(max(int(request.GET.get("weeks", 4)), 1), 12)
+        except ValueError:
+            weeks = 4
+        context = {
+            **self.each_context(request),
+            "title": "Capacity forecast",
+            "forecast": build_forecast(weeks=weeks),
+            "week_options": [2, 4, 6, 8, 12],
+        }
+        return TemplateResponse(request, "admin/capacity_report.html", context)
+
+    def cohort_report_view(self, request):
+        try:
+            months = min(max(int(request.GET.get("months", 12)), 1), 36)
+        except ValueError:
+            months = 12
+        context = {
+            **self.each_context(request),
+            "title": "Client cohorts",
+            "report": cohort_report(months=months),
+            "month_options": [6, 12, 24, 36],
+        }
+        return TemplateResponse(request, "admin/cohort_report.html", context)
+
+    def snapshot_report_view(self, request):
+        # Read from the memory-mapped snapshot; the database is never queried.
+        snapshot = load_snapshot()
+        context = {**self.each_context(request), "title": "Booking snapshot", "snapshot": snapshot}
+        if snapshot is not None:
+            context.update(
+                {
+                    "metrics": snapshot.dashboard_metrics(),
+                    "lead_by_service": snapshot.lead_time_by_service(),
+                    "rush_by_hour": snapshot.rush_ratio_by_hour(),
+                    "cancellations_by_age": snapshot.cancellations_by_client_age(),
+                }
+            )
+        return TemplateResponse(request, "admin/snapshot_report.html", context)
+
+    def analytics_view(self, request, series):
+        """Serve one dashboard chart series as JSON for async loading."""
+        try:
+            payload = build_series(
+                series,
+                start=request.GET.get("start"),
+                end=request.GET.get("end"),
+                tz_name=request.GET.get("tz"),
+                granularity=request.GET.get("granularity", "week"),
+            )
+        except AnalyticsQueryError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+
+        body = json.dumps(payload, cls=DjangoJSONEncoder)
+        etag = '"%s"' % hashlib.md5(body.encode()).hexdigest()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, max_age=CACHE_SECONDS)
+        return response
+
     def index(self, request, extra_context=None):
         extra_context = extra_context or {}
         now = timezone.now()
@@ -110,11 +437,15 @@ class SuperuserAdminSite(AdminSite):
         last_30 = now - timedelta(days=30)
         last_7 = now - timedelta(days=7)
 
+        include_archived = request.GET.get("include_archived") == "1"
+        sources = count_sources(include_archived)
+
         bookings_qs = Booking.objects.select_related("worker", "user")
-        total_bookings = bookings_qs.count()
+        total_bookings = sum(source.count() for source in sources)
         status_map = {key: 0 for key, _ in Booking.STATUS_CHOICES}
-        for row in bookings_qs.values("status").annotate(total=Count("id")):
-            status_map[row["status"]] = row["total"]
+        for source in sources:
+            for row in source.values("status").annotate(total=Count("id")):
+                status_map[row["status"]] += row["total"]
         status_summary = []
         for code, label in Booking.STATUS_CHOICES:
             total = status_map.get(code, 0)
@@ -122,8 +453,9 @@ class SuperuserAdminSite(AdminSite):
             status_summary.append({"code": code, "label": label, "total": total, "percent": percent})
 
         service_map = {key: 0 for key, _ in SERVICE_CHOICES}
-        for row in bookings_qs.values("service_type").annotate(total=Count("id")):
-            service_map[row["service_type"]] = row["total"]
+        for source in sources:
+            for row in source.values("service_type").annotate(total=Count("id")):
+                service_map[row["service_type"]] += row["total"]
         service_summary = []
         for code, label in SERVICE_CHOICES:
             total = service_map.get(code, 0)
@@ -143,7 +475,7 @@ class SuperuserAdminSite(AdminSite):
             round((recent_cancelled / recent_total) * 100, 1) if recent_total else 0
         )
 
-        rush_total = bookings_qs.filter(rush_cleaning=True).count()
+        rush_total = sum(source.filter(rush_cleaning=True).count() for source in sources)
         upcoming_qs = bookings_qs.filter(scheduled_for__range=(now, next_week)).order_by(
             "scheduled_for"
         )
@@ -163,30 +495,21 @@ class SuperuserAdminSite(AdminSite):
         avg_lead_seconds = lead_agg["avg_lead"].total_seconds() if lead_agg["avg_lead"] else 0
         avg_lead_days = round(avg_lead_seconds / 86400, 1) if avg_lead_seconds else 0
 
-        worker_rankings = (
-            Worker.objects.filter(is_active=True)
-            .annotate(
-                booking_total=Count("bookings"),
-                upcoming_total=Count(
-                    "bookings",
-                    filter=Q(bookings__scheduled_for__range=(now, next_week)),
-                ),
-            )
-            .order_by("-booking_total", "name")[:6]
+        upcoming_by_worker = dict(
+            upcoming_qs.filter(worker__isnull=False)
+            .order_by()
+            .values("worker_id")
+            .annotate(total=Count("id"))
+            .values_list("worker_id", "total")
         )
-
-        worker_utilization_qs = (
-            Worker.objects.filter(is_active=True)
-            .annotate(
-                upcoming_total=Count(
-                    "bookings",
-                    filter=Q(bookings__scheduled_for__range=(now, next_week)),
-                ),
-                lifetime_total=Count("bookings"),
-            )
-            .order_by("name")
+        # Lifetime totals are denormalized onto Worker (see scheduler.counters),
+        # so rankings are an indexed ORDER BY rather than a COUNT over the join.
+        worker_rankings = list(
+            Worker.objects.filter(is_active=True).order_by("-booking_count", "name")[:6]
         )
-        worker_utilization = list(worker_utilization_qs)
+        worker_utilization = list(Worker.objects.filter(is_active=True).order_by("name"))
+        for worker in (*worker_rankings, *worker_utilization):
+            worker.upcoming_total = upcoming_by_worker.get(worker.pk, 0)
         idle_workers = [worker for worker in worker_utilization if worker.upcoming_total == 0]
 
         assigned_next_week = (
@@ -208,69 +531,31 @@ class SuperuserAdminSite(AdminSite):
                 schedule_map[booking.worker_id] = entry
             entry["bookings"].append(booking)
 
-        User = get_user_model()
-        new_users = User.objects.filter(date_joined__gte=last_30).count()
-        total_clients = bookings_qs.values("user").distinct().count()
-        repeat_clients = (
-            bookings_qs.values("user").annotate(total=Count("id")).filter(total__gt=1).count()
+        # Client metrics read the per-client summary table (see
+        # scheduler.clients); it always includes archived history.
+        client_stats = ClientProfile.objects.aggregate(
+            new_users=Count("pk", filter=Q(signed_up_at__gte=last_30)),
+            total_clients=Count("pk", filter=Q(booking_count__gt=0)),
+            repeat_clients=Count("pk", filter=Q(booking_count__gt=1)),
+            new_client_bookings=Coalesce(
+                Sum("booking_count", filter=Q(signed_up_at__gte=last_30)), 0
+            ),
+            new_client_cancellations=Coalesce(
+                Sum("cancelled_count", filter=Q(signed_up_at__gte=last_30)), 0
+            ),
         )
+        new_users = client_stats["new_users"]
+        total_clients = client_stats["total_clients"]
+        repeat_clients = client_stats["repeat_clients"]
         repeat_rate = round((repeat_clients / total_clients) * 100, 1) if total_clients else 0
-        new_client_cancellations = bookings_qs.filter(
-            status="cancelled", user__date_joined__gte=last_30
-        ).count()
-        new_client_bookings = bookings_qs.filter(user__date_joined__gte=last_30).count()
+        new_client_cancellations = client_stats["new_client_cancellations"]
+        new_client_bookings = client_stats["new_client_bookings"]
         new_client_cancellation_rate = (
             round((new_client_cancellations / new_client_bookings) * 100, 1)
             if new_client_bookings
             else 0
         )
 
-        recent_bookings = bookings_qs.filter(scheduled_for__gte=last_30)
-        weekday_lookup = [
-            "Sunday",
-            "Monday",
-            "Tuesday",
-            "Wednesday",
-            "Thursday",
-            "Friday",
-            "Saturday",
-        ]
-        weekday_data = {
-            row["weekday"]: row["total"]
-            for row in recent_bookings.annotate(weekday=ExtractWeekDay("scheduled_for")).values("weekday").annotate(total=Count("id"))
-        }
-        weekday_mix = [
-            {"label": weekday_lookup[i - 1], "total": weekday_data.get(i, 0)}
-            for i in range(1, 8)
-        ]
-        weekday_peak = max((item["total"] for item in weekday_mix), default=0)
-
-        hour_data = {
-            row["hour"]: row["total"]
-            for row in recent_bookings.annotate(hour=ExtractHour("scheduled_for")).values("hour").annotate(total=Count("id"))
-        }
-        hourly_mix = [
-            {"label": f"{hour:02d}:00", "total": hour_data.get(hour, 0)}
-            for hour in range(0, 24)
-        ]
-        hourly_peak = max((item["total"] for item in hourly_mix), default=0)
-
-        rush_trend = []
-        trend_start = now - timedelta(weeks=12)
-        weekly_rush = (
-            bookings_qs.filter(created_at__gte=trend_start)
-            .annotate(week=TruncWeek("created_at"))
-            .values("week")
-            .annotate(
-                total=Count("id"),
-                rush=Count("id", filter=Q(rush_cleaning=True)),
-            )
-            .order_by("week")
-        )
-        for row in weekly_rush:
-            ratio = round((row["rush"] / row["total"]) * 100, 1) if row["total"] else 0
-            rush_trend.append({"week": row["week"], "total": row["total"], "rush": row["rush"], "ratio": ratio})
-
         # Track admin dashboard page views, similar to an on-page SEO report
         if request.method == "GET":
             session_key = request.session.session_key or ""
@@ -284,27 +569,22 @@ class SuperuserAdminSite(AdminSite):
                 path=request.path,
             )
 
-        page_views_qs = AdminPageView.objects.filter(path=request.path)
-        page_view_total = page_views_qs.count()
-        page_view_30 = page_views_qs.filter(viewed_at__gte=last_30).count()
-        page_view_7 = page_views_qs.filter(viewed_at__gte=last_7).count()
-        unique_admins_30 = (
-            page_views_qs.filter(viewed_at__gte=last_30, user__isnull=False)
-            .values("user")
-            .distinct()
-            .count()
-        )
-        unique_sessions_30 = (
-            page_views_qs.filter(viewed_at__gte=last_30)
-            .exclude(session_key="")
-            .values("session_key")
-            .distinct()
-            .count()
+        # One aggregate against the telemetry database, when enabled.
+        recent = Q(viewed_at__gte=last_30)
+        page_views = AdminPageView.objects.filter(path=request.path).aggregate(
+            total=Count("pk"),
+            last_30=Count("pk", filter=recent),
+            last_7=Count("pk", filter=Q(viewed_at__gte=last_7)),
+            unique_admins_30=Count("user", distinct=True, filter=recent),
+            unique_sessions_30=Count(
+                "session_key", distinct=True, filter=recent & ~Q(session_key="")
+            ),
+            last_viewed_at=Max("viewed_at"),
         )
-        last_page_view = page_views_qs.order_by("-viewed_at").first()
 
         extra_context.update(
             {
+                "include_archived": include_archived,
                 "total_bookings": total_bookings,
                 "status_summary": status_summary,
                 "service_summary": service_summary,
@@ -327,19 +607,15 @@ class SuperuserAdminSite(AdminSite):
                 "new_client_cancellations": new_client_cancellations,
                 "new_client_cancellation_rate": new_client_cancellation_rate,
                 "worker_utilization": worker_utilization,
+                "now": now,
                 "idle_workers": idle_workers,
                 "worker_schedules": worker_schedules,
-                "weekday_mix": weekday_mix,
-                "weekday_peak": weekday_peak,
-                "hourly_mix": hourly_mix,
-                "hourly_peak": hourly_peak,
-                "rush_trend": rush_trend,
-                "page_view_total": page_view_total,
-                "page_view_30": page_view_30,
-                "page_view_7": page_view_7,
-                "unique_admins_30": unique_admins_30,
-                "unique_sessions_30": unique_sessions_30,
-                "last_page_view": last_page_view,
+                "page_view_total": page_views["total"],
+                "page_view_30": page_views["last_30"],
+                "page_view_7": page_views["last_7"],
+                "unique_admins_30": page_views["unique_admins_30"],
+                "unique_sessions_30": page_views["unique_sessions_30"],
+                "last_page_view_at": page_views["last_viewed_at"],
             }
         )
 
@@ -349,3 +625,5 @@ class SuperuserAdminSite(AdminSite):
 admin_site = SuperuserAdminSite(name="superuser_admin")
 admin_site.register(Booking, BookingAdmin)
 admin_site.register(Worker, WorkerAdmin)
+admin_site.register(ArchivedBooking, ArchivedBookingAdmin)
+admin_site.register(RequestProfile, RequestProfileAdmin)
@@ -0,0 +1,184 @@
+"""Time-series analytics behind the concierge dashboard charts.
+
+Every series is derived from hourly buckets aggregated in the database in the
+requested local timezone. The buckets are cached, so the weekday histogram,
+the hourly histogram and the rush trend for the same window share one query.
+"""
+
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Booking
+
+SERIES = ("weekday_mix", "hourly_mix", "rush_trend")
+GRANULARITIES = ("hour", "day", "week", "month")
+WEEKDAY_LABELS = [
+    "Sunday",
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+]
+MAX_RANGE = timedelta(days=366)
+CACHE_SECONDS = 60
+
+# Histograms describe when visits happen, the rush trend describes when
+# requests come in.
+SERIES_FIELDS = {
+    "weekday_mix": "scheduled_for",
+    "hourly_mix": "scheduled_for",
+    "rush_trend": "created_at",
+}
+SERIES_DEFAULT_SPAN = {
+    "weekday_mix": timedelta(days=30),
+    "hourly_mix": timedelta(days=30),
+    "rush_trend": timedelta(weeks=12),
+}
+
+
+class AnalyticsQueryError(ValueError):
+    """Raised when analytics parameters cannot be interpreted."""
+
+
+def resolve_timezone(name):
+    if not name:
+        return timezone.get_current_timezone()
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise AnalyticsQueryError(f"Unknown timezone: {name}")
+
+
+def parse_bound(value, tz, *, end=False):
+    """Parse an ISO date or datetime into an aware datetime in ``tz``.
+
+    A bare date used as the end bound includes that whole day.
+    """
+    if not value:
+        return None
+    # Both parsers raise ValueError for well-formed but impossible values.
+    try:
+        moment = parse_datetime(value)
+        day = parse_date(value) if moment is None else None
+    except ValueError:
+        day = moment = None
+    if moment is None:
+        if day is None:
+            raise AnalyticsQueryError(f"Invalid date: {value}")
+        if end:
+            day += timedelta(days=1)
+        moment = datetime.combine(day, datetime.min.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, tz)
+    return moment
+
+
+def hourly_buckets(field, tz, start, end=None):
+    """Return ``[(local_hour, total, rush), ...]`` for bookings in the window."""
+    cache_key = "analytics:buckets:{}:{}:{}:{}".format(
+        field, tz, start.isoformat(), end.isoformat() if end else ""
+    )
+    buckets = cache.get(cache_key)
+    if buckets is not None:
+        return buckets
+    bookings = Booking.objects.filter(**{f"{field}__gte": start})
+    if end is not None:
+        bookings = bookings.filter(**{f"{field}__lt": end})
+    rows = (
+        bookings.annotate(bucket=TruncHour(field, tzinfo=tz))
+        .values("bucket")
+        .annotate(total=Count("id"), rush=Count("id", filter=Q(rush_cleaning=True)))
+        .order_by("bucket")
+    )
+    buckets = [
+        (timezone.localtime(row["bucket"], tz), row["total"], row["rush"]) for row in rows
+    ]
+    cache.set(cache_key, buckets, CACHE_SECONDS)
+    return buckets
+
+
+def truncate(moment, granularity):
+    if granularity == "hour":
+        return moment
+    moment = moment.replace(hour=0)
+    if granularity == "week":
+        return moment - timedelta(days=moment.weekday())
+    if granularity == "month":
+        return moment.replace(day=1)
+    return moment
+
+
+def weekday_mix(buckets):
+    totals = [0] * 7
+    for moment, total, _rush in buckets:
+        totals[moment.isoweekday() % 7] += total
+    return [{"label": WEEKDAY_LABELS[i], "total": totals[i]} for i in range(7)]
+
+
+def hourly_mix(buckets):
+    totals = [0] * 24
+    for moment, total, _rush in buckets:
+        totals[moment.hour] += total
+    return [{"label": f"{hour:02d}:00", "total": totals[hour]} for hour in range(24)]
+
+
+def rush_trend(buckets, granularity):
+    rolled = {}
+    for moment, total, rush in buckets:
+        key = truncate(moment, granularity)
+        current = rolled.setdefault(key, [0, 0])
+        current[0] += total
+        current[1] += rush
+    points = []
+    for key in sorted(rolled):
+        total, rush = rolled[key]
+        ratio = round((rush / total) * 100, 1) if total else 0
+        points.append(
+            {"period": key.isoformat(), "total": total, "rush": rush, "ratio": ratio}
+        )
+    return points
+
+
+def build_series(series, *, start=None, end=None, tz_name=None, granularity="week"):
+    """Compute one dashboard series as a JSON-serialisable dict."""
+    if series not in SERIES:
+        raise AnalyticsQueryError(f"Unknown series: {series}")
+    if granularity not in GRANULARITIES:
+        raise AnalyticsQueryError(f"Unknown granularity: {granularity}")
+    tz = resolve_timezone(tz_name)
+    start_at = parse_bound(start, tz)
+    end_at = parse_bound(end, tz, end=True)
+    if start_at is None:
+        # Snap the default window to the hour so repeated polls share a cache key.
+        anchor = (end_at or timezone.now()).replace(minute=0, second=0, microsecond=0)
+        start_at = anchor - SERIES_DEFAULT_SPAN[series]
+    if end_at is not None and end_at <= start_at:
+        raise AnalyticsQueryError("The end of the range must be after its start.")
+    # An open-ended range still has to start within MAX_RANGE of now.
+    if (end_at or timezone.now()) - start_at > MAX_RANGE:
+        raise AnalyticsQueryError("Ranges are limited to 366 days.")
+
+    buckets = hourly_buckets(SERIES_FIELDS[series], tz, start_at, end_at)
+    if series == "weekday_mix":
+        points = weekday_mix(buckets)
+    elif series == "hourly_mix":
+        points = hourly_mix(buckets)
+    else:
+        points = rush_trend(buckets, granularity)
+    return {
+        "series": series,
+        "timezone": str(tz),
+        "start": start_at.isoformat(),
+        "end": end_at.isoformat() if end_at else None,
+        "granularity": granularity if series == "rush_trend" else "hour",
+        "points": points,
+        "peak": max((point["total"] for point in points), default=0),
+    }
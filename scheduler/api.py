@@ -0,0 +1,310 @@
+"""Read-only JSON API for bookings, booking events and the worker roster.
+
+Lists use keyset pagination on a stable ordering, so each page is a single
+indexed range read whatever the page depth. Every response carries a strong
+ETag built from the collection's ``updated_at`` watermark and row count; a
+poll whose ETag still matches is answered with ``304 Not Modified`` before
+any rows are read or serialized.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, Q
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.views import View
+
+from . import events, roster
+from .models import Booking
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Public field name -> model column.
+BOOKING_FIELDS = {
+    "id": "id",
+    "service_type": "service_type",
+    "scheduled_for": "scheduled_for",
+    "address": "address",
+    "notes": "notes",
+    "worker": "worker_id",
+    "rush_cleaning": "rush_cleaning",
+    "status": "status",
+    "worker_response": "worker_response",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+STAFF_BOOKING_FIELDS = {**BOOKING_FIELDS, "user": "user_id"}
+WORKER_FIELDS = {
+    **{name: name for name in roster.RECORD_FIELDS if name != "photo_thumb"},
+    "photo_thumbnail": "photo_thumbnail",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_cursor(values):
+    # Full-precision isoformat: DjangoJSONEncoder truncates to milliseconds,
+    # which would skip rows sharing the truncated timestamp.
+    raw = json.dumps(values, default=lambda value: value.isoformat(), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError):
+        raise ApiError("Invalid cursor.")
+    if not isinstance(values, list):
+        raise ApiError("Invalid cursor.")
+    return values
+
+
+def parse_moment(value):
+    """An aware datetime from an ISO 8601 string, or ``None`` if it is not one."""
+    if not isinstance(value, str):
+        return None
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        return None
+    if moment is not None and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class ApiView(View):
+    """Session-authenticated, read-only JSON endpoint."""
+
+    http_method_names = ["get", "head", "options"]
+    staff_only = False
+    field_map = {}
+
+    def dispatch(self, request, *args, **kwargs):
+        user = request.user
+        if not user.is_authenticated:
+            return JsonResponse({"error": "Authentication required."}, status=401)
+        if self.staff_only and not (user.is_staff or user.is_superuser):
+            return JsonResponse({"error": "Staff access required."}, status=403)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as exc:
+            return JsonResponse({"error": str(exc)}, status=exc.status)
+
+    def get_fields(self):
+        requested = self.request.GET.get("fields")
+        if not requested:
+            return list(self.field_map)
+        fields = [name.strip() for name in requested.split(",") if name.strip()]
+        unknown = [name for name in fields if name not in self.field_map]
+        if unknown:
+            raise ApiError(f"Unknown field(s): {', '.join(unknown)}")
+        return fields
+
+    def get_page_size(self):
+        try:
+            size = int(self.request.GET.get("limit", DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise ApiError("limit must be an integer.")
+        return min(max(size, 1), MAX_PAGE_SIZE)
+
+    def get_etag(self, watermark):
+        params = sorted(self.request.GET.lists())
+        scope = [self.request.path, self.request.user.pk, params, watermark]
+        digest = hashlib.sha1(json.dumps(scope, default=str).encode()).hexdigest()
+        return f'"{digest}"'
+
+    def respond(self, etag, build_payload):
+        response = get_conditional_response(self.request, etag=etag)
+        if response is None:
+            body = json.dumps(build_payload(), cls=DjangoJSONEncoder)
+            response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def page_links(self, next_cursor):
+        if next_cursor is None:
+            return None
+        query = self.request.GET.copy()
+        query["cursor"] = next_cursor
+        return f"{self.request.path}?{query.urlencode()}"
+
+
+class KeysetListView(ApiView):
+    """Cursor-paginated list over a queryset ordered by ``ordering``."""
+
+    model = Booking
+    ordering = ("scheduled_for", "id")
+
+    def get_queryset(self):
+        return self.model.objects.all()
+
+    def after_cursor(self, queryset, cursor):
+        values = decode_cursor(cursor)
+        if len(values) != len(self.ordering):
+            raise ApiError("Invalid cursor.")
+        first, last = self.ordering
+        moment = parse_moment(values[0])
+        if moment is None or not is_id(values[1]):
+            raise ApiError("Invalid cursor.")
+        return queryset.filter(
+            Q(**{f"{first}__gt": moment}) | Q(**{first: moment, f"{last}__gt": values[1]})
+        )
+
+    def get(self, request, *args, **kwargs):
+        fields = self.get_fields()
+        page_size = self.get_page_size()
+        queryset = self.get_queryset()
+
+        watermark = queryset.aggregate(latest=Max("updated_at"), total=Count("id"))
+        etag = self.get_etag([watermark["latest"], watermark["total"]])
+
+        def build_payload():
+            page_qs = queryset
+            cursor = request.GET.get("cursor")
+            if cursor:
+                page_qs = self.after_cursor(page_qs, cursor)
+            columns = {self.field_map[name] for name in fields} | set(self.ordering)
+            rows = list(page_qs.order_by(*self.ordering).values(*columns)[: page_size + 1])
+            next_cursor = None
+            if len(rows) > page_size:
+                rows = rows[:page_size]
+                next_cursor = encode_cursor([rows[-1][key] for key in self.ordering])
+            return {
+                "results": [
+                    {name: row[self.field_map[name]] for name in fields} for row in rows
+                ],
+                "next": self.page_links(next_cursor),
+            }
+
+        return self.respond(etag, build_payload)
+
+
+class BookingListAPIView(KeysetListView):
+    """The signed-in customer's bookings, in visit order."""
+
+    field_map = BOOKING_FIELDS
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
+
+
+class StaffBookingFeedAPIView(KeysetListView):
+    """All bookings in change order, for dispatch and integrations.
+
+    ``?since=<iso datetime>`` limits the feed to bookings changed since then,
+    and ``?status=`` / ``?worker=`` narrow it further.
+    """
+
+    staff_only = True
+    field_map = STAFF_BOOKING_FIELDS
+    ordering = ("updated_at", "id")
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        since = self.request.GET.get("since")
+        if since:
+            moment = parse_moment(since)
+            if moment is None:
+                raise ApiError("since must be an ISO 8601 datetime.")
+            queryset = queryset.filter(updated_at__gte=moment)
+        status = self.request.GET.get("status")
+        if status:
+            queryset = queryset.filter(status=status)
+        worker = self.request.GET.get("worker")
+        if worker:
+            if not worker.isdigit():
+                raise ApiError("worker must be an id.")
+            queryset = queryset.filter(worker_id=int(worker))
+        return queryset
+
+
+class WorkerListAPIView(ApiView):
+    """Active workers, served from the cached roster without touching the database."""
+
+    field_map = WORKER_FIELDS
+
+    def get(self, request, *args, **kwargs):
+        fields = self.get_fields()
+        page_size = self.get_page_size()
+        etag = self.get_etag(roster.current_version())
+
+        def build_payload():
+            records = roster.get_roster()
+            cursor = request.GET.get("cursor")
+            if cursor:
+                values = decode_cursor(cursor)
+                if len(values) != 2 or not isinstance(values[0], str) or not is_id(values[1]):
+                    raise ApiError("Invalid cursor.")
+                key = (values[0], values[1])
+                records = [record for record in records if (record.name, record.id) > key]
+            page = records[: page_size + 1]
+            next_cursor = None
+            if len(page) > page_size:
+                page = page[:page_size]
+                next_cursor = encode_cursor([page[-1].name, page[-1].id])
+            return {
+                "results": [
+                    {name: getattr(record, name) for name in fields} for record in page
+                ],
+                "next": self.page_links(next_cursor),
+            }
+
+        return self.respond(etag, build_payload)
+
+
+class BookingEventFeedAPIView(ApiView):
+    """The booking change feed, oldest first, for integrations to tail.
+
+    Every response carries a ``cursor``, including an empty one; passing it
+    back as ``?cursor=`` resumes right after the last event returned, so a
+    consumer that stores it never repeats an event, and only misses one whose
+    transaction stayed open longer than ``SCHEDULER_EVENT_GAP_SECONDS`` (see
+    ``scheduler.events``). ``has_more`` says whether another batch is
+    already waiting.
+    """
+
+    staff_only = True
+
+    def get(self, request, *args, **kwargs):
+        page_size = self.get_page_size()
+        cursor = request.GET.get("cursor")
+        after = 0
+        if cursor:
+            values = decode_cursor(cursor)
+            if len(values) != 1 or not isinstance(values[0], int) or values[0] < 0:
+                raise ApiError("Invalid cursor.")
+            after = values[0]
+
+        batch = events.read_batch(after, page_size + 1)
+        has_more = len(batch) > page_size
+        batch = batch[:page_size]
+        last = batch[-1].pk if batch else after
+        next_cursor = encode_cursor([last])
+        etag = self.get_etag([after, last, has_more])
+
+        def build_payload():
+            return {
+                "results": [events.serialize(event) for event in batch],
+                "cursor": next_cursor,
+                "has_more": has_more,
+                "next": self.page_links(next_cursor),
+            }
+
+        return self.respond(etag, build_payload)
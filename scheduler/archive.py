@@ -0,0 +1,90 @@
+"""Hot/cold archival of old completed and cancelled bookings.
+
+Old finished bookings are moved in small batches from ``Booking`` into
+``ArchivedBooking`` so the hot table, and every index on it, only holds rows
+that dashboards and dispatchers actually read. Readers that need full history
+opt in through the helpers below.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import counters
+from .models import ArchivedBooking, Booking
+
+ARCHIVE_AFTER = timedelta(days=365)
+ARCHIVABLE_STATUSES = ("completed", "cancelled")
+ARCHIVED_FIELDS = (
+    "id",
+    "user_id",
+    "service_type",
+    "scheduled_for",
+    "address",
+    "latitude",
+    "longitude",
+    "notes",
+    "worker_id",
+    "rush_cleaning",
+    "status",
+    "worker_response",
+    "created_at",
+)
+
+
+def archivable_bookings(older_than=ARCHIVE_AFTER, now=None):
+    cutoff = (now or timezone.now()) - older_than
+    return Booking.objects.filter(
+        status__in=ARCHIVABLE_STATUSES, scheduled_for__lt=cutoff
+    )
+
+
+def archive_batch(ids):
+    """Copy the given bookings into the archive and delete them, atomically.
+
+    Worker counters are left untouched: archived bookings still count
+    towards each worker's lifetime totals. If an archived row already uses
+    one of the ids, ``IntegrityError`` is raised and the whole batch stays in
+    the hot table rather than deleting a booking that was never copied.
+    """
+    with transaction.atomic(), counters.suspended():
+        rows = Booking.objects.filter(pk__in=ids).values(*ARCHIVED_FIELDS)
+        ArchivedBooking.objects.bulk_create([ArchivedBooking(**row) for row in rows])
+        _, deleted = Booking.objects.filter(pk__in=ids).delete()
+    return deleted.get(Booking._meta.label, 0)
+
+
+def archive_bookings(older_than=ARCHIVE_AFTER, batch_size=500, now=None, max_batches=None):
+    """Archive eligible bookings in batches and return how many were moved.
+
+    Each batch runs in its own short transaction so the booking table is never
+    locked for the whole backlog.
+    """
+    candidates = archivable_bookings(older_than, now).order_by("pk")
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(candidates.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            break
+        moved += archive_batch(ids)
+        batches += 1
+    return moved
+
+
+def count_sources(include_archived=False):
+    """Querysets to aggregate over; archived rows share the booking columns."""
+    sources = [Booking.objects.all()]
+    if include_archived:
+        sources.append(ArchivedBooking.objects.all())
+    return sources
+
+
+def archived_history(user):
+    """Archived bookings for ``user``, newest first."""
+    return (
+        ArchivedBooking.objects.filter(user=user)
+        .select_related("worker")
+        .order_by("-scheduled_for")
+    )
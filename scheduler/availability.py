@@ -0,0 +1,290 @@
+"""Open-slot search over per-worker availability bitsets.
+
+Each process keeps an engine that lays the next ``SCHEDULER_AVAILABILITY_DAYS``
+days (default 21) out in fixed ``SLOT_MINUTES`` slots. Every active worker
+has a row of booking counts per slot, and two packed bitsets are derived from
+them: one for the shared working hours and one per worker for busy slots.
+A search for a service of ``k`` slots ANDs the free bits with themselves
+shifted by doubling offsets, which leaves bit ``i`` set exactly where
+``i .. i+k-1`` are all free. That takes a few word-level NumPy operations
+across all workers, whatever the number of bookings.
+
+The engine is built with one booking query. After that, committed booking
+changes are applied to the affected rows only, in the process that made
+them. A version number in the Django cache, like the roster's, tells other
+processes to rebuild. The engine is also rebuilt when the roster changes or
+the day rolls over.
+
+Only the writing process is updated incrementally. With the default
+local-memory cache the version is per process, so other processes never see
+a bump and keep serving slots that were taken elsewhere until the day rolls
+over. Deployments running several processes must configure a shared cache
+(Redis or Memcached). Then every booking write causes one full rebuild in
+each other process on its next search: one booking query over the horizon
+plus the NumPy packing. That is cheap next to the per-request queries it
+replaces but grows with write rate times process count.
+"""
+
+import math
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import roster
+from .capacity import (
+    SERVICE_DURATION_HOURS,
+    duration_for,
+    elapsed,
+    horizon_start,
+    local_day,
+    slot_time,
+    working_mask,
+)
+from .models import Booking
+
+SLOT_MINUTES = 30
+SLOT = timedelta(minutes=SLOT_MINUTES)
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+VERSION_KEY = "scheduler:availability:version"
+# Customers cannot book a visit that starts sooner than this.
+MIN_LEAD = timedelta(hours=2)
+_WORD = np.uint64(64)
+
+
+def horizon_days():
+    return min(max(getattr(settings, "SCHEDULER_AVAILABILITY_DAYS", 21), 1), 28)
+
+
+def slots_for(service_type):
+    return math.ceil(duration_for(service_type) / SLOT)
+
+
+def pack(bits):
+    """Pack a ``(rows, slots)`` boolean array into little-endian ``uint64`` words."""
+    rows, slots = bits.shape
+    padded = np.zeros((rows, -(-slots // 64) * 64), dtype=bool)
+    padded[:, :slots] = bits
+    return np.packbits(padded, axis=1, bitorder="little").view("<u8")
+
+
+def shift_down(words, offset):
+    """Move bit ``i + offset`` to bit ``i`` across word boundaries (``0 < offset < 64``)."""
+    offset = np.uint64(offset)
+    shifted = words >> offset
+    shifted[..., :-1] |= words[..., 1:] << (_WORD - offset)
+    return shifted
+
+
+def run_starts(free, length):
+    """Bits where ``length`` consecutive free slots begin."""
+    runs = free
+    covered = 1
+    while covered < length:
+        step = min(covered, length - covered)
+        runs = runs & shift_down(runs, step)
+        covered += step
+    return runs
+
+
+class Engine:
+    def __init__(self, version, roster_version, start, days, workers, bookings):
+        self.version = version
+        self.roster_version = roster_version
+        self.start = start
+        self.days = days
+        self.n_slots = days * SLOTS_PER_DAY
+        self.worker_ids = np.array([worker.id for worker in workers], dtype=np.int64)
+        self.row_for = {worker.id: row for row, worker in enumerate(workers)}
+        self.counts = np.zeros((len(workers), self.n_slots), dtype=np.int16)
+        for worker_id, scheduled_for, service_type in bookings:
+            self._add(worker_id, scheduled_for, service_type, 1)
+        self.working = pack(working_mask(start, days, SLOT_MINUTES)[None, :])[0]
+        # First slot of each local day; not a multiple of SLOTS_PER_DAY after a DST change.
+        self.day_starts = np.array(
+            [math.ceil(elapsed(start, local_day(start, day)) / SLOT) for day in range(days)]
+        )
+        self.busy = pack(self.counts > 0)
+
+    def _add(self, worker_id, scheduled_for, service_type, delta):
+        row = self.row_for.get(worker_id)
+        if row is None:
+            return None
+        first = elapsed(self.start, scheduled_for) // SLOT
+        last = first + slots_for(service_type)
+        first, last = max(first, 0), min(last, self.n_slots)
+        if first >= last:
+            return None
+        self.counts[row, first:last] += delta
+        return row
+
+    def apply(self, old_state, new_state):
+        """Move a booking's slots from ``old_state`` to ``new_state`` (either may be ``None``)."""
+        rows = set()
+        for state, delta in ((old_state, -1), (new_state, 1)):
+            if state is not None and state["status"] != "cancelled":
+                rows.add(
+                    self._add(
+                        state["worker_id"], state["scheduled_for"], state["service_type"], delta
+                    )
+                )
+        rows.discard(None)
+        if rows:
+            rows = sorted(rows)
+            self.busy[rows] = pack(self.counts[rows] > 0)
+
+    def window(self, start, end):
+        bits = np.zeros((1, self.n_slots), dtype=bool)
+        first = max(math.ceil(elapsed(self.start, start) / SLOT), 0)
+        last = min(math.ceil(elapsed(self.start, end) / SLOT), self.n_slots)
+        if first < last:
+            bits[0, first:last] = True
+        return pack(bits)[0]
+
+    def search(self, service_type, start, end, worker_id=None, limit=20, align=1, per_day=None):
+        """Start slots in ``[start, end)`` where a ``service_type`` visit fits.
+
+        Returns ``(slot_indexes, worker_ids_per_slot)``, soonest first.
+        """
+        if worker_id is not None:
+            row = self.row_for.get(int(worker_id))
+            rows = [] if row is None else [row]
+        else:
+            rows = slice(None)
+        busy = self.busy[rows]
+        if not len(busy):
+            return [], []
+        runs = run_starts(self.working & ~busy, slots_for(service_type)) & self.window(start, end)
+        candidates = np.flatnonzero(
+            np.unpackbits(
+                np.bitwise_or.reduce(runs, axis=0).view(np.uint8), bitorder="little"
+            )[: self.n_slots]
+        )
+        if align > 1:
+            candidates = candidates[candidates % align == 0]
+        if per_day:
+            day = np.searchsorted(self.day_starts, candidates, side="right") - 1
+            rank = np.arange(len(candidates)) - np.searchsorted(day, day)
+            candidates = candidates[rank < per_day]
+        candidates = candidates[:limit]
+        free = (runs[:, candidates >> 6] >> (candidates & 63).astype(np.uint64)) & np.uint64(1)
+        worker_ids = self.worker_ids[rows]
+        return candidates.tolist(), [worker_ids[column == 1].tolist() for column in free.T]
+
+
+_lock = threading.Lock()
+_engine = None
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _bump():
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+        return None
+
+
+def _is_current(engine, version, now):
+    return (
+        engine is not None
+        and engine.version == version
+        and engine.roster_version == roster.current_version()
+        and engine.start == horizon_start(now)
+        and engine.days == horizon_days()
+    )
+
+
+def get_engine(now=None):
+    """The current engine, rebuilt from the database when it is stale."""
+    global _engine
+    version = current_version()
+    if _is_current(_engine, version, now):
+        return _engine
+    with _lock:
+        if _is_current(_engine, version, now):
+            return _engine
+        roster_version = roster.current_version()
+        workers = roster.get_roster()
+        start = horizon_start(now)
+        days = horizon_days()
+        longest = timedelta(hours=max(SERVICE_DURATION_HOURS.values()))
+        bookings = (
+            Booking.objects.filter(
+                worker_id__in=[worker.id for worker in workers],
+                scheduled_for__gt=start - longest,
+                scheduled_for__lt=start + timedelta(days=days),
+            )
+            .exclude(status="cancelled")
+            .values_list("worker_id", "scheduled_for", "service_type")
+        )
+        _engine = Engine(version, roster_version, start, days, workers, bookings)
+        return _engine
+
+
+def invalidate():
+    """Force every process to rebuild, e.g. after bulk updates that skip signals."""
+    _bump()
+
+
+def booking_changed(old_state, new_state):
+    """Apply a committed booking change to this process's engine and tell the others."""
+    with _lock:
+        engine = _engine
+        version = current_version()
+        if engine is None or engine.version != version:
+            _bump()
+            return
+        engine.apply(old_state, new_state)
+        new_version = _bump()
+        # Only claim the new version if no other change slipped in between.
+        if new_version == version + 1:
+            engine.version = new_version
+
+
+def open_slots(
+    service_type,
+    start=None,
+    end=None,
+    worker_id=None,
+    limit=20,
+    align=1,
+    per_day=None,
+    now=None,
+):
+    """Soonest open start times for ``service_type``, optionally for one worker.
+
+    Each entry has ``start``, ``end`` and the active ``workers`` free for the
+    whole visit.
+    """
+    now = now or timezone.now()
+    engine = get_engine(now)
+    start = max(start or now, now + MIN_LEAD)
+    end = end or engine.start + timedelta(days=engine.days)
+    indexes, free_workers = engine.search(
+        service_type, start, end, worker_id=worker_id, limit=limit, align=align, per_day=per_day
+    )
+    length = duration_for(service_type)
+    records = {record.id: record for record in roster.get_roster()}
+    slots = []
+    for index, worker_ids in zip(indexes, free_workers):
+        begins = slot_time(engine.start, index, SLOT)
+        slots.append(
+            {
+                "start": begins,
+                "end": begins + length,
+                "workers": [records[pk] for pk in worker_ids if pk in records],
+            }
+        )
+    return slots
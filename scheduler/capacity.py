@@ -0,0 +1,225 @@
+"""Multi-week workforce capacity forecasting.
+
+Bookings for every active worker are loaded with a single query and laid out
+in a worker-by-hour occupancy matrix, so utilization, saturation and
+shortfall are computed with array operations instead of per-worker queries.
+
+Slots are fixed steps of elapsed time from local midnight on the first day.
+On a day with a DST change local hours no longer fall on the same slot
+numbers, so working hours are placed day by day from local wall-clock times.
+"""
+
+import math
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import SERVICE_CHOICES, Booking, Worker
+
+SLOT_MINUTES = 60
+WORKDAY_START_HOUR = 8
+WORKDAY_END_HOUR = 18
+WORKING_WEEKDAYS = (0, 1, 2, 3, 4, 5)
+
+# Typical time on site per service, used to size each booking in the grid.
+SERVICE_DURATION_HOURS = {
+    "standard": 3,
+    "deep": 5,
+    "move_out": 6,
+    "office": 4,
+}
+DEFAULT_DURATION_HOURS = 3
+
+
+def duration_for(service_type):
+    return timedelta(hours=SERVICE_DURATION_HOURS.get(service_type, DEFAULT_DURATION_HOURS))
+
+
+def horizon_start(now=None):
+    """Midnight today in the current timezone."""
+    local_now = timezone.localtime(now or timezone.now())
+    return timezone.make_aware(
+        datetime.combine(local_now.date(), datetime.min.time()),
+        timezone.get_current_timezone(),
+    )
+
+
+def local_day(start, offset, hour=0):
+    """``hour`` o'clock local time, ``offset`` days after the day of ``start``."""
+    tz = timezone.get_current_timezone()
+    day = timezone.localtime(start, tz).date() + timedelta(days=offset)
+    return timezone.make_aware(datetime.combine(day, time(hour)), tz)
+
+
+def elapsed(start, moment):
+    """Real time from ``start`` to ``moment``.
+
+    Python subtracts datetimes that share a tzinfo by wall clock, which is
+    off by the shift across a DST change, so both are compared in UTC.
+    """
+    return moment.astimezone(dt_timezone.utc) - start.astimezone(dt_timezone.utc)
+
+
+def slot_time(start, index, slot):
+    """Local start time of slot ``index``."""
+    return timezone.localtime(start.astimezone(dt_timezone.utc) + index * slot)
+
+
+def working_mask(start, days, slot_minutes=SLOT_MINUTES):
+    """Boolean vector of slots that fall within working hours."""
+    slot = timedelta(minutes=slot_minutes)
+    mask = np.zeros(days * 24 * 60 // slot_minutes, dtype=bool)
+    for offset in range(days):
+        opens = local_day(start, offset, WORKDAY_START_HOUR)
+        if opens.weekday() in WORKING_WEEKDAYS:
+            closes = local_day(start, offset, WORKDAY_END_HOUR)
+            first = math.ceil(elapsed(start, opens) / slot)
+            mask[first : math.ceil(elapsed(start, closes) / slot)] = True
+    return mask
+
+
+def occupancy_matrix(rows, starts, lengths, n_rows, n_slots):
+    """Count overlapping bookings per (row, slot) from interval arrays."""
+    diff = np.zeros((n_rows, n_slots + 1), dtype=np.int32)
+    ends = np.clip(starts + lengths, 0, n_slots)
+    starts = np.clip(starts, 0, n_slots)
+    np.add.at(diff, (rows, starts), 1)
+    np.add.at(diff, (rows, ends), -1)
+    return np.cumsum(diff[:, :-1], axis=1)
+
+
+def trailing_weekly_demand(start, trailing_weeks):
+    """Average booked hours per week by service over the trailing window."""
+    window_start = start - timedelta(weeks=trailing_weeks)
+    demand = {code: 0.0 for code, _ in SERVICE_CHOICES}
+    rows = (
+        Booking.objects.filter(scheduled_for__gte=window_start, scheduled_for__lt=start)
+        .exclude(status="cancelled")
+        .values("service_type")
+        .annotate(total=Count("id"))
+    )
+    for row in rows:
+        hours = row["total"] * duration_for(row["service_type"]).total_seconds() / 3600
+        demand[row["service_type"]] = hours / trailing_weeks
+    return demand
+
+
+def build_forecast(weeks=4, trailing_weeks=8, now=None):
+    """Forecast worker utilization and per-service shortfall for ``weeks`` ahead."""
+    start = horizon_start(now)
+    days = weeks * 7
+    end = start + timedelta(days=days)
+    slot = timedelta(minutes=SLOT_MINUTES)
+    slot_hours = SLOT_MINUTES / 60
+    n_slots = days * 24 * 60 // SLOT_MINUTES
+
+    workers = list(
+        Worker.objects.filter(is_active=True)
+        .order_by("name")
+        .values("id", "name", "service_focus")
+    )
+    row_for = {worker["id"]: index for index, worker in enumerate(workers)}
+    bookings = list(
+        Booking.objects.filter(
+            worker_id__in=row_for, scheduled_for__gte=start, scheduled_for__lt=end
+        )
+        .exclude(status="cancelled")
+        .values_list("worker_id", "scheduled_for", "service_type")
+    )
+
+    rows = np.fromiter((row_for[b[0]] for b in bookings), dtype=np.int64, count=len(bookings))
+    starts = np.fromiter(
+        (elapsed(start, b[1]) // slot for b in bookings), dtype=np.int64, count=len(bookings)
+    )
+    lengths = np.fromiter(
+        (math.ceil(duration_for(b[2]) / slot) for b in bookings),
+        dtype=np.int64,
+        count=len(bookings),
+    )
+    occupancy = occupancy_matrix(rows, starts, lengths, len(workers), n_slots)
+    occupied = occupancy > 0
+    working = working_mask(start, days)
+    working_slots = int(working.sum())
+
+    busy = occupied & working
+    booked_slots = busy.sum(axis=1)
+    utilization = booked_slots / working_slots if working_slots else np.zeros(len(workers))
+    weekly_busy = busy.reshape(len(workers), weeks, n_slots // weeks).sum(axis=2)
+    weekly_working = working.reshape(weeks, n_slots // weeks).sum(axis=1)
+    weekly_utilization = np.divide(
+        weekly_busy,
+        weekly_working,
+        out=np.zeros(weekly_busy.shape, dtype=float),
+        where=weekly_working > 0,
+    )
+    # Hours where a worker is double-booked are a dispatch problem, not capacity.
+    overbooked_slots = ((occupancy > 1) & working).sum(axis=1)
+
+    focus = np.array([worker["service_focus"] for worker in workers], dtype=object)
+    booked_by_service = {code: 0.0 for code, _ in SERVICE_CHOICES}
+    for booking in bookings:
+        booked_by_service[booking[2]] = booked_by_service.get(booking[2], 0.0) + (
+            duration_for(booking[2]).total_seconds() / 3600
+        )
+    weekly_demand = trailing_weekly_demand(start, trailing_weeks)
+    worker_hours = working_slots * slot_hours
+
+    services = []
+    for code, label in SERVICE_CHOICES:
+        members = focus == code
+        team_size = int(members.sum())
+        capacity_hours = team_size * worker_hours
+        if team_size:
+            saturated = (occupied[members].all(axis=0) & working).sum()
+        else:
+            saturated = working_slots
+        projected_hours = max(weekly_demand[code] * weeks, booked_by_service[code])
+        shortfall_hours = max(0.0, projected_hours - capacity_hours)
+        services.append(
+            {
+                "code": code,
+                "label": label,
+                "workers": team_size,
+                "capacity_hours": round(capacity_hours, 1),
+                "booked_hours": round(booked_by_service[code], 1),
+                "projected_hours": round(projected_hours, 1),
+                "trailing_weekly_hours": round(weekly_demand[code], 1),
+                "saturation_hours": round(float(saturated) * slot_hours, 1),
+                "shortfall_hours": round(shortfall_hours, 1),
+                "shortfall_workers": math.ceil(shortfall_hours / worker_hours) if worker_hours else 0,
+                "utilization": round(
+                    float(booked_slots[members].sum()) / (team_size * working_slots) * 100, 1
+                )
+                if team_size and working_slots
+                else 0,
+            }
+        )
+
+    worker_rows = []
+    for index, worker in enumerate(workers):
+        worker_rows.append(
+            {
+                "id": worker["id"],
+                "name": worker["name"],
+                "service_focus": worker["service_focus"],
+                "booked_hours": round(float(booked_slots[index]) * slot_hours, 1),
+                "overbooked_hours": round(float(overbooked_slots[index]) * slot_hours, 1),
+                "utilization": round(float(utilization[index]) * 100, 1),
+                "weekly_utilization": [
+                    round(float(value) * 100, 1) for value in weekly_utilization[index]
+                ],
+            }
+        )
+
+    return {
+        "start": start,
+        "end": end,
+        "weeks": weeks,
+        "trailing_weeks": trailing_weeks,
+        "week_starts": [start + timedelta(weeks=i) for i in range(weeks)],
+        "working_hours_per_worker": worker_hours,
+        "workers": worker_rows,
+        "services": services,
+    }
@@ -0,0 +1,220 @@
+"""Per-client booking summaries behind repeat-rate, cohort and account stats.
+
+Every user gets a ``ClientProfile`` row at signup. Booking signals keep its
+totals current with ``F()`` updates and only recompute the first/last booking
+span when a booking is rescheduled, moved to another client or deleted.
+Archival runs inside ``counters.suspended()``, so archived bookings stay in
+the totals. ``rebuild()`` recomputes profiles from scratch; the
+``reconcile_counters`` command runs it.
+"""
+
+from collections import defaultdict
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, DateField, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least, TruncMonth
+from django.utils import timezone
+
+from .models import ArchivedBooking, Booking, ClientProfile
+
+TOTALS = ("booking_count", "cancelled_count", "rush_count")
+RETENTION_MONTHS = 6
+
+
+def cohort_for(moment):
+    """First day of the local month ``moment`` falls in."""
+    return timezone.localtime(moment).date().replace(day=1)
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def create_profile(user):
+    ClientProfile.objects.get_or_create(
+        user=user,
+        defaults={"signed_up_at": user.date_joined, "cohort": cohort_for(user.date_joined)},
+    )
+
+
+def contributions(state):
+    """What one booking in ``state`` adds to its client's totals."""
+    if state is None:
+        return None, {}
+    return state["user_id"], {
+        "booking_count": 1,
+        "cancelled_count": int(state["status"] == "cancelled"),
+        "rush_count": int(bool(state["rush_cleaning"])),
+    }
+
+
+def booking_span(user_id):
+    """Earliest and latest scheduled visit across live and archived bookings."""
+    firsts, lasts = [], []
+    for model in (Booking, ArchivedBooking):
+        span = model.objects.filter(user_id=user_id).aggregate(
+            first=Min("scheduled_for"), last=Max("scheduled_for")
+        )
+        if span["first"] is not None:
+            firsts.append(span["first"])
+            lasts.append(span["last"])
+    return {
+        "first_booking_at": min(firsts, default=None),
+        "last_booking_at": max(lasts, default=None),
+    }
+
+
+def apply_change(old_state, new_state):
+    """Move profile totals from a booking's previous state to its new one."""
+    fields = ("user_id", "status", "rush_cleaning", "scheduled_for")
+    if old_state and new_state and all(old_state[f] == new_state[f] for f in fields):
+        return
+    old_user, old_counts = contributions(old_state)
+    new_user, new_counts = contributions(new_state)
+    for user_id in {old_user, new_user} - {None}:
+        changes = defaultdict(int)
+        if user_id == old_user:
+            for name, value in old_counts.items():
+                changes[name] -= value
+        if user_id == new_user:
+            for name, value in new_counts.items():
+                changes[name] += value
+        updates = {name: F(name) + value for name, value in changes.items() if value}
+
+        moved = user_id == old_user and (
+            new_state is None
+            or new_user != old_user
+            or new_state["scheduled_for"] != old_state["scheduled_for"]
+        )
+        if moved:
+            updates.update(booking_span(user_id))
+        elif user_id == new_user and old_user != new_user:
+            point = Value(new_state["scheduled_for"])
+            updates["first_booking_at"] = Least(Coalesce("first_booking_at", point), point)
+            updates["last_booking_at"] = Greatest(Coalesce("last_booking_at", point), point)
+        if updates:
+            updates["updated_at"] = timezone.now()
+            # Users without a profile yet are picked up by rebuild().
+            ClientProfile.objects.filter(pk=user_id).update(**updates)
+
+
+def rebuild(user_ids=None):
+    """Recompute profiles for ``user_ids`` (default: every user); returns the count."""
+    users = get_user_model().objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    stats = defaultdict(lambda: dict.fromkeys(TOTALS, 0))
+    for model in (Booking, ArchivedBooking):
+        rows = model.objects.values("user_id").annotate(
+            booking_count=Count("id"),
+            cancelled_count=Count("id", filter=Q(status="cancelled")),
+            rush_count=Count("id", filter=Q(rush_cleaning=True)),
+            first=Min("scheduled_for"),
+            last=Max("scheduled_for"),
+        )
+        if user_ids is not None:
+            rows = rows.filter(user_id__in=user_ids)
+        for row in rows:
+            entry = stats[row["user_id"]]
+            for name in TOTALS:
+                entry[name] += row[name]
+            entry["first_booking_at"] = min(
+                filter(None, (entry.get("first_booking_at"), row["first"]))
+            )
+            entry["last_booking_at"] = max(
+                filter(None, (entry.get("last_booking_at"), row["last"]))
+            )
+
+    profiles = [
+        ClientProfile(
+            user_id=pk,
+            signed_up_at=joined,
+            cohort=cohort_for(joined),
+            **stats.get(pk, {}),
+        )
+        for pk, joined in users.values_list("pk", "date_joined").iterator()
+    ]
+    ClientProfile.objects.bulk_create(
+        profiles,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=[
+            "signed_up_at",
+            "cohort",
+            "first_booking_at",
+            "last_booking_at",
+            *TOTALS,
+            "updated_at",
+        ],
+    )
+    return len(profiles)
+
+
+def cohort_report(months=12, now=None):
+    """Signup cohorts with activation, repeat and monthly retention.
+
+    Retention for month ``k`` is the share of the cohort whose latest visit
+    falls ``k`` or more months after their signup month.
+    """
+    now = now or timezone.now()
+    current = cohort_for(now)
+    start = add_months(current, -(months - 1))
+    profiles = ClientProfile.objects.filter(cohort__gte=start)
+
+    cohorts = {}
+    for row in profiles.values("cohort").annotate(
+        clients=Count("pk"),
+        booked=Count("pk", filter=Q(booking_count__gt=0)),
+        repeat=Count("pk", filter=Q(booking_count__gt=1)),
+        bookings=Coalesce(Sum("booking_count"), 0),
+        cancelled=Coalesce(Sum("cancelled_count"), 0),
+    ):
+        cohorts[row["cohort"]] = {**row, "last_months": defaultdict(int)}
+    last_months = (
+        profiles.filter(last_booking_at__isnull=False)
+        .annotate(last_month=TruncMonth("last_booking_at", output_field=DateField()))
+        .values("cohort", "last_month")
+        .annotate(total=Count("pk"))
+    )
+    for row in last_months:
+        cohorts[row["cohort"]]["last_months"][row["last_month"]] += row["total"]
+
+    rows = []
+    for cohort in sorted(cohorts, reverse=True):
+        entry = cohorts[cohort]
+        clients = entry["clients"]
+        retention = []
+        for k in range(RETENTION_MONTHS):
+            month = add_months(cohort, k)
+            if month > current:
+                retention.append(None)
+                continue
+            still_active = sum(
+                total for last, total in entry["last_months"].items() if last >= month
+            )
+            retention.append(round(still_active / clients * 100, 1) if clients else 0)
+        rows.append(
+            {
+                "cohort": cohort,
+                "clients": clients,
+                "booked": entry["booked"],
+                "repeat": entry["repeat"],
+                "repeat_rate": round(entry["repeat"] / entry["booked"] * 100, 1)
+                if entry["booked"]
+                else 0,
+                "avg_bookings": round(entry["bookings"] / clients, 2) if clients else 0,
+                "cancellation_rate": round(entry["cancelled"] / entry["bookings"] * 100, 1)
+                if entry["bookings"]
+                else 0,
+                "retention": retention,
+            }
+        )
+    return {
+        "rows": rows,
+        "months": months,
+        "start": start,
+        "retention_months": list(range(RETENTION_MONTHS)),
+    }
@@ -0,0 +1,147 @@
+"""Denormalized per-worker booking counters.
+
+``Worker`` carries lifetime, completed, cancelled and accepted booking totals
+plus the start of its next scheduled visit, so rankings and utilization read
+one indexed row per worker instead of counting the booking join. Booking
+signals apply each change as a single ``F()`` update per affected worker.
+
+Archived bookings still count towards a worker's lifetime totals: archival
+runs inside ``suspended()`` so moving rows out of the hot table does not
+decrement anything. Writes that bypass signals (``QuerySet.update``,
+``bulk_create``) drift the counters until ``reconcile()`` or the
+``reconcile_counters`` command repairs them; until then decrements stop at
+zero instead of failing the booking save.
+
+``next_booking_at`` also goes stale without any write, once the visit it
+points at starts. The ``sweep_booking_statuses`` command, which has to run
+on a schedule anyway, moves it on with ``refresh_next_bookings()``.
+"""
+
+import contextlib
+import contextvars
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ArchivedBooking, Booking, Worker
+
+COUNTERS = ("booking_count", "completed_count", "cancelled_count", "accepted_count")
+
+_suspended = contextvars.ContextVar("scheduler_counters_suspended", default=False)
+
+
+@contextlib.contextmanager
+def suspended():
+    """Skip counter and client profile upkeep for booking writes in the block."""
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def is_suspended():
+    return _suspended.get()
+
+
+def contributions(state):
+    """What one booking in ``state`` adds to its worker's counters."""
+    if state is None or state["worker_id"] is None:
+        return None, {}
+    return state["worker_id"], {
+        "booking_count": 1,
+        "completed_count": int(state["status"] == "completed"),
+        "cancelled_count": int(state["status"] == "cancelled"),
+        "accepted_count": int(state["worker_response"] == "accepted"),
+    }
+
+
+def next_booking_subquery(now=None):
+    now = now or timezone.now()
+    return Subquery(
+        Booking.objects.filter(
+            worker=OuterRef("pk"), status="scheduled", scheduled_for__gte=now
+        )
+        .order_by("scheduled_for")
+        .values("scheduled_for")[:1]
+    )
+
+
+def apply_change(old_state, new_state):
+    """Move counters from a booking's previous state to its new one.
+
+    Issues at most one UPDATE per affected worker, and none when nothing the
+    counters depend on changed.
+    """
+    fields = ("worker_id", "status", "worker_response", "scheduled_for")
+    if old_state and new_state and all(old_state[f] == new_state[f] for f in fields):
+        return
+    deltas = defaultdict(Counter)
+    old_worker, old_counts = contributions(old_state)
+    new_worker, new_counts = contributions(new_state)
+    for name, value in old_counts.items():
+        deltas[old_worker][name] -= value
+    for name, value in new_counts.items():
+        deltas[new_worker][name] += value
+    next_at = next_booking_subquery()
+    for worker_id in {old_worker, new_worker} - {None}:
+        # Greatest() keeps drifted counters from failing the unsigned column.
+        changes = {
+            name: Greatest(F(name) + value, 0) if value < 0 else F(name) + value
+            for name, value in deltas[worker_id].items()
+            if value
+        }
+        changes["next_booking_at"] = next_at
+        Worker.objects.filter(pk=worker_id).update(**changes)
+
+
+def refresh_next_bookings(now=None):
+    """Move ``next_booking_at`` on for workers whose next visit has started.
+
+    Returns the number of workers updated.
+    """
+    now = now or timezone.now()
+    return Worker.objects.filter(next_booking_at__lte=now).update(
+        next_booking_at=next_booking_subquery(now)
+    )
+
+
+def reconcile(now=None):
+    """Recompute every worker's counters from bookings and the archive.
+
+    Returns the number of workers whose stored values had drifted.
+    """
+    now = now or timezone.now()
+    actual = defaultdict(Counter)
+    for model in (Booking, ArchivedBooking):
+        rows = (
+            model.objects.filter(worker__isnull=False)
+            .values("worker_id")
+            .annotate(
+                booking_count=Count("id"),
+                completed_count=Count("id", filter=Q(status="completed")),
+                cancelled_count=Count("id", filter=Q(status="cancelled")),
+                accepted_count=Count("id", filter=Q(worker_response="accepted")),
+            )
+        )
+        for row in rows:
+            actual[row.pop("worker_id")].update(row)
+    next_at = dict(
+        Worker.objects.annotate(upcoming=next_booking_subquery(now)).values_list(
+            "pk", "upcoming"
+        )
+    )
+
+    drifted = []
+    for worker in Worker.objects.only("pk", "next_booking_at", *COUNTERS):
+        expected = {name: actual[worker.pk][name] for name in COUNTERS}
+        expected["next_booking_at"] = next_at.get(worker.pk)
+        if any(getattr(worker, name) != value for name, value in expected.items()):
+            for name, value in expected.items():
+                setattr(worker, name, value)
+            drifted.append(worker)
+    # bulk_update skips signals, so the roster cache is left alone.
+    Worker.objects.bulk_update(drifted, [*COUNTERS, "next_booking_at"], batch_size=500)
+    return len(drifted)
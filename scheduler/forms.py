@@ -5,7 +5,8 @@ from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.contrib.auth.models import User
 from django.utils import timezone
 
-from .models import Application, Booking, SERVICE_CHOICES, Worker
+from .models import Application, Booking, SERVICE_CHOICES
+from .roster import WorkerRecord, get_active_worker, get_roster
 
 
 class StyledAuthenticationForm(AuthenticationForm):
@@ -39,14 +40,46 @@ class SignupForm(UserCreationForm):
         return user
 
 
+class RosterWorkerField(forms.Field):
+    """Chooses an active worker from the cached roster without a query.
+
+    Cleans to a :class:`~scheduler.roster.WorkerRecord` or ``None``.
+    """
+
+    widget = forms.RadioSelect
+    default_error_messages = {
+        "invalid_choice": "Select a valid professional. That choice is not one of the available choices.",
+    }
+
+    def __init__(self, *, empty_label: str = "", **kwargs: Any) -> None:
+        self.empty_label = empty_label
+        super().__init__(**kwargs)
+
+    def to_python(self, value: Any) -> WorkerRecord | None:
+        if value in self.empty_values:
+            return None
+        try:
+            worker_id = int(value)
+        except (TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages["invalid_choice"], code="invalid_choice")
+        record = get_active_worker(worker_id)
+        if record is None:
+            raise forms.ValidationError(self.error_messages["invalid_choice"], code="invalid_choice")
+        return record
+
+    def refresh_choices(self) -> None:
+        self.widget.choices = [("", self.empty_label)] + [
+            (record.id, record.name) for record in get_roster()
+        ]
+
+
 class BookingForm(forms.ModelForm):
     scheduled_for = forms.DateTimeField(
         widget=forms.DateTimeInput(
             attrs={"type": "datetime-local", "class": "form-control"}
         )
     )
-    worker = forms.ModelChoiceField(
-        queryset=Worker.objects.none(),
+    worker = RosterWorkerField(
         required=False,
         empty_label="No preference",
         widget=forms.RadioSelect(attrs={"class": "visually-hidden worker-choice"}),
@@ -54,11 +87,11 @@ class BookingForm(forms.ModelForm):
     )
     class Meta:
         model = Booking
+        # ``worker`` is declared above and applied in save() from the roster.
         fields = (
             "service_type",
             "scheduled_for",
             "address",
-            "worker",
             "notes",
         )
         widgets = {
@@ -72,7 +105,7 @@ class BookingForm(forms.ModelForm):
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
-        self.fields["worker"].queryset = Worker.objects.filter(is_active=True)
+        self.fields["worker"].refresh_choices()
         for name, field in self.fields.items():
             if name in ("worker",):
                 continue
@@ -85,6 +118,11 @@ class BookingForm(forms.ModelForm):
             raise forms.ValidationError("Bookings must be scheduled in the future.")
         return scheduled_for
 
+    def save(self, commit: bool = True) -> Booking:
+        worker = self.cleaned_data.get("worker")
+        self.instance.worker_id = worker.id if worker else None
+        return super().save(commit=commit)
+
 
 class WorkWithUsForm(forms.Form):
     full_name = forms.CharField(max_length=120, label="Full name")
@@ -0,0 +1,163 @@
+"""HTML fragments for progressively enhanced dashboard updates.
+
+Filtering the team on the dashboard used to reload the whole page, rebuilding
+the booking form and re-rendering every booking. With JavaScript enabled the
+dashboard instead swaps in these fragments:
+
+* ``dashboard/fragments/workers/`` - the worker picker (``?part=selector``,
+  the default) or the team cards (``?part=cards``) for one filter
+  combination. The markup does not depend on the user, so it is rendered
+  once per filter combination and roster version and kept in the cache.
+* ``dashboard/fragments/bookings/`` - the signed-in user's bookings table,
+  revalidated against the newest ``updated_at`` of their bookings and the
+  roster version.
+* ``dashboard/fragments/slots/`` - the next open times for a service and,
+  optionally, one worker, from the in-memory availability engine.
+
+Each sends an ETag and answers a matching ``If-None-Match`` with ``304 Not
+Modified`` before rendering anything.
+"""
+
+import hashlib
+import json
+import time
+
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_safe
+
+from . import availability, idempotency, roster
+from .models import SERVICE_CHOICES
+
+CACHE_SECONDS = 600
+MAX_SEARCH_LENGTH = 100
+DASHBOARD_SLOTS = {"limit": 8, "align": 2, "per_day": 2}
+SERVICE_CODES = {code for code, _ in SERVICE_CHOICES}
+WORKER_TEMPLATES = {
+    "selector": "scheduler/partials/worker_selector.html",
+    "cards": "scheduler/partials/worker_cards.html",
+}
+
+
+def filter_workers(service_focus, search_query, selected=None):
+    """Active workers matching the team filters; the selected one always stays listed."""
+    needle = search_query.casefold()
+    selected = str(selected or "")
+    return [
+        worker
+        for worker in roster.get_roster()
+        if str(worker.id) == selected
+        or (
+            (not service_focus or worker.service_focus == service_focus)
+            and needle in worker.name.casefold()
+        )
+    ]
+
+
+def dashboard_slots(service_type, worker_id=None):
+    """Open times shown on the dashboard: two on-the-hour starts a day."""
+    if service_type not in SERVICE_CODES:
+        service_type = "standard"
+    worker_id = int(worker_id) if str(worker_id or "").isdigit() else None
+    return availability.open_slots(service_type, worker_id=worker_id, **DASHBOARD_SLOTS)
+
+
+def fragment_response(request, etag, render):
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(render())
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+@require_safe
+@login_required
+def worker_fragment(request):
+    part = request.GET.get("part", "selector")
+    if part not in WORKER_TEMPLATES:
+        raise Http404("Unknown fragment.")
+    service_focus = request.GET.get("team_service", "")
+    search_query = request.GET.get("team_search", "").strip()[:MAX_SEARCH_LENGTH]
+    selected = request.GET.get("worker", "")
+    etag = make_etag(part, roster.current_version(), service_focus, search_query, selected)
+
+    def render():
+        key = "scheduler:fragment:workers:" + etag.strip('"')
+        html = cache.get(key)
+        if html is None:
+            html = render_to_string(
+                WORKER_TEMPLATES[part],
+                {
+                    "workers": filter_workers(service_focus, search_query, selected),
+                    "selected_worker_id": selected,
+                    "worker_field": "worker",
+                },
+            )
+            cache.set(key, html, CACHE_SECONDS)
+        return html
+
+    return fragment_response(request, etag, render)
+
+
+@require_safe
+@login_required
+def booking_table_fragment(request):
+    bookings = request.user.bookings.all()
+    watermark = bookings.aggregate(latest=Max("updated_at"), total=Count("id"))
+    # Worker names and photos in the table change with the roster, not the bookings.
+    etag = make_etag(
+        "bookings",
+        request.user.pk,
+        watermark["latest"],
+        watermark["total"],
+        roster.current_version(),
+    )
+
+    def render():
+        return render_to_string(
+            "scheduler/partials/booking_table.html",
+            {
+                "bookings": bookings.select_related("worker"),
+                "idempotency_key": idempotency.issue_key(request),
+            },
+            request=request,
+        )
+
+    return fragment_response(request, etag, render)
+
+
+@require_safe
+@login_required
+def slots_fragment(request):
+    service_type = request.GET.get("service_type", "")
+    worker_id = request.GET.get("worker", "")
+
+    def render():
+        return render_to_string(
+            "scheduler/partials/open_slots.html",
+            {
+                "open_slots": dashboard_slots(service_type, worker_id),
+                "selected_worker_id": worker_id,
+                "availability_days": availability.horizon_days(),
+            },
+        )
+
+    # Open times also move as the clock passes each slot boundary.
+    etag = make_etag(
+        "slots",
+        availability.current_version(),
+        roster.current_version(),
+        int(time.time() // availability.SLOT.total_seconds()),
+        service_type,
+        worker_id,
+    )
+    return fragment_response(request, etag, render)
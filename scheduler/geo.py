@@ -0,0 +1,337 @@
+"""Geocoding, nearest-worker lookup and daily route ordering.
+
+Addresses are resolved by a pluggable geocoder (``SCHEDULER_GEOCODER``, a
+dotted path to a ``BaseGeocoder`` subclass) and every answer is kept in
+``GeocodedAddress`` so each address is looked up once. Lookups are
+best-effort: a failing provider leaves coordinates unset, and bookings are
+located after their transaction commits rather than inside the save. Worker
+home bases are bucketed into a fixed-size lat/lon grid for nearest-worker
+searches. A worker's stops for a day follow their booked times, and only
+visits booked for the same time are ordered with nearest-neighbour plus 2-opt.
+"""
+
+import json
+import logging
+import math
+import threading
+import urllib.parse
+import urllib.request
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils.module_loading import import_string
+
+from . import roster
+from .capacity import SERVICE_DURATION_HOURS, duration_for
+from .models import Booking, GeocodedAddress, Worker
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+GRID_CELL_DEGREES = 0.05
+MAX_RINGS = 20
+
+
+class BaseGeocoder:
+    """Resolve a free-text address to ``(latitude, longitude)`` or ``None``.
+
+    Subclasses query a provider; the base class resolves nothing.
+    """
+
+    name = "base"
+
+    def geocode(self, address):
+        return None
+
+
+class NullGeocoder(BaseGeocoder):
+    """Default geocoder that resolves nothing, leaving coordinates unset."""
+
+    name = "null"
+
+
+class NominatimGeocoder(BaseGeocoder):
+    """OpenStreetMap Nominatim over HTTP; mind its one-request-per-second policy."""
+
+    name = "nominatim"
+    endpoint = "https://nominatim.openstreetmap.org/search"
+    timeout = 2
+
+    def geocode(self, address):
+        query = urllib.parse.urlencode({"q": address, "format": "json", "limit": 1})
+        request = urllib.request.Request(
+            f"{self.endpoint}?{query}", headers={"User-Agent": "ImproveClean scheduler"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                results = json.load(response)
+        except (OSError, ValueError):
+            return None
+        if not results:
+            return None
+        return float(results[0]["lat"]), float(results[0]["lon"])
+
+
+_geocoder = None
+
+
+def get_geocoder():
+    global _geocoder
+    if _geocoder is None:
+        path = getattr(settings, "SCHEDULER_GEOCODER", None)
+        _geocoder = import_string(path)() if path else NullGeocoder()
+    return _geocoder
+
+
+def geocoding_enabled():
+    return not isinstance(get_geocoder(), NullGeocoder)
+
+
+def normalize_address(address):
+    return " ".join(address.lower().split())[:255]
+
+
+def geocode(address):
+    """Return cached or freshly geocoded coordinates for ``address``."""
+    query = normalize_address(address or "")
+    if not query:
+        return None
+    geocoder = get_geocoder()
+    cached = GeocodedAddress.objects.filter(query=query).first()
+    if cached is not None and cached.provider == geocoder.name:
+        if cached.latitude is None:
+            return None
+        return cached.latitude, cached.longitude
+    try:
+        point = geocoder.geocode(address)
+    except Exception:
+        # Not cached, so the address is tried again next time.
+        logger.warning("Geocoder %s failed for %r", geocoder.name, query, exc_info=True)
+        return None
+    latitude, longitude = point if point else (None, None)
+    try:
+        GeocodedAddress.objects.update_or_create(
+            query=query,
+            defaults={"latitude": latitude, "longitude": longitude, "provider": geocoder.name},
+        )
+    except IntegrityError:
+        pass
+    return point
+
+
+def locate_booking(booking_id, address):
+    """Store coordinates for a booking unless its address changed meanwhile."""
+    point = geocode(address)
+    if point:
+        Booking.objects.filter(pk=booking_id, address=address, latitude__isnull=True).update(
+            latitude=point[0], longitude=point[1]
+        )
+    return point
+
+
+def haversine_km(a, b):
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def grid_cell(point, size=GRID_CELL_DEGREES):
+    return math.floor(point[0] / size), math.floor(point[1] / size)
+
+
+class WorkerGrid:
+    """Uniform lat/lon grid over worker home bases."""
+
+    def __init__(self, entries, size=GRID_CELL_DEGREES):
+        self.size = size
+        self.cells = {}
+        for worker_id, point in entries:
+            self.cells.setdefault(grid_cell(point, size), []).append((worker_id, point))
+        self.count = len(entries)
+
+    def nearest(self, point, limit=5, exclude=()):
+        """Return up to ``limit`` ``(distance_km, worker_id)`` pairs, closest first.
+
+        Rings of cells are searched outward until the ring's nearest possible
+        point is farther than the current ``limit``-th candidate.
+        """
+        if not self.count:
+            return []
+        origin = grid_cell(point, self.size)
+        # One degree of latitude is ~111 km; longitude shrinks with latitude.
+        km_per_cell = self.size * 111.0 * max(math.cos(math.radians(point[0])), 0.01)
+        found = []
+        seen = 0
+        ring = 0
+        while seen < self.count:
+            if ring > MAX_RINGS:
+                # Sparse outliers: scan the remaining cells directly rather
+                # than walking thousands of empty rings.
+                for (row, col), entries in self.cells.items():
+                    if max(abs(row - origin[0]), abs(col - origin[1])) >= ring:
+                        found.extend(
+                            (haversine_km(point, home), worker_id)
+                            for worker_id, home in entries
+                            if worker_id not in exclude
+                        )
+                found.sort()
+                break
+            for cell in self._ring(origin, ring):
+                for worker_id, home in self.cells.get(cell, ()):
+                    seen += 1
+                    if worker_id not in exclude:
+                        found.append((haversine_km(point, home), worker_id))
+            found.sort()
+            if len(found) >= limit and found[limit - 1][0] <= ring * km_per_cell:
+                break
+            ring += 1
+        return found[:limit]
+
+    @staticmethod
+    def _ring(origin, radius):
+        row, col = origin
+        if radius == 0:
+            yield origin
+            return
+        for d in range(-radius, radius + 1):
+            yield row - radius, col + d
+            yield row + radius, col + d
+        for d in range(-radius + 1, radius):
+            yield row + d, col - radius
+            yield row + d, col + radius
+
+
+_grid_lock = threading.Lock()
+_grid = (None, None)
+
+
+def worker_grid():
+    """Grid of active workers' home bases, rebuilt when the roster changes."""
+    global _grid
+    version = roster.current_version()
+    if _grid[0] is not None and _grid[0] == version:
+        return _grid[1]
+    with _grid_lock:
+        entries = [
+            (worker_id, (lat, lon))
+            for worker_id, lat, lon in Worker.objects.filter(
+                is_active=True, home_latitude__isnull=False, home_longitude__isnull=False
+            ).values_list("id", "home_latitude", "home_longitude")
+        ]
+        grid = WorkerGrid(entries)
+        _grid = (version, grid)
+    return grid
+
+
+def busy_worker_ids(start, duration, exclude_booking=None):
+    """Workers with a live booking overlapping ``[start, start + duration)``."""
+    longest = max(duration_for(code) for code in SERVICE_DURATION_HOURS)
+    candidates = (
+        Booking.objects.filter(
+            worker__isnull=False,
+            scheduled_for__lt=start + duration,
+            scheduled_for__gt=start - longest,
+        )
+        .exclude(status="cancelled")
+        .exclude(pk=exclude_booking)
+        .values_list("worker_id", "scheduled_for", "service_type")
+    )
+    return {
+        worker_id
+        for worker_id, scheduled_for, service_type in candidates
+        if scheduled_for + duration_for(service_type) > start
+    }
+
+
+def nearest_available_workers(booking, limit=5):
+    """Closest active workers free at the booking's time, with distances in km."""
+    if booking.latitude is None or booking.longitude is None:
+        return []
+    busy = busy_worker_ids(
+        booking.scheduled_for, duration_for(booking.service_type), exclude_booking=booking.pk
+    )
+    matches = worker_grid().nearest(
+        (booking.latitude, booking.longitude), limit=limit, exclude=busy
+    )
+    results = []
+    for distance, worker_id in matches:
+        record = roster.get_active_worker(worker_id)
+        if record is not None:
+            results.append({"worker": record, "distance_km": round(distance, 1)})
+    return results
+
+
+def route_length(points, order, start=None):
+    total = 0.0
+    previous = start
+    for index in order:
+        if previous is not None:
+            total += haversine_km(previous, points[index])
+        previous = points[index]
+    return total
+
+
+def order_route(points, start=None):
+    """Order ``points`` to shorten the trip from ``start``; returns indices.
+
+    Builds a nearest-neighbour tour and then applies 2-opt segment reversals
+    until no reversal shortens it. Day routes are a handful of stops, so the
+    quadratic passes are cheap.
+    """
+    remaining = list(range(len(points)))
+    order = []
+    current = start
+    while remaining:
+        if current is None:
+            nxt = remaining[0]
+        else:
+            nxt = min(remaining, key=lambda i: haversine_km(current, points[i]))
+        order.append(nxt)
+        remaining.remove(nxt)
+        current = points[nxt]
+
+    improved = True
+    while improved:
+        improved = False
+        best = route_length(points, order, start)
+        for i in range(len(order) - 1):
+            for j in range(i + 1, len(order)):
+                candidate = order[:i] + order[i : j + 1][::-1] + order[j + 1 :]
+                length = route_length(points, candidate, start)
+                if length + 1e-9 < best:
+                    order, best, improved = candidate, length, True
+    return order
+
+
+def plan_day_route(worker, bookings):
+    """Order a worker's located bookings for one day from their home base.
+
+    Booked times are fixed, so stops follow ``scheduled_for``; only bookings
+    that share a start time are reordered to shorten the trip. Returns
+    ``(stops, total_km, unlocated)`` where each stop is a dict with the booking
+    and the leg distance from the previous stop.
+    """
+    located = [b for b in bookings if b.latitude is not None and b.longitude is not None]
+    unlocated = [b for b in bookings if b.latitude is None or b.longitude is None]
+    home = None
+    if worker.home_latitude is not None and worker.home_longitude is not None:
+        home = (worker.home_latitude, worker.home_longitude)
+    slots = {}
+    for booking in sorted(located, key=lambda b: (b.scheduled_for, b.pk)):
+        slots.setdefault(booking.scheduled_for, []).append(booking)
+    stops = []
+    total = 0.0
+    previous = home
+    for slot in slots.values():
+        points = [(b.latitude, b.longitude) for b in slot]
+        for index in order_route(points, previous):
+            leg = haversine_km(previous, points[index]) if previous is not None else 0.0
+            total += leg
+            stops.append({"booking": slot[index], "leg_km": round(leg, 1)})
+            previous = points[index]
+    return stops, round(total, 1), unlocated
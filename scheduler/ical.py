@@ -0,0 +1,205 @@
+"""Per-worker iCalendar feeds that calendar apps can subscribe to.
+
+Each worker gets a feed URL carrying a signed token, so it can be handed to
+the worker without an account. Calendar clients poll feeds every few minutes,
+which this module keeps cheap:
+
+* one aggregate over the worker's bookings in the feed window (the
+  ``(worker, scheduled_for)`` index) gives the ETag, and an unchanged feed
+  is answered with ``304 Not Modified`` from that alone. No
+  ``Last-Modified`` is sent: deletions and worker renames change the feed
+  without leaving a newer timestamp, so ``If-Modified-Since`` would keep
+  serving a stale copy;
+* otherwise the bookings are read with one range query and each ``VEVENT``
+  is taken from the cache, keyed on the booking id and ``updated_at``, so
+  only changed bookings are rendered again.
+
+Settings:
+
+* ``SCHEDULER_ICAL_LOOKBACK_DAYS`` - past days kept in the feed (default 30).
+"""
+
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
+
+from . import roster
+from .capacity import duration_for
+from .models import Booking
+
+SALT = "scheduler.ical"
+CHUNK_SECONDS = 24 * 60 * 60
+REFRESH_MINUTES = 15
+UID_DOMAIN = "improveclean"
+EVENT_FIELDS = (
+    "id",
+    "service_type",
+    "scheduled_for",
+    "address",
+    "notes",
+    "rush_cleaning",
+    "status",
+    "worker_response",
+    "updated_at",
+)
+
+
+def feed_token(worker_id):
+    return signing.Signer(salt=SALT).sign(str(worker_id))
+
+
+def feed_url(worker_id):
+    return reverse("worker_calendar", args=[feed_token(worker_id)])
+
+
+def worker_for_token(token):
+    try:
+        value = signing.Signer(salt=SALT).unsign(token)
+    except signing.BadSignature:
+        return None
+    return roster.get_active_worker(int(value)) if value.isdigit() else None
+
+
+def escape_text(value):
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold(line):
+    """Split ``line`` into 75-octet lines as RFC 5545 requires."""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line
+    parts, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Never split a UTF-8 sequence.
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start, limit = end, 74
+    return "\r\n ".join(parts)
+
+
+def format_utc(moment):
+    return moment.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def event_status(booking):
+    if booking.status == "cancelled":
+        return "CANCELLED"
+    if booking.worker_response == "accepted" or booking.status != "scheduled":
+        return "CONFIRMED"
+    return "TENTATIVE"
+
+
+def render_event(booking):
+    summary = booking.get_service_type_display()
+    if booking.rush_cleaning:
+        summary += " (rush)"
+    description = (
+        f"Status: {booking.get_status_display()}. "
+        f"Response: {booking.get_worker_response_display()}."
+    )
+    if booking.notes:
+        description += "\n\n" + booking.notes
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:booking-{booking.pk}@{UID_DOMAIN}",
+        f"DTSTAMP:{format_utc(booking.updated_at)}",
+        f"LAST-MODIFIED:{format_utc(booking.updated_at)}",
+        f"SEQUENCE:{int(booking.updated_at.timestamp())}",
+        f"DTSTART:{format_utc(booking.scheduled_for)}",
+        f"DTEND:{format_utc(booking.scheduled_for + duration_for(booking.service_type))}",
+        f"SUMMARY:{escape_text(summary)}",
+        f"LOCATION:{escape_text(booking.address)}",
+        f"DESCRIPTION:{escape_text(description)}",
+        f"STATUS:{event_status(booking)}",
+        "END:VEVENT",
+    ]
+    return "".join(fold(line) + "\r\n" for line in lines)
+
+
+def chunk_key(booking):
+    return f"scheduler:ical:{booking.pk}:{booking.updated_at.timestamp()}"
+
+
+def render_events(bookings):
+    """VEVENT text for ``bookings``, rendering only those not already cached."""
+    keys = [chunk_key(booking) for booking in bookings]
+    cached = cache.get_many(keys)
+    missing = {}
+    chunks = []
+    for key, booking in zip(keys, bookings):
+        if key not in cached:
+            cached[key] = missing[key] = render_event(booking)
+        chunks.append(cached[key])
+    if missing:
+        cache.set_many(missing, CHUNK_SECONDS)
+    return "".join(chunks)
+
+
+def feed_bookings(worker_id, now=None):
+    lookback = timedelta(days=getattr(settings, "SCHEDULER_ICAL_LOOKBACK_DAYS", 30))
+    return Booking.objects.filter(
+        worker_id=worker_id, scheduled_for__gte=(now or timezone.now()) - lookback
+    )
+
+
+def render_calendar(worker, bookings):
+    header = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//ImproveClean//Worker schedule//EN",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape_text(f'ImproveClean - {worker.name}')}",
+        f"REFRESH-INTERVAL;VALUE=DURATION:PT{REFRESH_MINUTES}M",
+        f"X-PUBLISHED-TTL:PT{REFRESH_MINUTES}M",
+    ]
+    return (
+        "".join(fold(line) + "\r\n" for line in header)
+        + render_events(bookings)
+        + "END:VCALENDAR\r\n"
+    )
+
+
+@require_safe
+def worker_calendar(request, token):
+    worker = worker_for_token(token)
+    if worker is None:
+        raise Http404("Unknown calendar.")
+    bookings = feed_bookings(worker.id)
+    watermark = bookings.aggregate(latest=Max("updated_at"), total=Count("id"))
+    latest = watermark["latest"]
+    # The count and roster version catch deletions and renames, which leave
+    # no newer updated_at behind.
+    etag = quote_etag(
+        f"{worker.id}-{roster.current_version()}-{watermark['total']}-"
+        f"{latest.timestamp() if latest else 0}"
+    )
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        rows = list(bookings.only(*EVENT_FIELDS).order_by("scheduled_for", "id"))
+        response = HttpResponse(
+            render_calendar(worker, rows), content_type="text/calendar; charset=utf-8"
+        )
+        response["Content-Disposition"] = f'inline; filename="worker-{worker.id}.ics"'
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, max_age=REFRESH_MINUTES * 60)
+    return response
@@ -0,0 +1,87 @@
+"""Idempotency keys that absorb double-submitted forms.
+
+Each rendered form carries a random key in a hidden ``idempotency_key``
+input. A view claims the key inside the same transaction as its write: the
+first claim inserts a row, and any replay of that submission (double-click,
+mobile retry, back-button resubmit) hits the unique constraint and is
+redirected to the original outcome without writing again. Keys expire after
+``SCHEDULER_IDEMPOTENCY_TTL`` seconds (default one hour); expired rows are
+removed by ``manage.py purge_idempotency_keys``.
+
+Submissions without a key (old cached pages, scripted clients) are processed
+normally.
+"""
+
+import re
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.shortcuts import redirect
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+FIELD_NAME = "idempotency_key"
+KEY_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def get_ttl():
+    return timedelta(seconds=getattr(settings, "SCHEDULER_IDEMPOTENCY_TTL", 3600))
+
+
+def submitted_key(request):
+    key = request.POST.get(FIELD_NAME, "")
+    return key if KEY_PATTERN.match(key) else None
+
+
+def issue_key(request):
+    """Key for a form being rendered; keeps the submitted key on re-render.
+
+    A form re-shown with validation errors never claimed its key, so the
+    corrected resubmission can reuse it.
+    """
+    if request.method == "POST":
+        key = submitted_key(request)
+        if key:
+            return key
+    return uuid.uuid4().hex
+
+
+def claim(request, scope, redirect_to):
+    """Claim the submitted key for ``scope``; call inside ``transaction.atomic()``.
+
+    Returns ``None`` when the caller should go ahead with its write, or a
+    redirect to ``redirect_to`` of the original submission when this one is
+    a replay. Rolling back the caller's transaction releases the key.
+    """
+    key = submitted_key(request)
+    if key is None:
+        return None
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(
+                key=key, scope=scope, response_url=redirect_to, expires_at=now + get_ttl()
+            )
+        return None
+    except IntegrityError:
+        pass
+    original = IdempotencyKey.objects.filter(key=key, scope=scope).first()
+    if original is not None and original.expires_at <= now:
+        # A lapsed claim is taken over by exactly one submission.
+        renewed = IdempotencyKey.objects.filter(pk=original.pk, expires_at__lte=now).update(
+            response_url=redirect_to, expires_at=now + get_ttl()
+        )
+        if renewed:
+            return None
+    messages.info(request, "We already received that request, so nothing was submitted twice.")
+    return redirect(original.response_url if original else redirect_to)
+
+
+def purge_expired(now=None):
+    """Delete lapsed keys and return how many were removed."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
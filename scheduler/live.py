@@ -0,0 +1,145 @@
+"""Live booking updates pushed to browsers over Server-Sent Events.
+
+Views publish small booking deltas once their transaction commits, and the
+``live_booking_events`` stream fans them out to connected customers and
+dispatchers instead of having them reload whole pages. Streaming needs the
+ASGI entry point in ``cleaning_site/asgi.py``.
+
+The default broker fans out inside the current process. Set
+``SCHEDULER_LIVE_BROKER`` to the dotted path of another broker class with the
+same ``publish``/``subscribe`` interface to share events between processes.
+"""
+
+import asyncio
+import contextlib
+import json
+import threading
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import events
+
+KEEPALIVE_SECONDS = 20
+RETRY_MILLISECONDS = 5000
+QUEUE_SIZE = 100
+
+
+class InProcessBroker:
+    """Fan events out to asyncio subscribers running in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._offer, queue, event)
+
+    @staticmethod
+    def _offer(queue, event):
+        if queue.full():
+            # A stalled client loses its oldest delta rather than blocking others.
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, "SCHEDULER_LIVE_BROKER", None)
+                _broker = import_string(path)() if path else InProcessBroker()
+    return _broker
+
+
+def booking_event(booking, kind):
+    return {
+        "type": kind,
+        "booking": booking.pk,
+        "user": booking.user_id,
+        "worker": booking.worker_id,
+        "status": booking.status,
+        "status_display": booking.get_status_display(),
+        "worker_response": booking.worker_response,
+        "worker_response_display": booking.get_worker_response_display(),
+        "at": timezone.now(),
+    }
+
+
+def publish_booking(booking, kind):
+    """Append ``kind`` to the booking event feed and push it live on commit."""
+    events.record(booking, kind)
+    event = booking_event(booking, kind)
+    transaction.on_commit(lambda: get_broker().publish(event))
+
+
+def publish_bookings(bookings, kind):
+    """``publish_booking`` for many bookings, recording their events in one insert."""
+    events.record_many(bookings, kind)
+    batch = [booking_event(booking, kind) for booking in bookings]
+
+    def publish():
+        broker = get_broker()
+        for event in batch:
+            broker.publish(event)
+
+    transaction.on_commit(publish)
+
+
+def format_event(event):
+    data = json.dumps(event, cls=DjangoJSONEncoder)
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+
+async def live_booking_events(request):
+    """Stream booking deltas: customers see their own, staff see all."""
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"error": "Live updates require the ASGI server."}, status=501
+        )
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=401)
+    sees_all = user.is_staff or user.is_superuser
+    broker = get_broker()
+
+    async def stream():
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+        async with broker.subscribe() as queue:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if sees_all or event["user"] == user.pk:
+                    yield format_event(event)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from scheduler.archive import ARCHIVE_AFTER, archivable_bookings, archive_bookings
+
+
+class Command(BaseCommand):
+    help = "Move old completed and cancelled bookings into the archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=ARCHIVE_AFTER.days,
+            help="Archive bookings scheduled more than this many days ago.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            default=None,
+            help="Stop after this many batches; rerun to continue.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report how many bookings are eligible without moving them.",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--days and --batch-size must be at least 1.")
+        older_than = timedelta(days=options["days"])
+        if options["dry_run"]:
+            eligible = archivable_bookings(older_than).count()
+            self.stdout.write(f"{eligible} booking(s) eligible for archival.")
+            return
+        try:
+            moved = archive_bookings(
+                older_than=older_than,
+                batch_size=options["batch_size"],
+                max_batches=options["max_batches"],
+            )
+        except IntegrityError as exc:
+            raise CommandError(
+                f"A booking id is already in the archive; that batch was left in place: {exc}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} booking(s)."))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduler.snapshot import refresh, snapshot_dir
+
+
+class Command(BaseCommand):
+    help = "Build or incrementally refresh the columnar booking snapshot used by analytics."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rebuild the snapshot from scratch instead of applying changes.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        stats = refresh(full=options["full"], batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Snapshot in {snapshot_dir()} has {stats['total']} booking(s): read "
+                f"{stats['read']}, appended {stats['appended']}, updated {stats['updated']}, "
+                f"removed {stats['removed']}."
+            )
+        )
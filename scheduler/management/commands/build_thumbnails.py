@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from scheduler.models import Worker
+from scheduler.thumbnails import build_for_worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Fetch worker photos and build their local thumbnails. Run on a schedule; "
+        "pages show the original photo until a thumbnail exists."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rebuild thumbnails that already exist.",
+        )
+
+    def handle(self, *args, **options):
+        workers = Worker.objects.exclude(photo_url="")
+        if not options["force"]:
+            workers = workers.filter(photo_thumb="")
+        built = failed = 0
+        for worker_id in workers.values_list("pk", flat=True).iterator():
+            if build_for_worker(worker_id):
+                built += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f"Built {built} thumbnail(s), {failed} failed."))
@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from scheduler.capacity import build_forecast
+
+
+class Command(BaseCommand):
+    help = "Forecast worker utilization and per-service staffing shortfall."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--weeks", type=int, default=4, help="Weeks to forecast ahead.")
+        parser.add_argument(
+            "--trailing-weeks",
+            type=int,
+            default=8,
+            help="Weeks of history used to project demand.",
+        )
+        parser.add_argument("--json", action="store_true", help="Emit the forecast as JSON.")
+
+    def handle(self, *args, **options):
+        if options["weeks"] < 1 or options["trailing_weeks"] < 1:
+            raise CommandError("--weeks and --trailing-weeks must be at least 1.")
+        forecast = build_forecast(weeks=options["weeks"], trailing_weeks=options["trailing_weeks"])
+        if options["json"]:
+            self.stdout.write(json.dumps(forecast, cls=DjangoJSONEncoder, indent=2))
+            return
+
+        self.stdout.write(
+            f"Capacity forecast {forecast['start']:%Y-%m-%d} to {forecast['end']:%Y-%m-%d} "
+            f"({forecast['working_hours_per_worker']:.0f} working hours per worker)"
+        )
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'Service':<20}{'Team':>6}{'Capacity h':>12}{'Projected h':>13}"
+            f"{'Saturated h':>13}{'Shortfall h':>13}{'Hire':>6}"
+        )
+        for row in forecast["services"]:
+            line = (
+                f"{row['label']:<20}{row['workers']:>6}{row['capacity_hours']:>12}"
+                f"{row['projected_hours']:>13}{row['saturation_hours']:>13}"
+                f"{row['shortfall_hours']:>13}{row['shortfall_workers']:>6}"
+            )
+            self.stdout.write(self.style.WARNING(line) if row["shortfall_hours"] else line)
+        self.stdout.write("")
+        self.stdout.write(f"{'Professional':<28}{'Booked h':>10}{'Util %':>8}  Weekly %")
+        for row in forecast["workers"]:
+            weekly = " ".join(f"{value:>5}" for value in row["weekly_utilization"])
+            self.stdout.write(
+                f"{row['name']:<28}{row['booked_hours']:>10}{row['utilization']:>8}  {weekly}"
+            )
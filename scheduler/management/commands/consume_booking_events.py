@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from scheduler.events import DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE, consume, serialize
+
+
+class Command(BaseCommand):
+    help = (
+        "Print new booking events as JSON lines and advance the named consumer past "
+        "them; rerun to pick up where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--consumer", default="cli", help="Consumer name to resume from.")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            default=None,
+            help="Stop after this many batches instead of draining the feed.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if not 1 <= batch_size <= MAX_BATCH_SIZE:
+            raise CommandError(f"--batch-size must be between 1 and {MAX_BATCH_SIZE}.")
+
+        def emit(batch):
+            for event in batch:
+                self.stdout.write(json.dumps(serialize(event), cls=DjangoJSONEncoder))
+
+        total = batches = 0
+        while options["max_batches"] is None or batches < options["max_batches"]:
+            batch = consume(options["consumer"], emit, batch_size)
+            if not batch:
+                break
+            total += len(batch)
+            batches += 1
+        self.stderr.write(f"Consumed {total} event(s) as {options['consumer']!r}.")
@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduler import query_audit
+
+
+class Command(BaseCommand):
+    help = (
+        "Explain the queries behind the admin index, worker form, dashboard and booking "
+        "form, against a throwaway seeded database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            action="append",
+            choices=sorted(query_audit.PATHS),
+            help="Audit only this code path; repeat for several.",
+        )
+        parser.add_argument("--workers", type=int, default=40)
+        parser.add_argument("--clients", type=int, default=200)
+        parser.add_argument("--bookings-per-client", type=int, default=5)
+        parser.add_argument("--json", action="store_true", help="Emit the report as JSON.")
+
+    def handle(self, *args, **options):
+        if min(options["workers"], options["clients"], options["bookings_per_client"]) < 1:
+            raise CommandError("--workers, --clients and --bookings-per-client must be at least 1.")
+        try:
+            with query_audit.scratch_databases():
+                results = query_audit.audit(
+                    paths=options["path"],
+                    workers=options["workers"],
+                    clients=options["clients"],
+                    bookings_per_client=options["bookings_per_client"],
+                )
+        except RuntimeError as exc:
+            raise CommandError(str(exc)) from exc
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'Path':<20}{'DB':<11}{'Calls':>6}{'Rows':>7}  {'Full scans':<28}"
+            f"{'Temp B-trees':<26}Statement"
+        )
+        for row in results:
+            statement = " ".join(row["sql"].split())
+            line = (
+                f"{row['path']:<20}{row['alias']:<11}{row['calls']:>6}"
+                f"{'-' if row['rows'] is None else row['rows']:>7}  "
+                f"{', '.join(row['full_scans']) or '-':<28}"
+                f"{', '.join(row['temp_btrees']) or '-':<24}  "
+                f"{statement[:80]}{'...' if len(statement) > 80 else ''}"
+            )
+            self.stdout.write(self.style.WARNING(line) if row["full_scans"] else line)
+        scans = sum(1 for row in results if row["full_scans"])
+        temps = sum(1 for row in results if row["temp_btrees"])
+        self.stdout.write("")
+        self.stdout.write(
+            f"{len(results)} statement(s); {scans} with full scans, {temps} with temp B-trees."
+        )
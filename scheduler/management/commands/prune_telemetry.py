@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduler.telemetry import prune
+
+
+class Command(BaseCommand):
+    help = "Delete admin page views and request profiles older than the retention window."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=getattr(settings, "SCHEDULER_TELEMETRY_RETENTION_DAYS", 90),
+            help="Keep telemetry from this many recent days.",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] < 1:
+            raise CommandError("--days must be at least 1.")
+        for label, deleted in prune(days=options["days"]).items():
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} {label}."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from scheduler import clients
+from scheduler.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recompute worker booking counters and client profiles, repairing any drift."
+
+    def handle(self, *args, **options):
+        repaired = reconcile()
+        self.stdout.write(self.style.SUCCESS(f"Repaired counters for {repaired} worker(s)."))
+        rebuilt = clients.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} client profile(s)."))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduler.sweeper import pending, sweep
+
+
+class Command(BaseCommand):
+    help = "Move bookings whose visit has started or ended to in progress or completed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            default=None,
+            help="Stop after this many batches; rerun to continue from the checkpoint.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report how many started bookings are still scheduled or in progress.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        if options["dry_run"]:
+            self.stdout.write(f"{pending().count()} booking(s) to check.")
+            return
+        moved = sweep(batch_size=options["batch_size"], max_batches=options["max_batches"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Started {moved['in_progress']} and completed {moved['completed']} booking(s)."
+            )
+        )
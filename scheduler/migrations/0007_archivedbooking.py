@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0006_application'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('service_type', models.CharField(choices=[('standard', 'Standard Cleaning'), ('deep', 'Deep Cleaning'), ('move_out', 'Move In/Out'), ('office', 'Office Cleaning')], max_length=50)),
+                ('scheduled_for', models.DateTimeField()),
+                ('address', models.CharField(max_length=255)),
+                ('notes', models.TextField(blank=True)),
+                ('rush_cleaning', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('worker_response', models.CharField(choices=[('pending', 'Awaiting Response'), ('accepted', 'Accepted'), ('declined', 'Declined')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to=settings.AUTH_USER_MODEL)),
+                ('worker', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_bookings', to='scheduler.worker')),
+            ],
+            options={
+                'ordering': ['scheduled_for'],
+                'indexes': [models.Index(fields=['user', 'scheduled_for'], name='scheduler_a_user_id_57708e_idx')],
+            },
+        ),
+    ]
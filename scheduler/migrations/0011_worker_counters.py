@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:37
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.utils import timezone
+
+
+def backfill_counters(apps, schema_editor):
+    Worker = apps.get_model("scheduler", "Worker")
+    Booking = apps.get_model("scheduler", "Booking")
+    ArchivedBooking = apps.get_model("scheduler", "ArchivedBooking")
+    totals = {}
+    for model in (Booking, ArchivedBooking):
+        rows = (
+            model.objects.filter(worker__isnull=False)
+            .values("worker_id")
+            .annotate(
+                booking_count=Count("id"),
+                completed_count=Count("id", filter=Q(status="completed")),
+                cancelled_count=Count("id", filter=Q(status="cancelled")),
+                accepted_count=Count("id", filter=Q(worker_response="accepted")),
+            )
+        )
+        for row in rows:
+            entry = totals.setdefault(row.pop("worker_id"), dict.fromkeys(row, 0))
+            for name, value in row.items():
+                entry[name] += value
+    next_booking = Subquery(
+        Booking.objects.filter(
+            worker=OuterRef("pk"), status="scheduled", scheduled_for__gte=timezone.now()
+        )
+        .order_by("scheduled_for")
+        .values("scheduled_for")[:1]
+    )
+    workers = list(Worker.objects.annotate(upcoming=next_booking))
+    for worker in workers:
+        for name, value in totals.get(worker.pk, {}).items():
+            setattr(worker, name, value)
+        worker.next_booking_at = worker.upcoming
+    Worker.objects.bulk_update(
+        workers,
+        ["booking_count", "completed_count", "cancelled_count", "accepted_count", "next_booking_at"],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0010_requestprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='worker',
+            name='accepted_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='worker',
+            name='booking_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='worker',
+            name='cancelled_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='worker',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='worker',
+            name='next_booking_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='worker',
+            index=models.Index(fields=['-booking_count', 'name'], name='scheduler_worker_rank_idx'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+
+def backfill_profiles(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Booking = apps.get_model("scheduler", "Booking")
+    ArchivedBooking = apps.get_model("scheduler", "ArchivedBooking")
+    ClientProfile = apps.get_model("scheduler", "ClientProfile")
+    stats = {}
+    for model in (Booking, ArchivedBooking):
+        rows = model.objects.values("user_id").annotate(
+            booking_count=Count("id"),
+            cancelled_count=Count("id", filter=Q(status="cancelled")),
+            rush_count=Count("id", filter=Q(rush_cleaning=True)),
+            first=Min("scheduled_for"),
+            last=Max("scheduled_for"),
+        )
+        for row in rows:
+            entry = stats.setdefault(
+                row["user_id"],
+                {"booking_count": 0, "cancelled_count": 0, "rush_count": 0},
+            )
+            for name in ("booking_count", "cancelled_count", "rush_count"):
+                entry[name] += row[name]
+            entry["first_booking_at"] = min(
+                filter(None, (entry.get("first_booking_at"), row["first"]))
+            )
+            entry["last_booking_at"] = max(
+                filter(None, (entry.get("last_booking_at"), row["last"]))
+            )
+    ClientProfile.objects.bulk_create(
+        [
+            ClientProfile(
+                user_id=pk,
+                signed_up_at=joined,
+                cohort=timezone.localtime(joined).date().replace(day=1),
+                **stats.get(pk, {}),
+            )
+            for pk, joined in User.objects.values_list("pk", "date_joined")
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('scheduler', '0011_worker_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientProfile',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='client_profile', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('signed_up_at', models.DateTimeField(db_index=True)),
+                ('cohort', models.DateField(db_index=True)),
+                ('first_booking_at', models.DateTimeField(blank=True, null=True)),
+                ('last_booking_at', models.DateTimeField(blank=True, null=True)),
+                ('booking_count', models.PositiveIntegerField(db_index=True, default=0)),
+                ('cancelled_count', models.PositiveIntegerField(default=0)),
+                ('rush_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_profiles, migrations.RunPython.noop),
+    ]
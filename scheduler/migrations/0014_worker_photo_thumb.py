@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0013_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='worker',
+            name='photo_thumb',
+            field=models.CharField(blank=True, editable=False, max_length=24),
+        ),
+    ]
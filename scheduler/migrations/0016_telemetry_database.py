@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, migrations, models
+
+
+def copy_existing_rows(apps, schema_editor):
+    """Carry page views and profiles over from default into the telemetry database."""
+    alias = schema_editor.connection.alias
+    if alias == DEFAULT_DB_ALIAS:
+        return
+    source_tables = connections[DEFAULT_DB_ALIAS].introspection.table_names()
+    for name in ("AdminPageView", "RequestProfile"):
+        model = apps.get_model("scheduler", name)
+        if model._meta.db_table not in source_tables:
+            continue
+        rows = model.objects.using(DEFAULT_DB_ALIAS).order_by("pk").iterator(chunk_size=500)
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == 500:
+                model.objects.using(alias).bulk_create(batch)
+                batch = []
+        model.objects.using(alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0015_booking_events'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='adminpageview',
+            name='user',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='admin_page_views', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='requestprofile',
+            name='user',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='request_profiles', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(
+            copy_existing_rows,
+            migrations.RunPython.noop,
+            hints={'model_name': 'adminpageview'},
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0016_telemetry_database'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['worker', 'scheduled_for'], name='scheduler_b_worker__3b0a4d_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 
@@ -18,17 +19,43 @@ class Worker(models.Model):
     service_focus = models.CharField(max_length=50, choices=SERVICE_CHOICES)
     experience_years = models.PositiveIntegerField(default=1)
     photo_url = models.URLField(blank=True)
+    # Content-hash stem of the local thumbnails; see scheduler.thumbnails.
+    photo_thumb = models.CharField(max_length=24, blank=True, editable=False)
     bio = models.TextField(blank=True)
     contact_email = models.EmailField(blank=True)
     phone_number = models.CharField(max_length=30, blank=True)
     is_active = models.BooleanField(default=True)
+    home_base = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Where the worker starts their day; geocoded for route planning.",
+    )
+    home_latitude = models.FloatField(null=True, blank=True)
+    home_longitude = models.FloatField(null=True, blank=True)
+    # Denormalized booking totals, kept current by scheduler.counters and
+    # repaired with ``manage.py reconcile_counters``.
+    booking_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_count = models.PositiveIntegerField(default=0, editable=False)
+    cancelled_count = models.PositiveIntegerField(default=0, editable=False)
+    accepted_count = models.PositiveIntegerField(default=0, editable=False)
+    next_booking_at = models.DateTimeField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["name"]
+        indexes = [
+            models.Index(fields=["-booking_count", "name"], name="scheduler_worker_rank_idx")
+        ]
 
     def __str__(self) -> str:
         return self.name
 
+    @property
+    def avatar(self):
+        from .thumbnails import avatar_urls
+
+        return avatar_urls(self.pk, self.photo_url, self.photo_thumb)
+
 
 class Booking(models.Model):
     """A scheduled cleaning appointment tied to a user."""
@@ -54,6 +81,8 @@ class Booking(models.Model):
     service_type = models.CharField(max_length=50, choices=SERVICE_CHOICES)
     scheduled_for = models.DateTimeField()
     address = models.CharField(max_length=255)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
     notes = models.TextField(blank=True)
     worker = models.ForeignKey(
         "Worker",
@@ -70,9 +99,25 @@ class Booking(models.Model):
         max_length=20, choices=WORKER_RESPONSE_CHOICES, default="pending"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["scheduled_for"]
+        indexes = [
+            models.Index(fields=["updated_at"]),
+            models.Index(fields=["worker", "scheduled_for"]),
+            models.Index(fields=["status", "scheduled_for"]),
+        ]
+
+    COUNTER_FIELDS = (
+        "user_id",
+        "worker_id",
+        "service_type",
+        "status",
+        "worker_response",
+        "rush_cleaning",
+        "scheduled_for",
+    )
 
     def __str__(self) -> str:
         worker_name = f" with {self.worker.name}" if self.worker else ""
@@ -80,13 +125,179 @@ class Booking(models.Model):
             f"{self.get_service_type_display()} on {self.scheduled_for:%Y-%m-%d %H:%M}{worker_name}"
         )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the worker counters and client profile last saw, so a
+        # save can apply only the difference without reading the row again.
+        if not instance.get_deferred_fields() & set(cls.COUNTER_FIELDS):
+            instance._counter_state = instance.counter_state()
+        return instance
+
+    def counter_state(self):
+        return {field: getattr(self, field) for field in self.COUNTER_FIELDS}
+
+
+class ArchivedBooking(models.Model):
+    """A completed or cancelled booking moved out of the hot booking table.
+
+    Rows keep the primary key they had as a ``Booking`` so links and exports
+    stay stable across archival.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_bookings",
+    )
+    service_type = models.CharField(max_length=50, choices=SERVICE_CHOICES)
+    scheduled_for = models.DateTimeField()
+    address = models.CharField(max_length=255)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    notes = models.TextField(blank=True)
+    worker = models.ForeignKey(
+        "Worker",
+        on_delete=models.SET_NULL,
+        related_name="archived_bookings",
+        null=True,
+        blank=True,
+    )
+    rush_cleaning = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    worker_response = models.CharField(
+        max_length=20, choices=Booking.WORKER_RESPONSE_CHOICES
+    )
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    is_archived = True
+
+    class Meta:
+        ordering = ["scheduled_for"]
+        indexes = [models.Index(fields=["user", "scheduled_for"])]
+
+    def __str__(self) -> str:
+        worker_name = f" with {self.worker.name}" if self.worker else ""
+        return (
+            f"{self.get_service_type_display()} on {self.scheduled_for:%Y-%m-%d %H:%M}{worker_name} (archived)"
+        )
+
+
+class GeocodedAddress(models.Model):
+    """Persistent cache of geocoder answers, keyed by normalized address."""
+
+    query = models.CharField(max_length=255, unique=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    provider = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "geocoded addresses"
+
+    def __str__(self) -> str:
+        if self.latitude is None:
+            return f"{self.query} (not found)"
+        return f"{self.query} ({self.latitude:.5f}, {self.longitude:.5f})"
+
+
+class ClientProfile(models.Model):
+    """Per-client booking summary kept current by ``scheduler.clients``.
+
+    Totals include archived bookings. ``cohort`` is the first day of the
+    month the client signed up in.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="client_profile",
+    )
+    signed_up_at = models.DateTimeField(db_index=True)
+    cohort = models.DateField(db_index=True)
+    first_booking_at = models.DateTimeField(null=True, blank=True)
+    last_booking_at = models.DateTimeField(null=True, blank=True)
+    booking_count = models.PositiveIntegerField(default=0, db_index=True)
+    cancelled_count = models.PositiveIntegerField(default=0)
+    rush_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"Profile for user {self.user_id}"
+
+
+class BookingEvent(models.Model):
+    """One append-only entry in the booking change feed.
+
+    Rows are never updated or deleted; the auto-increment ``id`` is the feed
+    position consumers resume from. ``booking_id`` is a plain integer so
+    events outlive the booking they describe.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    booking_id = models.BigIntegerField(db_index=True)
+    kind = models.CharField(max_length=40)
+    user_id = models.BigIntegerField(null=True)
+    worker_id = models.BigIntegerField(null=True)
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"#{self.pk} {self.kind} booking {self.booking_id}"
+
+
+class EventConsumer(models.Model):
+    """A named reader of the booking event feed and how far it has read."""
+
+    name = models.SlugField(max_length=80, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.name} @ {self.position}"
+
+
+class SweepCheckpoint(models.Model):
+    """Where a status sweep over past bookings stopped; see ``scheduler.sweeper``."""
+
+    name = models.SlugField(max_length=80, unique=True)
+    scheduled_for = models.DateTimeField(null=True, blank=True)
+    booking_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.name} @ {self.scheduled_for} #{self.booking_id}"
+
+
+class IdempotencyKey(models.Model):
+    """A claimed form submission; see ``scheduler.idempotency``."""
+
+    key = models.CharField(max_length=32)
+    scope = models.CharField(max_length=80)
+    response_url = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "key"], name="scheduler_idempotency_unique")
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.scope} {self.key}"
+
 
 class AdminPageView(models.Model):
     """Lightweight page view tracker for the concierge admin dashboard."""
 
+    # Stored in the telemetry database when enabled; see ``scheduler.telemetry``.
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
-        on_delete=models.SET_NULL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
         null=True,
         blank=True,
         related_name="admin_page_views",
@@ -105,6 +316,44 @@ class AdminPageView(models.Model):
         return f"{who} viewed {self.path} at {self.viewed_at:%Y-%m-%d %H:%M:%S}"
 
 
+class RequestProfile(models.Model):
+    """A captured cProfile run for one slow or explicitly profiled request."""
+
+    TRIGGER_CHOICES = [
+        ("header", "Request header"),
+        ("session", "Staff toggle"),
+        ("sample", "Random sample"),
+    ]
+
+    # Stored in the telemetry database when enabled; see ``scheduler.telemetry``.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="request_profiles",
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    top_functions = models.JSONField(default=list)
+    stats = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-duration_ms"]),
+            models.Index(fields=["created_at"]),
+        ]
+        ordering = ["-duration_ms"]
+
+    def __str__(self) -> str:
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
 class Application(models.Model):
     """Inbound application from the Work With Us form."""
 
@@ -0,0 +1,185 @@
+"""Opt-in cProfile capture for slow requests.
+
+A request is profiled when a staff user sends ``X-Profile: 1``, when a user
+who is still staff has switched profiling on for their session from the
+admin, or when it is picked by random sampling. The admin switch also sets a
+cookie, so other requests never load the user or session just to find out
+profiling is off. Sampled requests are only kept if they ran for longer than
+the latency threshold, so the table fills with the slow tail.
+
+Configure with ``SCHEDULER_PROFILING``::
+
+    SCHEDULER_PROFILING = {"SAMPLE_RATE": 0.01, "THRESHOLD_MS": 500}
+
+Each stored profile keeps the top cumulative functions for quick reading and
+the full stats, compressed, for download as a ``.prof`` file.
+"""
+
+import cProfile
+import marshal
+import pstats
+import random
+import time
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .models import RequestProfile
+
+SESSION_KEY = "scheduler_profile_requests"
+# Set alongside the session flag so requests without it skip the session.
+COOKIE_NAME = "scheduler_profile"
+HEADER = "HTTP_X_PROFILE"
+DEFAULTS = {
+    "SAMPLE_RATE": 0.0,
+    "THRESHOLD_MS": 500,
+    "TOP_FUNCTIONS": 25,
+}
+
+
+def get_setting(name):
+    return getattr(settings, "SCHEDULER_PROFILING", {}).get(name, DEFAULTS[name])
+
+
+def top_functions(stats, limit):
+    """Summarize the ``limit`` functions with the highest cumulative time."""
+    rows = []
+    for (filename, line, name), (cc, ncalls, tottime, cumtime, _callers) in stats.stats.items():
+        rows.append(
+            {
+                "function": name,
+                "location": f"{filename}:{line}",
+                "calls": ncalls,
+                "primitive_calls": cc,
+                "tottime_ms": round(tottime * 1000, 2),
+                "cumtime_ms": round(cumtime * 1000, 2),
+            }
+        )
+    rows.sort(key=lambda row: row["cumtime_ms"], reverse=True)
+    return rows[:limit]
+
+
+def compress_stats(stats):
+    """Serialize stats in the ``pstats`` file format, zlib-compressed."""
+    return zlib.compress(marshal.dumps(stats.stats))
+
+
+def decompress_stats(blob):
+    return zlib.decompress(bytes(blob))
+
+
+def start_profiler():
+    """Return an enabled profiler, or None if another one is active on this thread."""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+def sampled():
+    rate = get_setting("SAMPLE_RATE")
+    return bool(rate) and random.random() < rate
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def requested_for(self, request):
+        """Return how profiling was asked for, before any staff check."""
+        if request.META.get(HEADER) == "1":
+            return "header"
+        if request.COOKIES.get(COOKIE_NAME) == "1":
+            return "session"
+        return None
+
+    def trigger_for(self, requested):
+        return requested or ("sample" if sampled() else None)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Lazy: nothing is loaded unless profiling was asked for or sampled.
+        user = getattr(request, "user", None)
+        requested = self.requested_for(request)
+        if requested:
+            # Staff rights are re-checked on every request, so revoking them
+            # also stops profiling switched on earlier in the session. The
+            # session flag is only read once the user is known to be staff.
+            if user is None or not user.is_staff:
+                requested = None
+            elif requested == "session" and not request.session.get(SESSION_KEY):
+                requested = None
+        trigger = self.trigger_for(requested)
+        profiler = start_profiler() if trigger else None
+        if profiler is None:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        record = self.record(request, user, response, trigger, started, profiler)
+        if record is not None:
+            record.save()
+        return response
+
+    async def __acall__(self, request):
+        user = None
+        requested = self.requested_for(request)
+        if requested:
+            user = await request.auser() if hasattr(request, "auser") else None
+            if user is None or not user.is_staff:
+                requested = None
+            elif requested == "session" and not await request.session.aget(SESSION_KEY):
+                requested = None
+        trigger = self.trigger_for(requested)
+        profiler = start_profiler() if trigger else None
+        if profiler is None:
+            return await self.get_response(request)
+
+        # Under ASGI the profile also catches whatever else the event loop ran
+        # while this request was awaiting.
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+        if user is None and hasattr(request, "auser"):
+            user = await request.auser()
+        record = self.record(request, user, response, trigger, started, profiler)
+        if record is not None:
+            await record.asave()
+        return response
+
+    def record(self, request, user, response, trigger, started, profiler):
+        """Build the unsaved ``RequestProfile``, or None if it should not be kept.
+
+        Streaming responses produce their body after the view returns, so their
+        profile would miss the work; they are passed through untouched.
+        """
+        duration_ms = (time.perf_counter() - started) * 1000
+        if response.streaming:
+            return None
+        if trigger == "sample" and duration_ms < get_setting("THRESHOLD_MS"):
+            return None
+        stats = pstats.Stats(profiler)
+        return RequestProfile(
+            user=user if user is not None and user.is_authenticated else None,
+            method=request.method,
+            path=request.path[:255],
+            status_code=response.status_code,
+            duration_ms=round(duration_ms, 2),
+            trigger=trigger,
+            top_functions=top_functions(stats, get_setting("TOP_FUNCTIONS")),
+            stats=compress_stats(stats),
+        )
@@ -0,0 +1,222 @@
+"""Query plans for the statements behind the busiest screens.
+
+``audit()`` seeds a dataset with ``seed_dataset`` and then runs each audited
+code path, recording every statement it sends:
+
+* ``admin-index`` - ``SuperuserAdminSite.index``;
+* ``worker-change-form`` - ``WorkerAdmin.changeform_view`` for a worker;
+* ``dashboard`` - ``DashboardView.get_context_data`` for a customer;
+* ``booking-form`` - validating and saving a ``BookingForm``.
+
+Each distinct SELECT, UPDATE or DELETE is then explained on the database it
+ran against. The report gives the number of calls, the row count, the tables
+read with a full scan and the temporary B-trees built for ORDER BY, GROUP BY
+or DISTINCT. SQLite plans come from ``EXPLAIN QUERY PLAN``, which has no row
+estimates, so the rows a SELECT actually returns are given instead.
+PostgreSQL uses ``EXPLAIN (ANALYZE, FORMAT JSON)`` and reports the planner's
+estimate, with sorts and grouping aggregates in place of temp B-trees. Other
+backends get their plain ``EXPLAIN`` output only.
+
+``scratch_databases()`` points every connection at a fresh, migrated test
+database for the run, as the test runner does, so the audit never locks or
+reads production tables and its plans depend only on the seed. Inside it,
+``audit()`` still works in transactions that are rolled back.
+"""
+
+import contextlib
+import json
+import re
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.urls import reverse
+from django.utils import timezone
+
+from . import availability, roster
+from .forms import BookingForm
+from .models import Booking
+from .seeding import seed_dataset
+
+EXPLAINED = ("SELECT", "UPDATE", "DELETE", "WITH")
+AUDIT_USERNAME = "query-audit-admin"
+_SQLITE_SCAN = re.compile(r"SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+_SQLITE_TEMP = "USE TEMP B-TREE FOR "
+
+
+def admin_index(context):
+    return context["admin"].get(reverse("superuser_admin:index"))
+
+
+def worker_change_form(context):
+    worker = context["data"]["workers"][0]
+    return context["admin"].get(
+        reverse("superuser_admin:scheduler_worker_change", args=[worker.pk])
+    )
+
+
+def dashboard(context):
+    return context["customer"].get(reverse("dashboard"))
+
+
+def booking_form(context):
+    worker = context["data"]["workers"][0]
+    form = BookingForm(
+        data={
+            "service_type": worker.service_focus,
+            "scheduled_for": (timezone.localtime() + timedelta(days=3)).strftime("%Y-%m-%dT%H:%M"),
+            "address": "1 Audit Street",
+            "notes": "",
+            "worker": worker.pk,
+        }
+    )
+    if not form.is_valid():
+        raise RuntimeError(f"BookingForm rejected the audit booking: {form.errors.as_json()}")
+    booking = form.save(commit=False)
+    booking.user = context["data"]["clients"][0]
+    booking.save()
+    return None
+
+
+PATHS = {
+    "admin-index": admin_index,
+    "worker-change-form": worker_change_form,
+    "dashboard": dashboard,
+    "booking-form": booking_form,
+}
+
+
+class Recorder:
+    """``execute_wrapper`` that keeps each distinct statement with its call count."""
+
+    def __init__(self):
+        self.path = None
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().split(None, 1)[0].upper() in EXPLAINED:
+            key = (self.path, context["connection"].alias, sql)
+            entry = self.statements.setdefault(
+                key, {"path": self.path, "alias": key[1], "sql": sql, "params": params, "calls": 0}
+            )
+            entry["calls"] += 1
+        return execute(sql, params, many, context)
+
+
+def explain_sqlite(cursor, sql, params):
+    cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+    plan = [row[-1] for row in cursor.fetchall()]
+    rows = None
+    if sql.lstrip().upper().startswith(("SELECT", "WITH")):
+        cursor.execute(sql, params)
+        rows = len(cursor.fetchall())
+    return {
+        "rows": rows,
+        "full_scans": [match.group(1) for match in map(_SQLITE_SCAN.match, plan) if match],
+        "temp_btrees": [line[len(_SQLITE_TEMP):] for line in plan if line.startswith(_SQLITE_TEMP)],
+        "plan": plan,
+    }
+
+
+def explain_postgresql(cursor, sql, params):
+    cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params)
+    document = cursor.fetchone()[0]
+    if isinstance(document, str):
+        document = json.loads(document)
+    root = document[0]["Plan"]
+    full_scans, temp_btrees, plan = [], [], []
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        kind = node["Node Type"]
+        relation = node.get("Relation Name")
+        plan.append("  " * depth + kind + (f" on {relation}" if relation else ""))
+        if kind == "Seq Scan":
+            full_scans.append(relation)
+        elif kind in ("Sort", "Incremental Sort"):
+            temp_btrees.append("SORT " + ", ".join(node.get("Sort Key", [])))
+        elif kind in ("Aggregate", "Group") and node.get("Group Key"):
+            strategy = node.get("Strategy", "Sorted").upper()
+            temp_btrees.append(f"GROUP BY ({strategy}) " + ", ".join(node["Group Key"]))
+        stack.extend((child, depth + 1) for child in reversed(node.get("Plans", [])))
+    return {
+        "rows": root.get("Plan Rows"),
+        "full_scans": full_scans,
+        "temp_btrees": temp_btrees,
+        "plan": plan,
+    }
+
+
+def explain_generic(cursor, sql, params, connection):
+    cursor.execute(connection.ops.explain_query_prefix() + " " + sql, params)
+    return {
+        "rows": None,
+        "full_scans": [],
+        "temp_btrees": [],
+        "plan": [" | ".join(str(value) for value in row) for row in cursor.fetchall()],
+    }
+
+
+def explain(alias, sql, params):
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            return explain_sqlite(cursor, sql, params)
+        if connection.vendor == "postgresql":
+            return explain_postgresql(cursor, sql, params)
+        return explain_generic(cursor, sql, params, connection)
+
+
+@contextlib.contextmanager
+def scratch_databases():
+    """Run the block against throwaway copies of every database alias."""
+    old_config = setup_databases(verbosity=0, interactive=False, aliases=set(connections))
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+def audit(paths=None, workers=40, clients=200, bookings_per_client=5):
+    """Explain the statements of ``paths`` (all by default); returns one dict per statement."""
+    paths = list(paths or PATHS)
+    aliases = list(connections)
+    recorder = Recorder()
+    try:
+        with ExitStack() as stack:
+            for alias in aliases:
+                stack.enter_context(transaction.atomic(using=alias))
+            stack.enter_context(override_settings(ALLOWED_HOSTS=["testserver"]))
+
+            data = seed_dataset(
+                workers=workers, clients=clients, bookings_per_client=bookings_per_client
+            )
+            superuser = get_user_model().objects.create_superuser(AUDIT_USERNAME, None, None)
+            customer = Booking.objects.filter(user__in=data["clients"]).earliest("pk").user
+            context = {"data": data, "admin": Client(), "customer": Client()}
+            context["admin"].force_login(superuser)
+            context["customer"].force_login(customer)
+
+            with ExitStack() as wrappers:
+                for alias in aliases:
+                    wrappers.enter_context(connections[alias].execute_wrapper(recorder))
+                for name in paths:
+                    recorder.path = name
+                    response = PATHS[name](context)
+                    if response is not None and response.status_code != 200:
+                        raise RuntimeError(f"{name} answered {response.status_code}.")
+
+            results = []
+            for entry in recorder.statements.values():
+                params = entry.pop("params")
+                results.append({**entry, **explain(entry["alias"], entry["sql"], params)})
+            for alias in aliases:
+                transaction.set_rollback(True, using=alias)
+    finally:
+        # The seeded workers reached the roster and availability caches.
+        roster.invalidate()
+        availability.invalidate()
+    return results
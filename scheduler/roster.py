@@ -0,0 +1,121 @@
+"""Process-local cache of the active worker roster.
+
+The roster changes rarely but is read on every dashboard view and booking
+submission, so each process keeps an immutable snapshot of it. Snapshots are
+tagged with a version number kept in the Django cache; saving or deleting a
+``Worker`` bumps the version and every process reloads on its next read.
+With the default local-memory cache the version is per process, so
+deployments running several processes should configure a shared cache.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+
+from django.core.cache import cache
+
+from .models import SERVICE_CHOICES, Worker
+
+VERSION_KEY = "scheduler:roster:version"
+SERVICE_LABELS = dict(SERVICE_CHOICES)
+RECORD_FIELDS = (
+    "id",
+    "name",
+    "headline",
+    "service_focus",
+    "experience_years",
+    "photo_url",
+    "photo_thumb",
+    "bio",
+    "contact_email",
+    "phone_number",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class WorkerRecord:
+    """Read-only view of an active worker, shaped like the model for templates."""
+
+    id: int
+    name: str
+    headline: str
+    service_focus: str
+    experience_years: int
+    photo_url: str
+    photo_thumb: str
+    bio: str
+    contact_email: str
+    phone_number: str
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def avatar(self):
+        from .thumbnails import avatar_urls
+
+        return avatar_urls(self.id, self.photo_url, self.photo_thumb)
+
+    @property
+    def photo_thumbnail(self):
+        avatar = self.avatar
+        return avatar["jpg"] if avatar else ""
+
+    def get_service_focus_display(self):
+        return SERVICE_LABELS.get(self.service_focus, self.service_focus)
+
+    def __str__(self) -> str:
+        return self.name
+
+
+_lock = threading.Lock()
+# (version, records, records_by_id), swapped as a whole so readers never see
+# a half-updated roster.
+_snapshot = (None, (), {})
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a version evicted from the cache never comes
+        # back with a value a process already holds.
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _load():
+    global _snapshot
+    version = current_version()
+    snapshot = _snapshot
+    if snapshot[0] is not None and snapshot[0] == version:
+        return snapshot
+    with _lock:
+        if _snapshot[0] is not None and _snapshot[0] == version:
+            return _snapshot
+        records = tuple(
+            WorkerRecord(**row)
+            for row in Worker.objects.filter(is_active=True)
+            .order_by("name", "id")
+            .values(*RECORD_FIELDS)
+        )
+        _snapshot = (version, records, {record.id: record for record in records})
+        return _snapshot
+
+
+def get_roster():
+    """Return the active workers, ordered by name then id, as a tuple of records."""
+    return _load()[1]
+
+
+def get_active_worker(worker_id):
+    """Return the record for an active worker, or ``None``."""
+    return _load()[2].get(worker_id)
+
+
+def invalidate():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
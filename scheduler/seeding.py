@@ -0,0 +1,85 @@
+"""Deterministic sample data for performance tests and query audits."""
+
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from . import counters, roster
+from .clients import rebuild as rebuild_profiles
+from .models import SERVICE_CHOICES, Booking, Worker
+
+STATUSES = ("scheduled", "scheduled", "in_progress", "completed", "cancelled")
+RESPONSES = ("pending", "accepted", "declined")
+
+
+def seed_dataset(workers=4, clients=5, bookings_per_client=3, now=None, seed=0):
+    """Create workers, clients and bookings spread around ``now``.
+
+    Bookings cover past and upcoming weeks, every status and service, rush
+    and regular requests, and both assigned and unassigned visits, so every
+    dashboard section has rows to render. Returns the created objects.
+    """
+    rng = random.Random(seed)
+    now = now or timezone.now()
+    services = [code for code, _ in SERVICE_CHOICES]
+    User = get_user_model()
+
+    worker_objs = Worker.objects.bulk_create(
+        [
+            Worker(
+                name=f"Seed Worker {index:03d}",
+                headline="Seeded professional",
+                service_focus=services[index % len(services)],
+                experience_years=1 + index % 10,
+                contact_email=f"worker{index}@example.com",
+                phone_number=f"555-01{index:02d}",
+            )
+            for index in range(workers)
+        ]
+    )
+    roster.invalidate()
+
+    client_objs = User.objects.bulk_create(
+        [
+            User(
+                username=f"seed-client-{index:04d}",
+                email=f"client{index}@example.com",
+                first_name="Seed",
+                last_name=f"Client {index}",
+                date_joined=now - timedelta(days=rng.randint(0, 120)),
+            )
+            for index in range(clients)
+        ]
+    )
+
+    bookings = []
+    for client in client_objs:
+        for index in range(bookings_per_client):
+            scheduled_for = now + timedelta(
+                days=rng.randint(-45, 21), hours=rng.randint(0, 23)
+            )
+            worker = rng.choice(worker_objs) if worker_objs and index % 4 else None
+            bookings.append(
+                Booking(
+                    user=client,
+                    service_type=rng.choice(services),
+                    scheduled_for=scheduled_for,
+                    address=f"{rng.randint(1, 999)} Seed Street",
+                    worker=worker,
+                    rush_cleaning=index % 3 == 0,
+                    status=rng.choice(STATUSES),
+                    worker_response=rng.choice(RESPONSES) if worker else "pending",
+                )
+            )
+    booking_objs = Booking.objects.bulk_create(bookings)
+    # created_at is auto_now_add; backdate it so lead times and trends vary.
+    for booking in booking_objs:
+        booking.created_at = booking.scheduled_for - timedelta(days=rng.randint(0, 30))
+    Booking.objects.bulk_update(booking_objs, ["created_at"])
+    # bulk_create skips the signals that maintain counters and profiles.
+    counters.reconcile(now=now)
+    rebuild_profiles()
+
+    return {"workers": worker_objs, "clients": client_objs, "bookings": booking_objs}
@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import availability, clients, counters, geo, roster, telemetry
+from .models import Booking, Worker
+
+
+@receiver(post_save, sender=Worker)
+@receiver(post_delete, sender=Worker)
+def invalidate_roster(sender, **kwargs):
+    # Bump now for this connection and again once the change is visible to
+    # other connections, so no process keeps a roster read mid-transaction.
+    roster.invalidate()
+    transaction.on_commit(roster.invalidate)
+
+
+@receiver(post_save, sender=Booking)
+def geocode_booking(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and "address" not in update_fields:
+        return
+    if instance.latitude is None and geo.geocoding_enabled():
+        # After commit, so booking requests never wait on the provider.
+        booking_id, address = instance.pk, instance.address
+        transaction.on_commit(lambda: geo.locate_booking(booking_id, address))
+
+
+@receiver(pre_save, sender=Worker)
+def geocode_worker_home(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and "home_base" not in update_fields:
+        return
+    if instance.home_base and instance.home_latitude is None and geo.geocoding_enabled():
+        point = geo.geocode(instance.home_base)
+        if point:
+            instance.home_latitude, instance.home_longitude = point
+
+
+@receiver(pre_save, sender=Booking)
+def remember_counter_state(sender, instance, **kwargs):
+    if instance._state.adding or hasattr(instance, "_counter_state"):
+        return
+    # Instances not loaded through the ORM: read the stored state once.
+    instance._counter_state = (
+        Booking.objects.filter(pk=instance.pk).values(*Booking.COUNTER_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=Booking)
+def update_worker_counters(sender, instance, created, **kwargs):
+    new_state = instance.counter_state()
+    if not counters.is_suspended():
+        old_state = None if created else instance._counter_state
+        counters.apply_change(old_state, new_state)
+        clients.apply_change(old_state, new_state)
+        transaction.on_commit(lambda: availability.booking_changed(old_state, new_state))
+    instance._counter_state = new_state
+
+
+@receiver(post_delete, sender=Booking)
+def release_worker_counters(sender, instance, **kwargs):
+    if not counters.is_suspended():
+        old_state = getattr(instance, "_counter_state", instance.counter_state())
+        counters.apply_change(old_state, None)
+        clients.apply_change(old_state, None)
+        transaction.on_commit(lambda: availability.booking_changed(old_state, None))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_client_profile(sender, instance, created, **kwargs):
+    if created:
+        clients.create_profile(instance)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def detach_user_telemetry(sender, instance, **kwargs):
+    # Telemetry rows live in another database, so the delete cannot cascade.
+    telemetry.clear_user(instance.pk)
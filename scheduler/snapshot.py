@@ -0,0 +1,420 @@
+"""Columnar, memory-mapped copy of the booking table for ad-hoc analytics.
+
+Each booking column is kept as a typed NumPy array in its own ``.npy`` file
+under ``SCHEDULER_SNAPSHOT_DIR`` (default ``var/booking_snapshot``):
+
+* timestamps as ``int64`` Unix seconds, with ``MISSING`` for nulls;
+* service, status and worker response as ``int8`` codes into the choice
+  lists saved in ``meta.json``, and workers as ``int32`` codes into its
+  worker id list (``-1`` for unassigned);
+* rush and liveness as ``bool``.
+
+Readers map the files read-only, so a report reads only the pages of the
+columns it touches and never queries the database.
+
+``refresh()`` (``manage.py build_booking_snapshot``) is incremental. It reads
+only the rows whose ``updated_at`` is at or after the saved watermark, less
+``OVERLAP`` for transactions that committed late. Known ids are rewritten in
+place and new ids are appended. When the live count no longer matches, one
+pass over the primary key marks deleted and archived bookings as gone.
+``meta.json`` is replaced atomically last, so readers never see a length
+beyond the rows written.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .analytics import resolve_timezone
+from .models import SERVICE_CHOICES, Booking
+
+FORMAT_VERSION = 1
+COLUMNS = {
+    "id": "<i8",
+    "user_id": "<i8",
+    "worker": "<i4",
+    "service": "i1",
+    "status": "i1",
+    "response": "i1",
+    "rush": "?",
+    "alive": "?",
+    "scheduled_for": "<i8",
+    "created_at": "<i8",
+    "updated_at": "<i8",
+    "client_joined": "<i8",
+}
+MISSING = np.iinfo(np.int64).min
+INITIAL_CAPACITY = 1024
+OVERLAP = timedelta(minutes=5)
+CLIENT_AGE_BINS = (30, 90, 180, 365)
+SOURCE_FIELDS = (
+    "id",
+    "user_id",
+    "worker_id",
+    "service_type",
+    "status",
+    "worker_response",
+    "rush_cleaning",
+    "scheduled_for",
+    "created_at",
+    "updated_at",
+    "user__date_joined",
+)
+
+
+def snapshot_dir():
+    root = getattr(settings, "SCHEDULER_SNAPSHOT_DIR", None)
+    return Path(root or Path(settings.BASE_DIR) / "var" / "booking_snapshot")
+
+
+def current_codes():
+    return {
+        "service": [code for code, _ in SERVICE_CHOICES],
+        "status": [code for code, _ in Booking.STATUS_CHOICES],
+        "response": [code for code, _ in Booking.WORKER_RESPONSE_CHOICES],
+    }
+
+
+def to_seconds(moment):
+    return MISSING if moment is None else int(moment.timestamp())
+
+
+def read_meta(directory):
+    try:
+        meta = json.loads((directory / "meta.json").read_text())
+    except FileNotFoundError:
+        return None
+    return meta if meta.get("format") == FORMAT_VERSION else None
+
+
+def write_meta(directory, meta):
+    tmp = directory / "meta.json.tmp"
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, directory / "meta.json")
+
+
+def open_columns(directory, mode):
+    return {name: np.load(directory / f"{name}.npy", mmap_mode=mode) for name in COLUMNS}
+
+
+def allocate(directory, capacity, columns=None, length=0):
+    """Write empty column files of ``capacity`` rows, copying ``length`` rows over."""
+    for name, dtype in COLUMNS.items():
+        tmp = directory / f"{name}.tmp.npy"
+        array = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=(capacity,))
+        if columns is not None:
+            array[:length] = columns[name][:length]
+        array.flush()
+        del array
+        os.replace(tmp, directory / f"{name}.npy")
+    return open_columns(directory, "r+")
+
+
+def empty_meta():
+    return {
+        "format": FORMAT_VERSION,
+        "length": 0,
+        "capacity": INITIAL_CAPACITY,
+        "last_id": 0,
+        "watermark": None,
+        "built_at": None,
+        "codes": current_codes(),
+        "workers": [],
+    }
+
+
+def encode(rows, meta):
+    """Turn ``SOURCE_FIELDS`` tuples into one array per column."""
+    lookups = {
+        name: {code: i for i, code in enumerate(codes)} for name, codes in meta["codes"].items()
+    }
+    worker_codes = {worker_id: i for i, worker_id in enumerate(meta["workers"])}
+    encoded = {name: [] for name in COLUMNS}
+    for row in rows:
+        pk, user_id, worker_id, service, status, response, rush = row[:7]
+        scheduled, created, updated, joined = row[7:]
+        if worker_id is not None and worker_id not in worker_codes:
+            worker_codes[worker_id] = len(meta["workers"])
+            meta["workers"].append(worker_id)
+        encoded["id"].append(pk)
+        encoded["user_id"].append(user_id)
+        encoded["worker"].append(-1 if worker_id is None else worker_codes[worker_id])
+        encoded["service"].append(lookups["service"].get(service, -1))
+        encoded["status"].append(lookups["status"].get(status, -1))
+        encoded["response"].append(lookups["response"].get(response, -1))
+        encoded["rush"].append(rush)
+        encoded["alive"].append(True)
+        encoded["scheduled_for"].append(to_seconds(scheduled))
+        encoded["created_at"].append(to_seconds(created))
+        encoded["updated_at"].append(to_seconds(updated))
+        encoded["client_joined"].append(to_seconds(joined))
+    return {name: np.array(values, dtype=COLUMNS[name]) for name, values in encoded.items()}
+
+
+def apply_batch(directory, columns, meta, batch):
+    """Merge encoded rows into the column files; returns ``(columns, appended, updated)``."""
+    length = meta["length"]
+    ids = columns["id"][:length]
+    positions = np.searchsorted(ids, batch["id"])
+    known = positions < length
+    known[known] = ids[positions[known]] == batch["id"][known]
+    for name in COLUMNS:
+        columns[name][positions[known]] = batch[name][known]
+
+    fresh = ~known
+    appended = int(fresh.sum())
+    if appended:
+        if length + appended > meta["capacity"]:
+            meta["capacity"] = max(meta["capacity"] * 2, length + appended)
+            columns = allocate(directory, meta["capacity"], columns, length)
+        end = length + appended
+        order = np.argsort(batch["id"][fresh], kind="stable")
+        for name in COLUMNS:
+            columns[name][length:end] = batch[name][fresh][order]
+        # Ids committed out of order would break the binary search above.
+        if length and columns["id"][length] < columns["id"][length - 1]:
+            order = np.argsort(columns["id"][:end], kind="stable")
+            for name in COLUMNS:
+                columns[name][:end] = columns[name][:end][order]
+        meta["length"] = end
+    return columns, appended, int(known.sum())
+
+
+def refresh(full=False, batch_size=5000, now=None):
+    """Bring the snapshot up to date; returns what changed and the live total."""
+    directory = snapshot_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    meta = read_meta(directory)
+    if full or meta is None or meta["codes"] != current_codes():
+        # Readers see no snapshot rather than old lengths over new files.
+        (directory / "meta.json").unlink(missing_ok=True)
+        meta = empty_meta()
+        columns = allocate(directory, meta["capacity"])
+    else:
+        columns = open_columns(directory, "r+")
+
+    rows = Booking.objects.order_by("updated_at", "pk").values_list(*SOURCE_FIELDS)
+    if meta["watermark"]:
+        rows = rows.filter(updated_at__gte=parse_datetime(meta["watermark"]) - OVERLAP)
+    stats = {"read": 0, "appended": 0, "updated": 0, "removed": 0}
+    watermark = None
+    chunk = []
+    for row in rows.iterator(chunk_size=batch_size):
+        chunk.append(row)
+        watermark = row[9]
+        if len(chunk) == batch_size:
+            columns = merge(directory, columns, meta, chunk, stats)
+            chunk = []
+    if chunk:
+        columns = merge(directory, columns, meta, chunk, stats)
+
+    length = meta["length"]
+    alive = columns["alive"][:length]
+    live_total = Booking.objects.count()
+    if int(alive.sum()) != live_total:
+        live_ids = np.fromiter(
+            Booking.objects.order_by().values_list("pk", flat=True).iterator(), dtype=np.int64
+        )
+        before = int(alive.sum())
+        alive[:] = np.isin(columns["id"][:length], live_ids)
+        stats["removed"] = before - int(alive.sum())
+
+    for array in columns.values():
+        array.flush()
+    if watermark is not None:
+        meta["watermark"] = watermark.isoformat()
+    meta["last_id"] = int(columns["id"][length - 1]) if length else 0
+    meta["built_at"] = (now or timezone.now()).isoformat()
+    write_meta(directory, meta)
+    stats["total"] = live_total
+    return stats
+
+
+def merge(directory, columns, meta, chunk, stats):
+    columns, appended, updated = apply_batch(directory, columns, meta, encode(chunk, meta))
+    stats["read"] += len(chunk)
+    stats["appended"] += appended
+    stats["updated"] += updated
+    return columns
+
+
+def percent(part, whole):
+    return round(part / whole * 100, 1) if whole else 0
+
+
+class Snapshot:
+    """Read-only view of a built snapshot with vectorized metrics."""
+
+    def __init__(self, meta, columns):
+        self.meta = meta
+        self.built_at = parse_datetime(meta["built_at"])
+        self.codes = meta["codes"]
+        self.columns = {name: column[: meta["length"]] for name, column in columns.items()}
+        self.live = self.columns["alive"]
+        self.total = int(self.live.sum())
+
+    def code(self, column, value):
+        return self.codes[column].index(value)
+
+    def where(self, *, status=None, service=None, rush=None, scheduled=None, created=None):
+        """Mask of live bookings matching every filter given.
+
+        ``scheduled`` and ``created`` are ``(start, end)`` pairs of datetimes;
+        either end may be ``None``.
+        """
+        mask = self.live.copy()
+        if status is not None:
+            mask &= self.columns["status"] == self.code("status", status)
+        if service is not None:
+            mask &= self.columns["service"] == self.code("service", service)
+        if rush is not None:
+            mask &= self.columns["rush"] == rush
+        for column, bounds in (("scheduled_for", scheduled), ("created_at", created)):
+            if bounds is None:
+                continue
+            start, end = bounds
+            values = self.columns[column]
+            if start is not None:
+                mask &= values >= to_seconds(start)
+            if end is not None:
+                mask &= (values < to_seconds(end)) & (values != MISSING)
+        return mask
+
+    def count_by(self, column, mask=None):
+        """``{code: count}`` over one coded column, every code included."""
+        mask = self.live if mask is None else mask
+        codes = self.codes[column]
+        values = self.columns[column][mask]
+        totals = np.bincount(values[values >= 0], minlength=len(codes))
+        return dict(zip(codes, totals.tolist()))
+
+    def lead_days(self, mask):
+        mask = mask & (self.columns["created_at"] != MISSING)
+        if not mask.any():
+            return None
+        lead = self.columns["scheduled_for"][mask] - self.columns["created_at"][mask]
+        return float(lead.mean()) / 86400
+
+    def dashboard_metrics(self, now=None):
+        """The booking metrics of the admin index, from the snapshot."""
+        now = now or timezone.now()
+        last_30 = now - timedelta(days=30)
+        recent = self.where(scheduled=(last_30, None))
+        recent_total = int(recent.sum())
+        recent_status = self.count_by("status", recent)
+        status_counts = self.count_by("status")
+        service_counts = self.count_by("service")
+        lead = self.lead_days(self.live)
+        labels = dict(Booking.STATUS_CHOICES)
+        service_labels = dict(SERVICE_CHOICES)
+        return {
+            "total_bookings": self.total,
+            "status_summary": [
+                {
+                    "code": code,
+                    "label": labels.get(code, code),
+                    "total": total,
+                    "percent": percent(total, self.total),
+                }
+                for code, total in status_counts.items()
+            ],
+            "service_summary": [
+                {"code": code, "label": service_labels.get(code, code), "total": total}
+                for code, total in service_counts.items()
+            ],
+            "rush_total": int(self.where(rush=True).sum()),
+            "created_last_7": int(self.where(created=(now - timedelta(days=7), None)).sum()),
+            "created_last_30": int(self.where(created=(last_30, None)).sum()),
+            "recent_completed": recent_status["completed"],
+            "recent_cancelled": recent_status["cancelled"],
+            "recent_completion_rate": percent(recent_status["completed"], recent_total),
+            "recent_cancellation_rate": percent(recent_status["cancelled"], recent_total),
+            "unassigned_total": int((self.live & (self.columns["worker"] < 0)).sum()),
+            "avg_lead_days": round(lead, 1) if lead else 0,
+        }
+
+    def lead_time_by_service(self):
+        labels = dict(SERVICE_CHOICES)
+        rows = []
+        for code in self.codes["service"]:
+            mask = self.where(service=code)
+            lead = self.lead_days(mask)
+            rows.append(
+                {
+                    "code": code,
+                    "label": labels.get(code, code),
+                    "bookings": int(mask.sum()),
+                    "avg_lead_days": round(lead, 1) if lead is not None else None,
+                }
+            )
+        return rows
+
+    def local_hours(self, seconds, tz):
+        """Local hour of day for each Unix timestamp, honouring DST per hour."""
+        hours, inverse = np.unique(seconds // 3600, return_inverse=True)
+        offsets = np.array(
+            [
+                datetime.fromtimestamp(int(hour) * 3600, tz).utcoffset().total_seconds()
+                for hour in hours
+            ],
+            dtype=np.int64,
+        )
+        return ((seconds + offsets[inverse]) // 3600) % 24
+
+    def rush_ratio_by_hour(self, tz_name=None):
+        """Share of requests made in each local hour that asked for rush service."""
+        tz = resolve_timezone(tz_name)
+        mask = self.live & (self.columns["created_at"] != MISSING)
+        hours = self.local_hours(self.columns["created_at"][mask], tz)
+        requests = np.bincount(hours, minlength=24)
+        rush = np.bincount(hours, weights=self.columns["rush"][mask], minlength=24).astype(int)
+        return [
+            {
+                "hour": hour,
+                "bookings": int(requests[hour]),
+                "rush": int(rush[hour]),
+                "ratio": percent(int(rush[hour]), int(requests[hour])),
+            }
+            for hour in range(24)
+        ]
+
+    def cancellations_by_client_age(self, bins=CLIENT_AGE_BINS):
+        """Cancellation rate by how many days the client had been signed up when booking."""
+        mask = (
+            self.live
+            & (self.columns["created_at"] != MISSING)
+            & (self.columns["client_joined"] != MISSING)
+        )
+        age_days = (self.columns["created_at"][mask] - self.columns["client_joined"][mask]) // 86400
+        bucket = np.digitize(age_days, bins)
+        cancelled = self.columns["status"][mask] == self.code("status", "cancelled")
+        bookings = np.bincount(bucket, minlength=len(bins) + 1)
+        cancels = np.bincount(bucket, weights=cancelled, minlength=len(bins) + 1).astype(int)
+        edges = (0, *bins)
+        rows = []
+        for index, low in enumerate(edges):
+            label = f"{low}-{bins[index]} days" if index < len(bins) else f"{low}+ days"
+            rows.append(
+                {
+                    "label": label,
+                    "bookings": int(bookings[index]),
+                    "cancelled": int(cancels[index]),
+                    "rate": percent(int(cancels[index]), int(bookings[index])),
+                }
+            )
+        return rows
+
+
+def load(directory=None):
+    """Map the snapshot read-only; ``None`` if it has not been built yet."""
+    directory = directory or snapshot_dir()
+    meta = read_meta(directory)
+    if meta is None or meta["built_at"] is None:
+        return None
+    return Snapshot(meta, open_columns(directory, "r"))
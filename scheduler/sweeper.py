@@ -0,0 +1,140 @@
+"""Move elapsed bookings through ``in_progress`` to ``completed``.
+
+Nothing else advances a booking once it is scheduled, so without this sweep
+past visits stay "scheduled" forever. That skews the completion and
+cancellation rates on the admin index and the worker counters.
+
+The sweep walks bookings that are still scheduled or in progress and have
+already started. It walks them in ``(scheduled_for, id)`` order over the
+``(status, scheduled_for)`` index, ``batch_size`` rows at a time, with one
+short transaction per batch. Each batch uses conditional ``UPDATE``s that
+re-check the status, service and start time, so a booking cancelled,
+rescheduled or changed to a longer service mid-sweep is left alone. The same
+transaction keeps worker counters and the booking event feed in step, and
+stamps ``updated_at`` with the time of the write so incremental readers
+(the staff feed, ETags and the analytics snapshot) pick the change up. Each
+run ends by moving ``Worker.next_booking_at`` past visits that have started.
+
+The position after each batch is saved in ``SweepCheckpoint``, so a run cut
+short with ``max_batches`` resumes where it stopped. A finished pass resets
+it, and the next pass starts from the beginning again, which stays cheap
+because swept rows leave the index range.
+"""
+
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import counters
+from .capacity import duration_for
+from .live import publish_bookings
+from .models import Booking, SweepCheckpoint, Worker
+
+ACTIVE_STATUSES = ("scheduled", "in_progress")
+CHECKPOINT_NAME = "booking-status"
+FIELDS = (
+    "id",
+    "user_id",
+    "worker_id",
+    "service_type",
+    "scheduled_for",
+    "address",
+    "status",
+    "worker_response",
+    "rush_cleaning",
+    "updated_at",
+)
+
+
+def target_status(booking, now):
+    """The status an elapsed booking should have at ``now``, or ``None``."""
+    if booking.scheduled_for + duration_for(booking.service_type) <= now:
+        return "completed"
+    if booking.scheduled_for <= now and booking.status == "scheduled":
+        return "in_progress"
+    return None
+
+
+def pending(now=None):
+    """Bookings the sweep would still look at."""
+    return Booking.objects.filter(
+        status__in=ACTIVE_STATUSES, scheduled_for__lte=now or timezone.now()
+    )
+
+
+def sweep_batch(checkpoint, batch_size, now):
+    """Sweep the next batch after ``checkpoint``; returns ``(rows_read, {status: moved})``."""
+    candidates = pending(now)
+    if checkpoint.scheduled_for is not None:
+        candidates = candidates.filter(
+            Q(scheduled_for__gt=checkpoint.scheduled_for)
+            | Q(scheduled_for=checkpoint.scheduled_for, pk__gt=checkpoint.booking_id)
+        )
+    moved = Counter()
+    with transaction.atomic():
+        batch = list(candidates.order_by("scheduled_for", "pk").only(*FIELDS)[:batch_size])
+        groups = defaultdict(list)
+        for booking in batch:
+            target = target_status(booking, now)
+            if target is not None:
+                groups[(booking.status, booking.service_type, target)].append(booking)
+
+        written_at = timezone.now()
+        completed_by_worker = Counter()
+        for (current, service_type, target), bookings in groups.items():
+            ids = [booking.pk for booking in bookings]
+            # Only rows that would still get ``target`` as they stand now.
+            due_by = now - duration_for(service_type) if target == "completed" else now
+            Booking.objects.filter(
+                pk__in=ids, status=current, service_type=service_type, scheduled_for__lte=due_by
+            ).update(status=target, updated_at=written_at)
+            changed = set(
+                Booking.objects.filter(
+                    pk__in=ids, status=target, updated_at=written_at
+                ).values_list("pk", flat=True)
+            )
+            swept = [booking for booking in bookings if booking.pk in changed]
+            for booking in swept:
+                booking.status = target
+                booking.updated_at = written_at
+                if target == "completed" and booking.worker_id:
+                    completed_by_worker[booking.worker_id] += 1
+            if swept:
+                publish_bookings(swept, "booking.status")
+            moved[target] += len(swept)
+        # QuerySet.update() skips the counter signals.
+        for worker_id, total in completed_by_worker.items():
+            Worker.objects.filter(pk=worker_id).update(
+                completed_count=F("completed_count") + total
+            )
+
+        if len(batch) < batch_size:
+            checkpoint.scheduled_for, checkpoint.booking_id = None, 0
+        else:
+            checkpoint.scheduled_for, checkpoint.booking_id = batch[-1].scheduled_for, batch[-1].pk
+        checkpoint.save()
+    return len(batch), moved
+
+
+def sweep(batch_size=500, max_batches=None, now=None):
+    """Sweep elapsed bookings in batches; returns ``{status: moved}``.
+
+    Stops after a full pass, or after ``max_batches`` with the checkpoint
+    saved for the next run. ``now`` only decides which bookings are due;
+    each batch stamps ``updated_at`` with the time it is written.
+    """
+    now = now or timezone.now()
+    checkpoint, _ = SweepCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+    moved = Counter()
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        read, batch_moved = sweep_batch(checkpoint, batch_size, now)
+        moved.update(batch_moved)
+        batches += 1
+        if read < batch_size:
+            break
+    # Started visits no longer count as a worker's next booking.
+    counters.refresh_next_bookings()
+    return {status: moved[status] for status in ("in_progress", "completed")}
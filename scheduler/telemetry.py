@@ -0,0 +1,89 @@
+"""Separate database for append-heavy telemetry.
+
+Admin page views and request profiles are written on every tracked request.
+``TelemetryRouter`` can send those models to their own database alias so
+their inserts never wait on the write lock that booking transactions hold.
+The split is opt-in: until ``SCHEDULER_TELEMETRY_DB`` names an alias in
+``DATABASES``, everything stays on ``default`` and the usual single
+``migrate`` creates every table. To enable it, migrate the alias first and
+only then set the setting::
+
+    python manage.py migrate --database telemetry
+    SCHEDULER_TELEMETRY_DB = "telemetry"
+
+Their user foreign keys have no database constraint and ``DO_NOTHING`` on
+delete, since the users live in the other database; the ``post_delete``
+signal clears them instead. ``prune()`` (``manage.py prune_telemetry``)
+drops rows older than ``SCHEDULER_TELEMETRY_RETENTION_DAYS`` (default 90).
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .models import AdminPageView, RequestProfile
+
+# Model -> timestamp column that retention is measured on.
+TELEMETRY_MODELS = {
+    AdminPageView: "viewed_at",
+    RequestProfile: "created_at",
+}
+_LABELS = {model._meta.label_lower for model in TELEMETRY_MODELS}
+
+
+def get_alias():
+    alias = getattr(settings, "SCHEDULER_TELEMETRY_DB", None)
+    return alias if alias in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+def is_telemetry(model_or_instance):
+    return model_or_instance._meta.label_lower in _LABELS
+
+
+class TelemetryRouter:
+    def _route(self, model, **hints):
+        if is_telemetry(model):
+            return get_alias()
+        # Users and other rows reached from a telemetry row live on default,
+        # not on the database the row itself came from.
+        instance = hints.get("instance")
+        if instance is not None and is_telemetry(instance):
+            return DEFAULT_DB_ALIAS
+        return None
+
+    db_for_read = _route
+    db_for_write = _route
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if is_telemetry(obj1) or is_telemetry(obj2):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        alias = get_alias()
+        if alias == DEFAULT_DB_ALIAS:
+            return None
+        if model_name is not None and f"{app_label}.{model_name}" in _LABELS:
+            return db == alias
+        if db == alias:
+            return False
+        return None
+
+
+def clear_user(user_id):
+    for model in TELEMETRY_MODELS:
+        model.objects.filter(user_id=user_id).update(user=None)
+
+
+def prune(days=None, now=None):
+    """Delete telemetry older than the retention window; returns ``{label: count}``."""
+    if days is None:
+        days = getattr(settings, "SCHEDULER_TELEMETRY_RETENTION_DAYS", 90)
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    removed = {}
+    for model, column in TELEMETRY_MODELS.items():
+        deleted, _ = model.objects.filter(**{f"{column}__lt": cutoff}).delete()
+        removed[model._meta.verbose_name_plural] = deleted
+    return removed
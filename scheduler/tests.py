@@ -1,3 +1,2021 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Add tests for the scheduler app here.
+import numpy as np
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import IntegrityError, connections, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from PIL import Image
+
+from . import (
+    analytics,
+    api,
+    availability,
+    capacity,
+    clients,
+    counters,
+    events,
+    geo,
+    ical,
+    idempotency,
+    live,
+    profiling,
+    query_audit,
+    roster,
+    snapshot,
+    sweeper,
+    telemetry,
+    thumbnails,
+)
+from .archive import archive_batch, archive_bookings
+from .forms import BookingForm
+from .models import (
+    AdminPageView,
+    Application,
+    ArchivedBooking,
+    Booking,
+    BookingEvent,
+    ClientProfile,
+    EventConsumer,
+    GeocodedAddress,
+    IdempotencyKey,
+    RequestProfile,
+    SweepCheckpoint,
+    Worker,
+)
+from .seeding import seed_dataset
+
+
+class QueryBudgetMixin:
+    """Fixed query budgets for every page, API endpoint and admin screen.
+
+    The same budgets are asserted against datasets of different sizes, so a
+    query that runs once per row (an N+1) fails the larger dataset even when
+    the small one passes. Caches are cleared and the worker roster and
+    availability engine are warmed before each test so counts do not depend
+    on test order.
+    """
+
+    databases = {"default", "telemetry"}
+    dataset = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset(**cls.dataset)
+        # Archive a quarter of the bookings so history pages have rows too.
+        archive_batch([booking.pk for booking in cls.data["bookings"][1::4]])
+        cls.superuser = get_user_model().objects.create_superuser(
+            "budget-admin", "admin@example.com", "budget-pass-123"
+        )
+        RequestProfile.objects.bulk_create(
+            [
+                RequestProfile(
+                    user=client,
+                    method="GET",
+                    path="/dashboard/",
+                    status_code=200,
+                    duration_ms=600,
+                    trigger="sample",
+                    top_functions=[],
+                    stats=b"",
+                )
+                for client in cls.data["clients"]
+            ]
+        )
+        cls.worker = cls.data["workers"][0]
+        cls.booking = (
+            Booking.objects.filter(status="scheduled", worker__isnull=False)
+            .exclude(worker_response="accepted")
+            .select_related("user")
+            .earliest("pk")
+        )
+        cls.customer = cls.booking.user
+
+    def setUp(self):
+        cache.clear()
+        ContentType.objects.clear_cache()
+        roster.get_roster()
+        availability.get_engine()
+
+    def as_customer(self):
+        self.client.force_login(self.customer)
+
+    def as_superuser(self):
+        self.client.force_login(self.superuser)
+
+    def future_slot(self):
+        return (timezone.localtime() + timedelta(days=3)).strftime("%Y-%m-%dT%H:%M")
+
+    # Public pages
+
+    def test_landing(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse("landing")).status_code, 200)
+
+    def test_about(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse("about")).status_code, 200)
+
+    def test_services(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse("services")).status_code, 200)
+
+    def test_register_form(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse("register")).status_code, 200)
+
+    def test_login_form(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse("login")).status_code, 200)
+
+    def test_logout(self):
+        self.as_customer()
+        with self.assertNumQueries(4):
+            self.assertEqual(self.client.post(reverse("logout")).status_code, 302)
+
+    def test_work_with_us_form(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse("work_with_us")).status_code, 200)
+
+    def test_work_with_us_submit(self):
+        data = {
+            "full_name": "Budget Applicant",
+            "email": "applicant@example.com",
+            "phone": "555-0100",
+            "experience": "Five years of residential cleaning.",
+            "idempotency_key": uuid.uuid4().hex,
+        }
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse("work_with_us"), data)
+        self.assertEqual(response.status_code, 302)
+
+    # Customer pages
+
+    def test_account(self):
+        self.as_customer()
+        with self.assertNumQueries(4):
+            self.assertEqual(self.client.get(reverse("account")).status_code, 200)
+
+    def test_dashboard(self):
+        self.as_customer()
+        with self.assertNumQueries(4):
+            self.assertEqual(self.client.get(reverse("dashboard")).status_code, 200)
+
+    def test_dashboard_filtered(self):
+        self.as_customer()
+        url = reverse("dashboard") + "?team_service=deep&team_search=seed"
+        with self.assertNumQueries(4):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_dashboard_worker_fragment(self):
+        self.as_customer()
+        url = reverse("dashboard_workers_fragment") + "?team_service=deep&team_search=seed"
+        # Session and user only; the roster and rendered fragment are cached.
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_dashboard_bookings_fragment(self):
+        self.as_customer()
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("dashboard_bookings_fragment"))
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse("dashboard_bookings_fragment"), HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_dashboard_slots_fragment(self):
+        self.as_customer()
+        url = reverse("dashboard_slots_fragment") + f"?service_type=deep&worker={self.worker.pk}"
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_dashboard_history(self):
+        self.as_customer()
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("dashboard") + "?history=all")
+        self.assertEqual(response.status_code, 200)
+
+    def test_dashboard_booking_submit(self):
+        self.as_customer()
+        data = {
+            "service_type": "deep",
+            "scheduled_for": self.future_slot(),
+            "address": "1 Budget Way",
+            "worker": self.worker.pk,
+            "idempotency_key": uuid.uuid4().hex,
+        }
+        with self.assertNumQueries(11):
+            response = self.client.post(reverse("dashboard"), data)
+        self.assertEqual(response.status_code, 302)
+
+    def test_cancel_booking(self):
+        self.as_customer()
+        url = reverse("cancel_booking", args=[self.booking.pk])
+        with self.assertNumQueries(12):
+            response = self.client.post(url, {"idempotency_key": uuid.uuid4().hex})
+        self.assertEqual(response.status_code, 302)
+
+    # JSON API
+
+    def test_api_bookings(self):
+        self.as_customer()
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("api_bookings"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_api_bookings_not_modified(self):
+        self.as_customer()
+        etag = self.client.get(reverse("api_bookings"))["ETag"]
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("api_bookings"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_api_workers(self):
+        self.as_customer()
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(reverse("api_workers")).status_code, 200)
+
+    def test_api_staff_bookings(self):
+        self.as_superuser()
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("api_staff_bookings"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_api_booking_events(self):
+        self.as_superuser()
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("api_booking_events"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_worker_calendar_feed(self):
+        url = ical.feed_url(self.worker.pk)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_live_bookings_requires_asgi(self):
+        self.as_customer()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse("live_bookings")).status_code, 501)
+
+    # Staff pages
+
+    def test_worker_booking_detail(self):
+        self.as_superuser()
+        url = reverse("worker_booking_detail", args=[self.booking.pk])
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_worker_booking_response(self):
+        self.as_superuser()
+        url = reverse("worker_booking_detail", args=[self.booking.pk])
+        with self.assertNumQueries(8):
+            response = self.client.post(url, {"action": "accept"})
+        self.assertEqual(response.status_code, 302)
+
+    # Superuser admin
+
+    def test_admin_index(self):
+        self.as_superuser()
+        # Page views are recorded and summarised in the telemetry database.
+        with self.assertNumQueries(20), self.assertNumQueries(2, using="telemetry"):
+            response = self.client.get(reverse("superuser_admin:index"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_index_with_archive(self):
+        self.as_superuser()
+        url = reverse("superuser_admin:index") + "?include_archived=1"
+        with self.assertNumQueries(24), self.assertNumQueries(2, using="telemetry"):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_admin_analytics_series(self):
+        self.as_superuser()
+        url = reverse("superuser_admin:analytics_series", args=["hourly_mix"])
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_admin_capacity_report(self):
+        self.as_superuser()
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("superuser_admin:capacity_report"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_cohort_report(self):
+        self.as_superuser()
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("superuser_admin:cohort_report"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_snapshot_report(self):
+        self.as_superuser()
+        with tempfile.TemporaryDirectory() as root, override_settings(SCHEDULER_SNAPSHOT_DIR=root):
+            snapshot.refresh()
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse("superuser_admin:snapshot_report"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Cancellations by client age")
+
+    def test_booking_changelist(self):
+        self.as_superuser()
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("superuser_admin:scheduler_booking_changelist"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_worker_changelist(self):
+        self.as_superuser()
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("superuser_admin:scheduler_worker_changelist"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_worker_changeform(self):
+        self.as_superuser()
+        url = reverse("superuser_admin:scheduler_worker_change", args=[self.worker.pk])
+        with self.assertNumQueries(9):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_worker_addform(self):
+        self.as_superuser()
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("superuser_admin:scheduler_worker_add"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_archived_booking_changelist(self):
+        self.as_superuser()
+        url = reverse("superuser_admin:scheduler_archivedbooking_changelist")
+        with self.assertNumQueries(5):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_request_profile_changelist(self):
+        self.as_superuser()
+        url = reverse("superuser_admin:scheduler_requestprofile_changelist")
+        with self.assertNumQueries(3), self.assertNumQueries(5, using="telemetry"):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+@override_settings(SCHEDULER_TELEMETRY_DB="telemetry")
+class SmallDatasetQueryBudgetTests(QueryBudgetMixin, TestCase):
+    dataset = {"workers": 2, "clients": 2, "bookings_per_client": 2}
+
+
+@override_settings(SCHEDULER_TELEMETRY_DB="telemetry")
+class LargeDatasetQueryBudgetTests(QueryBudgetMixin, TestCase):
+    dataset = {"workers": 12, "clients": 25, "bookings_per_client": 8}
+
+
+class AnalyticsSeriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = get_user_model().objects.create_user("analytics-client")
+        # 23:30 UTC is 08:30 the next morning in Tokyo.
+        day = timezone.now().date() - timedelta(days=30)
+        self.visit = datetime.combine(day, time(23, 30), tzinfo=dt_timezone.utc)
+        Booking.objects.create(
+            user=self.customer,
+            service_type="standard",
+            scheduled_for=self.visit,
+            address="1 Chart Lane",
+        )
+
+    def test_buckets_follow_the_requested_timezone(self):
+        window = {"start": (self.visit - timedelta(days=2)).date().isoformat()}
+        utc = analytics.build_series("hourly_mix", tz_name="UTC", **window)
+        tokyo = analytics.build_series("hourly_mix", tz_name="Asia/Tokyo", **window)
+
+        self.assertEqual([p["label"] for p in utc["points"] if p["total"]], ["23:00"])
+        self.assertEqual([p["label"] for p in tokyo["points"] if p["total"]], ["08:00"])
+        weekdays = analytics.build_series("weekday_mix", tz_name="Asia/Tokyo", **window)
+        local_day = self.visit.astimezone(ZoneInfo("Asia/Tokyo")).strftime("%A")
+        self.assertEqual([p["label"] for p in weekdays["points"] if p["total"]], [local_day])
+
+    def test_range_validation(self):
+        today = timezone.now().date()
+        bad = [
+            {"start": "1900-01-01"},
+            {"start": "2020-01-01", "end": "2021-06-01"},
+            {"start": today.isoformat(), "end": (today - timedelta(days=1)).isoformat()},
+            {"start": "yesterday"},
+            {"tz_name": "Mars/Olympus_Mons"},
+        ]
+        for params in bad:
+            with self.subTest(params=params):
+                with self.assertRaises(analytics.AnalyticsQueryError):
+                    analytics.build_series("rush_trend", **params)
+
+        series = analytics.build_series(
+            "rush_trend", start=(today - timedelta(days=365)).isoformat(), granularity="day"
+        )
+        self.assertIsNone(series["end"])
+
+    def test_impossible_dates_are_rejected(self):
+        admin = get_user_model().objects.create_superuser("analytics-admin", None, "pass-12345")
+        self.client.force_login(admin)
+        url = reverse("superuser_admin:analytics_series", args=["weekday_mix"])
+        impossible = [{"start": "2024-02-30"}, {"end": "2024-13-01"}, {"start": "2024-01-01T25:00"}]
+        for params in impossible:
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("Invalid date", response.json()["error"])
+
+
+class RosterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.anna = Worker.objects.create(name="Anna Roster", service_focus="deep")
+        self.ben = Worker.objects.create(name="Ben Roster", service_focus="standard")
+        self.customer = get_user_model().objects.create_user("roster-client")
+
+    def names(self):
+        return [record.name for record in roster.get_roster()]
+
+    def test_worker_changes_bump_the_version(self):
+        self.assertEqual(self.names(), ["Anna Roster", "Ben Roster"])
+        with self.assertNumQueries(0):
+            self.names()
+
+        version = roster.current_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.anna.name = "Anna Renamed"
+            self.anna.save()
+        self.assertGreater(roster.current_version(), version)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.names(), ["Anna Renamed", "Ben Roster"])
+
+        version = roster.current_version()
+        self.ben.is_active = False
+        self.ben.save()
+        self.assertGreater(roster.current_version(), version)
+        self.assertEqual(self.names(), ["Anna Renamed"])
+        self.assertIsNone(roster.get_active_worker(self.ben.pk))
+
+        version = roster.current_version()
+        self.anna.delete()
+        self.assertGreater(roster.current_version(), version)
+        self.assertEqual(self.names(), [])
+
+    def test_other_processes_rebuild_after_a_bump(self):
+        # Another process holds the snapshot it loaded before the change; only
+        # the version in the shared cache tells it to reload.
+        roster.get_roster()
+        stale = roster._snapshot
+        self.anna.name = "Anna Elsewhere"
+        self.anna.save()
+        with mock.patch.object(roster, "_snapshot", stale):
+            with self.assertNumQueries(1):
+                self.assertEqual(self.names(), ["Anna Elsewhere", "Ben Roster"])
+            with self.assertNumQueries(0):
+                self.names()
+
+    def form(self, worker):
+        return BookingForm(
+            data={
+                "service_type": "deep",
+                "scheduled_for": (timezone.localtime() + timedelta(days=3)).strftime(
+                    "%Y-%m-%dT%H:%M"
+                ),
+                "address": "3 Roster Road",
+                "notes": "",
+                "worker": worker,
+            }
+        )
+
+    def test_booking_form_only_accepts_active_workers(self):
+        self.ben.is_active = False
+        self.ben.save()
+        deleted = Worker.objects.create(name="Gone Roster", service_focus="deep")
+        deleted_id = deleted.pk
+        deleted.delete()
+        for worker in (self.ben.pk, deleted_id, 999999, "not-a-number"):
+            with self.subTest(worker=worker):
+                form = self.form(worker)
+                self.assertFalse(form.is_valid())
+                self.assertEqual(form.errors.as_data()["worker"][0].code, "invalid_choice")
+
+        form = self.form(self.anna.pk)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data["worker"], roster.get_active_worker(self.anna.pk))
+        booking = form.save(commit=False)
+        booking.user = self.customer
+        booking.save()
+        self.assertEqual(booking.worker_id, self.anna.pk)
+        self.assertTrue(self.form("").is_valid())
+
+
+class WorkerCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = get_user_model().objects.create_user("counter-client", password="pass-12345")
+        cls.first = Worker.objects.create(name="First", service_focus="standard")
+        cls.second = Worker.objects.create(name="Second", service_focus="deep")
+
+    def book(self, **fields):
+        defaults = {
+            "user": self.customer,
+            "service_type": "standard",
+            "scheduled_for": timezone.now() + timedelta(days=2),
+            "address": "1 Counter Lane",
+            "worker": self.first,
+        }
+        return Booking.objects.create(**{**defaults, **fields})
+
+    def counts(self, worker):
+        worker.refresh_from_db()
+        return {name: getattr(worker, name) for name in counters.COUNTERS}
+
+    def test_create_status_change_and_reassignment(self):
+        booking = self.book()
+        self.assertEqual(
+            self.counts(self.first),
+            {"booking_count": 1, "completed_count": 0, "cancelled_count": 0, "accepted_count": 0},
+        )
+        self.assertEqual(self.first.next_booking_at, booking.scheduled_for)
+
+        booking.worker_response = "accepted"
+        booking.save()
+        booking.status = "cancelled"
+        booking.save(update_fields=["status", "updated_at"])
+        self.assertEqual(self.counts(self.first)["accepted_count"], 1)
+        self.assertEqual(self.counts(self.first)["cancelled_count"], 1)
+        self.assertIsNone(self.first.next_booking_at)
+
+        booking.worker = self.second
+        booking.save()
+        self.assertEqual(self.counts(self.first)["booking_count"], 0)
+        self.assertEqual(self.counts(self.second)["cancelled_count"], 1)
+
+        booking.delete()
+        self.assertEqual(self.counts(self.second)["booking_count"], 0)
+
+    def test_archival_keeps_lifetime_totals(self):
+        booking = self.book(status="completed", scheduled_for=timezone.now() - timedelta(days=400))
+        archive_batch([booking.pk])
+        self.assertEqual(self.counts(self.first)["completed_count"], 1)
+        self.assertEqual(counters.reconcile(), 0)
+
+    def test_reconcile_repairs_drift(self):
+        self.book()
+        Worker.objects.filter(pk=self.first.pk).update(booking_count=7, next_booking_at=None)
+        self.assertEqual(counters.reconcile(), 1)
+        self.assertEqual(self.counts(self.first)["booking_count"], 1)
+        self.assertIsNotNone(self.first.next_booking_at)
+
+
+    def test_decrements_stop_at_zero_after_drift(self):
+        booking = self.book(status="completed")
+        Worker.objects.filter(pk=self.first.pk).update(booking_count=0, completed_count=0)
+        booking.status = "cancelled"
+        booking.save()
+        booking.delete()
+        self.assertEqual(
+            self.counts(self.first),
+            {"booking_count": 0, "completed_count": 0, "cancelled_count": 0, "accepted_count": 0},
+        )
+
+    def test_sweep_moves_next_booking_past_started_visits(self):
+        later = self.book(scheduled_for=timezone.now() + timedelta(days=3))
+        started = self.book(scheduled_for=timezone.now() + timedelta(days=1))
+        # As if the clock had moved past the first visit.
+        past = timezone.now() - timedelta(minutes=10)
+        Booking.objects.filter(pk=started.pk).update(scheduled_for=past)
+        Worker.objects.filter(pk=self.first.pk).update(next_booking_at=past)
+        sweeper.sweep()
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.next_booking_at, later.scheduled_for)
+
+class ClientProfileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = get_user_model().objects.create_user("alice", password="pass-12345")
+        cls.bob = get_user_model().objects.create_user("bob", password="pass-12345")
+
+    def book(self, user, days, **fields):
+        return Booking.objects.create(
+            user=user,
+            service_type="standard",
+            scheduled_for=timezone.now() + timedelta(days=days),
+            address="2 Profile Road",
+            **fields,
+        )
+
+    def profile(self, user):
+        return ClientProfile.objects.get(user=user)
+
+    def test_profile_created_at_signup(self):
+        profile = self.profile(self.alice)
+        self.assertEqual(profile.cohort, clients.cohort_for(self.alice.date_joined))
+        self.assertEqual(profile.booking_count, 0)
+
+    def test_totals_and_span_follow_booking_changes(self):
+        early = self.book(self.alice, 1, rush_cleaning=True)
+        late = self.book(self.alice, 9)
+        profile = self.profile(self.alice)
+        self.assertEqual((profile.booking_count, profile.rush_count), (2, 1))
+        self.assertEqual(profile.first_booking_at, early.scheduled_for)
+        self.assertEqual(profile.last_booking_at, late.scheduled_for)
+
+        late.status = "cancelled"
+        late.save()
+        self.assertEqual(self.profile(self.alice).cancelled_count, 1)
+
+        late.user = self.bob
+        late.save()
+        self.assertEqual(self.profile(self.alice).last_booking_at, early.scheduled_for)
+        self.assertEqual(self.profile(self.bob).cancelled_count, 1)
+
+        early.delete()
+        profile = self.profile(self.alice)
+        self.assertEqual(profile.booking_count, 0)
+        self.assertIsNone(profile.first_booking_at)
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.book(self.alice, -3, status="cancelled")
+        self.book(self.bob, 4, rush_cleaning=True)
+        fields = ("booking_count", "cancelled_count", "rush_count", "first_booking_at")
+        before = list(ClientProfile.objects.order_by("pk").values(*fields))
+        ClientProfile.objects.all().delete()
+        clients.rebuild()
+        self.assertEqual(list(ClientProfile.objects.order_by("pk").values(*fields)), before)
+
+    def test_cohort_report(self):
+        self.book(self.alice, 0)
+        self.book(self.alice, 1)
+        report = clients.cohort_report(months=3)
+        row = report["rows"][0]
+        self.assertEqual((row["clients"], row["booked"], row["repeat"]), (2, 1, 1))
+        self.assertEqual(row["retention"][0], 50.0)
+
+
+class PointGeocoder(geo.BaseGeocoder):
+    name = "points"
+    points = {"1 north street": (51.52, -0.10)}
+
+    def geocode(self, address):
+        if address == "explode":
+            raise OSError("provider down")
+        return self.points.get(geo.normalize_address(address))
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.customer = get_user_model().objects.create_user("archive-client")
+
+    def book(self, days_ago, status="completed"):
+        return Booking.objects.create(
+            user=self.customer,
+            service_type="standard",
+            scheduled_for=timezone.now() - timedelta(days=days_ago),
+            address="1 Cold Storage Way",
+            status=status,
+        )
+
+    def test_moves_old_finished_bookings_in_batches(self):
+        old = [self.book(400), self.book(500, status="cancelled"), self.book(600)]
+        recent = self.book(30)
+        pending = self.book(400, status="pending")
+
+        self.assertEqual(archive_bookings(batch_size=2, max_batches=1), 2)
+        self.assertEqual(archive_bookings(batch_size=2), 1)
+
+        self.assertEqual(
+            set(ArchivedBooking.objects.values_list("pk", flat=True)), {b.pk for b in old}
+        )
+        self.assertEqual(
+            set(Booking.objects.values_list("pk", flat=True)), {recent.pk, pending.pk}
+        )
+        archived = ArchivedBooking.objects.get(pk=old[1].pk)
+        self.assertEqual(
+            (archived.status, archived.address, archived.scheduled_for),
+            ("cancelled", old[1].address, old[1].scheduled_for),
+        )
+
+    def test_id_clash_keeps_the_hot_row(self):
+        booking = self.book(400)
+        ArchivedBooking.objects.create(
+            id=booking.pk,
+            user=self.customer,
+            service_type="deep",
+            scheduled_for=booking.scheduled_for,
+            address="Somewhere else",
+            status="completed",
+            created_at=booking.created_at,
+        )
+
+        with self.assertRaises(IntegrityError):
+            archive_batch([booking.pk])
+        self.assertTrue(Booking.objects.filter(pk=booking.pk).exists())
+        with self.assertRaisesMessage(CommandError, "already in the archive"):
+            call_command("archive_bookings", stdout=io.StringIO())
+        self.assertTrue(Booking.objects.filter(pk=booking.pk).exists())
+
+
+class GeoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(geo, "_geocoder", PointGeocoder())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.customer = get_user_model().objects.create_user("geo-client")
+
+    def book(self, address):
+        return Booking.objects.create(
+            user=self.customer,
+            service_type="standard",
+            scheduled_for=timezone.now() + timedelta(days=1),
+            address=address,
+        )
+
+    def test_bookings_are_located_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            booking = self.book("1 North  Street")
+        booking.refresh_from_db()
+        self.assertIsNone(booking.latitude)
+        for callback in callbacks:
+            callback()
+        booking.refresh_from_db()
+        self.assertEqual((booking.latitude, booking.longitude), (51.52, -0.10))
+
+    def test_failing_geocoder_does_not_break_saves(self):
+        with self.assertLogs("scheduler.geo", "WARNING"), self.captureOnCommitCallbacks(execute=True):
+            booking = self.book("explode")
+        booking.refresh_from_db()
+        self.assertIsNone(booking.latitude)
+        self.assertFalse(GeocodedAddress.objects.exists())
+
+    def test_grid_nearest_matches_brute_force(self):
+        rng = np.random.default_rng(3)
+        homes = [
+            (pk, (51.3 + rng.random() * 0.5, -0.5 + rng.random() * 0.8)) for pk in range(1, 120)
+        ]
+        homes.append((500, (55.9, -3.2)))  # far outlier, beyond the ring limit
+        grid = geo.WorkerGrid(homes)
+        for origin in [(51.5, -0.12), (51.31, 0.29), (56.0, -3.0)]:
+            for exclude in [(), {pk for pk, _ in homes[:40]}]:
+                expected = sorted(
+                    (geo.haversine_km(origin, home), pk)
+                    for pk, home in homes
+                    if pk not in exclude
+                )[:5]
+                self.assertEqual(grid.nearest(origin, limit=5, exclude=exclude), expected)
+        self.assertEqual(geo.WorkerGrid([]).nearest((51.5, 0.0)), [])
+
+    def test_route_order_is_shortest(self):
+        rng = np.random.default_rng(7)
+        home = (51.5, -0.1)
+        for _ in range(5):
+            points = [tuple(p) for p in 51.4 + rng.random((6, 2)) * [0.2, 0.3] - [0, 0.25]]
+            order = geo.order_route(points, home)
+            self.assertEqual(sorted(order), list(range(len(points))))
+            best = min(
+                geo.route_length(points, perm, home)
+                for perm in itertools.permutations(range(len(points)))
+            )
+            # 2-opt is a local search: never worse than nearest-neighbour, close to optimal.
+            self.assertLessEqual(geo.route_length(points, order, home), best * 1.1)
+        # Crossing legs are always uncrossed.
+        square = [(0.0, 0.0), (1.0, 1.0), (0.0, 1.0), (1.0, 0.0)]
+        order = geo.order_route(square)
+        self.assertAlmostEqual(
+            geo.route_length(square, order),
+            min(geo.route_length(square, p) for p in itertools.permutations(range(4))),
+        )
+
+    def test_worker_form_ignores_impossible_route_dates(self):
+        admin_user = get_user_model().objects.create_superuser("geo-admin", None, "pass-12345")
+        worker = Worker.objects.create(name="Router", service_focus="standard")
+        self.client.force_login(admin_user)
+        url = reverse("superuser_admin:scheduler_worker_change", args=[worker.pk])
+        response = self.client.get(url, {"route_date": "2026-02-31"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["worker_route"]["date"], timezone.localdate())
+
+    def test_day_route_keeps_booked_times(self):
+        worker = Worker(name="Router", home_latitude=0.0, home_longitude=0.0)
+        day = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+        def visit(hour, lat, lon):
+            return Booking.objects.create(
+                user=self.customer,
+                service_type="standard",
+                scheduled_for=day + timedelta(hours=hour),
+                address=f"{lat}, {lon}",
+                latitude=lat,
+                longitude=lon,
+            )
+
+        # The shortest trip would start with the 15:00 visit next door.
+        late_nearby = visit(15, 0.01, 0.0)
+        early_far = visit(9, 1.0, 0.0)
+        noon_a = visit(12, 0.5, 0.5)
+        noon_b = visit(12, 1.0, 0.1)
+        stops, total_km, unlocated = geo.plan_day_route(
+            worker, [late_nearby, noon_a, early_far, noon_b]
+        )
+
+        self.assertEqual(
+            [stop["booking"] for stop in stops], [early_far, noon_b, noon_a, late_nearby]
+        )
+        points = [(stop["booking"].latitude, stop["booking"].longitude) for stop in stops]
+        self.assertEqual(total_km, round(geo.route_length(points, range(4), (0.0, 0.0)), 1))
+        self.assertEqual(unlocated, [])
+
+
+class ProfilingMiddlewareTests(TestCase):
+    databases = {"default", "telemetry"}
+
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user("profiled-staff", is_staff=True)
+        self.customer = get_user_model().objects.create_user("profiled-client")
+
+    def test_header_profiles_staff_requests_only(self):
+        self.client.force_login(self.customer)
+        self.client.get(reverse("about"), headers={"X-Profile": "1"})
+        self.assertFalse(RequestProfile.objects.exists())
+
+        self.client.force_login(self.staff)
+        self.client.get(reverse("about"), headers={"X-Profile": "1"})
+        profile = RequestProfile.objects.get()
+        self.assertEqual(
+            (profile.trigger, profile.user_id, profile.status_code), ("header", self.staff.pk, 200)
+        )
+        self.assertTrue(profile.top_functions)
+
+    def test_session_flag_stops_when_staff_rights_are_revoked(self):
+        admin_user = get_user_model().objects.create_superuser("profiled-admin")
+        self.client.force_login(admin_user)
+        toggle = reverse("superuser_admin:scheduler_requestprofile_toggle")
+        self.client.post(toggle)
+        self.assertEqual(self.client.cookies[profiling.COOKIE_NAME].value, "1")
+        self.client.get(reverse("about"))
+        self.assertEqual(RequestProfile.objects.get().trigger, "session")
+
+        get_user_model().objects.filter(pk=admin_user.pk).update(is_staff=False)
+        self.client.get(reverse("about"))
+        self.assertEqual(RequestProfile.objects.count(), 1)
+
+    def test_session_switch_off_clears_the_cookie(self):
+        self.client.force_login(get_user_model().objects.create_superuser("profiled-admin"))
+        toggle = reverse("superuser_admin:scheduler_requestprofile_toggle")
+        self.client.post(toggle)
+        self.client.post(toggle)
+        self.assertEqual(self.client.cookies[profiling.COOKIE_NAME].value, "")
+        profiled = RequestProfile.objects.count()
+        self.client.get(reverse("about"))
+        self.assertEqual(RequestProfile.objects.count(), profiled)
+
+    def test_user_and_session_are_only_read_when_asked_for(self):
+        middleware = profiling.ProfilingMiddleware(lambda request: HttpResponse("ok"))
+        request = RequestFactory().get("/")
+        request.user = mock.Mock(is_staff=False)
+        request.session = mock.Mock()
+
+        middleware(request)
+        self.assertEqual(request.user.mock_calls, [])
+        request.session.get.assert_not_called()
+
+        request.COOKIES[profiling.COOKIE_NAME] = "1"
+        middleware(request)
+        request.session.get.assert_not_called()
+
+        request.user = self.staff
+        request.session.get.return_value = False
+        middleware(request)
+        request.session.get.assert_called_once_with(profiling.SESSION_KEY)
+
+    def test_streaming_responses_are_passed_through(self):
+        response = StreamingHttpResponse(iter([b"data: 1\n\n"]))
+        middleware = profiling.ProfilingMiddleware(lambda request: response)
+        request = RequestFactory().get("/", headers={"X-Profile": "1"})
+        request.user = self.staff
+
+        self.assertIs(middleware(request), response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    async def test_async_chain_stays_async(self):
+        async def view(request):
+            return HttpResponse("ok")
+
+        middleware = profiling.ProfilingMiddleware(view)
+        request = RequestFactory().get("/", headers={"X-Profile": "1"})
+
+        async def auser():
+            return self.staff
+
+        request.auser = auser
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(request)
+
+        self.assertEqual(response.status_code, 200)
+        profile = await RequestProfile.objects.aget()
+        self.assertEqual((profile.trigger, profile.user_id), ("header", self.staff.pk))
+
+
+class LiveEventTests(TestCase):
+    def setUp(self):
+        self.broker = live.InProcessBroker()
+        patcher = mock.patch.object(live, "_broker", self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.customer = get_user_model().objects.create_user("live-client")
+        self.other = get_user_model().objects.create_user("live-other")
+
+    async def test_broker_fans_out_and_drops_the_oldest_when_full(self):
+        async with self.broker.subscribe() as first, self.broker.subscribe() as second:
+            for number in range(live.QUEUE_SIZE + 1):
+                self.broker.publish({"type": "created", "number": number})
+            await asyncio.sleep(0)
+            self.assertEqual((await first.get())["number"], 1)
+            self.assertEqual(second.qsize(), live.QUEUE_SIZE)
+        self.assertFalse(self.broker._subscribers)
+
+    def test_bookings_are_published_after_commit(self):
+        booking = Booking.objects.create(
+            user=self.customer,
+            service_type="standard",
+            scheduled_for=timezone.now() + timedelta(days=2),
+            address="8 Stream Street",
+        )
+        with mock.patch.object(self.broker, "publish") as publish:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                live.publish_booking(booking, "created")
+                publish.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        [event], _ = publish.call_args
+        self.assertEqual(
+            (event["type"], event["booking"], event["user"], event["status"]),
+            ("created", booking.pk, self.customer.pk, booking.status),
+        )
+        self.assertTrue(BookingEvent.objects.filter(booking_id=booking.pk, kind="created").exists())
+
+    def test_format_event(self):
+        event = {
+            "type": "cancelled",
+            "booking": 7,
+            "at": datetime(2027, 1, 2, tzinfo=dt_timezone.utc),
+        }
+        self.assertEqual(
+            live.format_event(event),
+            'event: cancelled\ndata: {"type": "cancelled", "booking": 7, '
+            '"at": "2027-01-02T00:00:00Z"}\n\n',
+        )
+
+    async def test_stream_requires_login(self):
+        response = await self.async_client.get(reverse("live_bookings"))
+        self.assertEqual(response.status_code, 401)
+
+    async def test_customers_only_receive_their_own_bookings(self):
+        await self.async_client.aforce_login(self.customer)
+        response = await self.async_client.get(reverse("live_bookings"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b"retry: 5000\n\n")
+        reading = asyncio.ensure_future(anext(chunks))
+        while not self.broker._subscribers:
+            await asyncio.sleep(0)
+        self.broker.publish({"type": "created", "booking": 1, "user": self.other.pk})
+        self.broker.publish({"type": "created", "booking": 2, "user": self.customer.pk})
+
+        chunk = await asyncio.wait_for(reading, timeout=5)
+        self.assertIn(b'"booking": 2', chunk)
+        self.assertTrue(chunk.startswith(b"event: created\n"))
+        # A client disconnect cancels the pending read, as the ASGI handler does.
+        reading = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0)
+        reading.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reading
+        self.assertFalse(self.broker._subscribers)
+
+
+class IdempotencyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = get_user_model().objects.create_user("retry", password="pass-12345")
+
+    def setUp(self):
+        self.client.force_login(self.customer)
+
+    def booking_data(self, key):
+        return {
+            "service_type": "standard",
+            "scheduled_for": (timezone.localtime() + timedelta(days=2)).strftime("%Y-%m-%dT%H:%M"),
+            "address": "3 Retry Street",
+            "idempotency_key": key,
+        }
+
+    def test_replayed_booking_is_not_created_twice(self):
+        data = self.booking_data(uuid.uuid4().hex)
+        self.client.post(reverse("dashboard"), data)
+        response = self.client.post(reverse("dashboard"), data)
+        self.assertRedirects(response, reverse("dashboard"))
+        self.assertEqual(self.customer.bookings.count(), 1)
+
+    def test_invalid_form_keeps_key_for_resubmission(self):
+        key = uuid.uuid4().hex
+        response = self.client.post(reverse("dashboard"), {**self.booking_data(key), "address": ""})
+        self.assertEqual(response.context["idempotency_key"], key)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.client.post(reverse("dashboard"), self.booking_data(key))
+        self.assertEqual(self.customer.bookings.count(), 1)
+
+    def test_expired_key_is_accepted_again(self):
+        data = self.booking_data(uuid.uuid4().hex)
+        self.client.post(reverse("dashboard"), data)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.client.post(reverse("dashboard"), data)
+        self.assertEqual(self.customer.bookings.count(), 2)
+        self.assertEqual(idempotency.purge_expired(), 0)
+
+    def test_cancel_and_application_replays(self):
+        booking = Booking.objects.create(
+            user=self.customer,
+            service_type="standard",
+            scheduled_for=timezone.now() + timedelta(days=1),
+            address="3 Retry Street",
+        )
+        key = uuid.uuid4().hex
+        url = reverse("cancel_booking", args=[booking.pk])
+        self.client.post(url, {"idempotency_key": key})
+        # Session, user, booking, then a failed claim and one lookup: no writes.
+        with self.assertNumQueries(10):
+            self.client.post(url, {"idempotency_key": key})
+
+        application = {
+            "full_name": "Retry Applicant",
+            "email": "retry@example.com",
+            "experience": "Plenty.",
+            "idempotency_key": key,
+        }
+        self.client.post(reverse("work_with_us"), application)
+        self.client.post(reverse("work_with_us"), application)
+        self.assertEqual(Application.objects.count(), 1)
+
+
+
+class JsonApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset(workers=5, clients=2, bookings_per_client=7)
+        cls.customer = cls.data["clients"][0]
+        cls.staff = get_user_model().objects.create_user("api-staff", is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            ids.extend(row["id"] for row in body["results"])
+            url = body["next"]
+            pages += 1
+        return ids, pages
+
+    def test_keyset_pages_cover_every_booking_once(self):
+        self.client.force_login(self.customer)
+        ids, pages = self.walk(reverse("api_bookings") + "?limit=3&fields=id")
+        expected = list(
+            Booking.objects.filter(user=self.customer)
+            .order_by("scheduled_for", "id")
+            .values_list("id", flat=True)
+        )
+        self.assertEqual((ids, pages), (expected, 3))
+
+    def test_staff_feed_pages_through_shared_timestamps(self):
+        Booking.objects.update(updated_at=timezone.now())
+        self.client.force_login(self.staff)
+        ids, _ = self.walk(reverse("api_staff_bookings") + "?limit=4&fields=id")
+        self.assertEqual(sorted(ids), sorted(Booking.objects.values_list("id", flat=True)))
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_workers_page_from_the_roster(self):
+        self.client.force_login(self.customer)
+        ids, pages = self.walk(reverse("api_workers") + "?limit=2&fields=id")
+        self.assertEqual((sorted(ids), pages), (sorted(w.pk for w in self.data["workers"]), 3))
+
+    def test_etag_revalidation(self):
+        self.client.force_login(self.customer)
+        url = reverse("api_bookings")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        booking = Booking.objects.filter(user=self.customer).first()
+        booking.address = "2 Changed Lane"
+        booking.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_since_accepts_naive_datetimes(self):
+        self.client.force_login(self.staff)
+        moment = timezone.localtime().replace(tzinfo=None) - timedelta(days=1)
+        response = self.client.get(reverse("api_staff_bookings"), {"since": moment.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), Booking.objects.count())
+
+    def test_bad_input_is_rejected(self):
+        self.client.force_login(self.staff)
+        bookings, workers = reverse("api_staff_bookings"), reverse("api_workers")
+        cases = [
+            (bookings, {"cursor": "not base64!"}),
+            (bookings, {"cursor": api.encode_cursor(["2026-01-01T00:00:00", "abc"])}),
+            (bookings, {"cursor": api.encode_cursor(["2026-99-01T00:00:00", 1])}),
+            (bookings, {"cursor": api.encode_cursor([5, 1])}),
+            (bookings, {"cursor": api.encode_cursor(["2026-01-01T00:00:00"])}),
+            (bookings, {"since": "2026-13-45T00:00:00"}),
+            (bookings, {"since": "yesterday"}),
+            (bookings, {"worker": "abc"}),
+            (bookings, {"limit": "many"}),
+            (bookings, {"fields": "id,secret"}),
+            (workers, {"cursor": api.encode_cursor([1, "Seed Worker 001"])}),
+            (workers, {"cursor": api.encode_cursor(["Seed Worker 001", True])}),
+        ]
+        for url, params in cases:
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+    def test_auth(self):
+        self.assertEqual(self.client.get(reverse("api_bookings")).status_code, 401)
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get(reverse("api_staff_bookings")).status_code, 403)
+
+class BookingEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.customer = User.objects.create_user("feed", password="pass-12345")
+        cls.superuser = User.objects.create_superuser("feed-admin", "feed@example.com", "pass-12345")
+        cls.worker = Worker.objects.create(name="Feed Worker", service_focus="standard")
+
+    def create_booking(self, **fields):
+        fields = {
+            "user": self.customer,
+            "service_type": "standard",
+            "scheduled_for": timezone.now() + timedelta(days=2),
+            "address": "5 Feed Lane",
+            **fields,
+        }
+        return Booking.objects.create(**fields)
+
+    def kinds(self):
+        return list(BookingEvent.objects.order_by("pk").values_list("kind", flat=True))
+
+    def test_views_record_events(self):
+        self.client.force_login(self.customer)
+        self.client.post(
+            reverse("dashboard"),
+            {
+                "service_type": "standard",
+                "scheduled_for": (timezone.localtime() + timedelta(days=2)).strftime("%Y-%m-%dT%H:%M"),
+                "address": "5 Feed Lane",
+                "worker": self.worker.pk,
+            },
+        )
+        booking = self.customer.bookings.get()
+        self.client.force_login(self.superuser)
+        self.client.post(reverse("worker_booking_detail", args=[booking.pk]), {"action": "accept"})
+        self.client.force_login(self.customer)
+        self.client.post(reverse("cancel_booking", args=[booking.pk]))
+
+        self.assertEqual(
+            self.kinds(), ["booking.created", "booking.worker_response", "booking.status"]
+        )
+        last = BookingEvent.objects.latest("pk")
+        self.assertEqual((last.booking_id, last.user_id, last.worker_id), (booking.pk, self.customer.pk, self.worker.pk))
+        self.assertEqual(last.data["status"], "cancelled")
+        self.assertEqual(last.data["worker_response"], "accepted")
+
+    def test_admin_saves_and_deletes_record_events(self):
+        booking = self.create_booking()
+        self.client.force_login(self.superuser)
+        local = timezone.localtime(booking.scheduled_for)
+        self.client.post(
+            reverse("superuser_admin:scheduler_booking_change", args=[booking.pk]),
+            {
+                "user": self.customer.pk,
+                "service_type": "deep",
+                "scheduled_for_0": local.strftime("%Y-%m-%d"),
+                "scheduled_for_1": local.strftime("%H:%M:%S"),
+                "address": booking.address,
+                "notes": "",
+                "worker": self.worker.pk,
+                "status": "scheduled",
+                "worker_response": "pending",
+            },
+        )
+        self.client.post(
+            reverse("superuser_admin:scheduler_booking_changelist"),
+            {"action": "delete_selected", "_selected_action": [booking.pk], "post": "yes"},
+        )
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(self.kinds(), ["booking.updated", "booking.deleted"])
+        self.assertEqual(BookingEvent.objects.latest("pk").data["service_type"], "deep")
+
+    def test_rolled_back_change_leaves_no_event(self):
+        booking = self.create_booking()
+        try:
+            with transaction.atomic():
+                events.record(booking, "booking.status")
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(BookingEvent.objects.exists())
+
+    def test_api_cursor_resumes_after_last_event(self):
+        booking = self.create_booking()
+        for kind in ("booking.created", "booking.status", "booking.updated"):
+            events.record(booking, kind)
+        self.client.force_login(self.superuser)
+        url = reverse("api_booking_events")
+
+        first = self.client.get(url, {"limit": 2}).json()
+        self.assertEqual([e["kind"] for e in first["results"]], ["booking.created", "booking.status"])
+        self.assertTrue(first["has_more"])
+        second = self.client.get(url, {"limit": 2, "cursor": first["cursor"]}).json()
+        self.assertEqual([e["kind"] for e in second["results"]], ["booking.updated"])
+        self.assertFalse(second["has_more"])
+
+        # An empty page keeps the cursor, and later events are picked up from it.
+        idle = self.client.get(url, {"cursor": second["cursor"]}).json()
+        self.assertEqual((idle["results"], idle["cursor"]), ([], second["cursor"]))
+        events.record(booking, "booking.deleted")
+        resumed = self.client.get(url, {"cursor": idle["cursor"]}).json()
+        self.assertEqual([e["kind"] for e in resumed["results"]], ["booking.deleted"])
+
+        self.assertEqual(self.client.get(url, {"cursor": "nope"}).status_code, 400)
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_gaps_stay_open_until_filled_or_expired(self):
+        booking = self.create_booking()
+        first, in_flight, last = (
+            events.record(booking, kind)
+            for kind in ("booking.created", "booking.status", "booking.updated")
+        )
+        # The middle event's transaction has not committed yet.
+        missing = in_flight.pk
+        in_flight.delete()
+        self.assertEqual([e.pk for e in events.read_batch()], [first.pk])
+        self.assertEqual(events.read_batch(first.pk), [])
+        later = timezone.now() + timedelta(seconds=120)
+        self.assertEqual(events.read_batch(first.pk, now=later), [])
+
+        in_flight.pk = missing
+        in_flight.save(force_insert=True)
+        self.assertEqual([e.pk for e in events.read_batch(first.pk)], [missing, last.pk])
+
+        in_flight.delete()
+        # Long past the bound the gap counts as a rolled-back transaction.
+        with self.settings(SCHEDULER_EVENT_GAP_SECONDS=60):
+            self.assertEqual([e.pk for e in events.read_batch(first.pk, now=later)], [last.pk])
+
+    def test_consumer_advances_only_after_handler_succeeds(self):
+        booking = self.create_booking()
+        for kind in ("booking.created", "booking.status", "booking.updated"):
+            events.record(booking, kind)
+
+        def fail(batch):
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            events.consume("sync", fail)
+        self.assertFalse(EventConsumer.objects.filter(name="sync", position__gt=0).exists())
+
+        seen = []
+        events.consume("sync", seen.extend, limit=2)
+        events.consume("sync", seen.extend, limit=2)
+        self.assertEqual([e.kind for e in seen], ["booking.created", "booking.status", "booking.updated"])
+        self.assertEqual(EventConsumer.objects.get(name="sync").position, seen[-1].pk)
+        self.assertEqual(events.consume("sync", seen.extend), [])
+
+        out = io.StringIO()
+        call_command("consume_booking_events", consumer="cli", batch_size=2, stdout=out, stderr=io.StringIO())
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([line["id"] for line in lines], [e.pk for e in seen])
+
+class WorkerThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = Path(tempfile.mkdtemp())
+        cls.addClassCleanup(shutil.rmtree, cls.tmp)
+        source = cls.tmp / "portrait.png"
+        Image.effect_noise((1600, 1200), 64).convert("RGB").save(source)
+        cls.photo_url = source.as_uri()
+        cls.settings_override = override_settings(
+            SCHEDULER_THUMBNAIL_ROOT=str(cls.tmp / "thumbs"),
+            SCHEDULER_THUMBNAIL_SCHEMES=("file",),
+        )
+        cls.settings_override.enable()
+        cls.addClassCleanup(cls.settings_override.disable)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_worker(self, **fields):
+        worker = Worker.objects.create(
+            name="Pictured", service_focus="standard", photo_url=self.photo_url, **fields
+        )
+        call_command("build_thumbnails", stdout=io.StringIO())
+        return worker
+
+    def test_thumbnails_built_out_of_band(self):
+        with mock.patch.object(thumbnails, "fetch") as fetch:
+            with self.captureOnCommitCallbacks(execute=True):
+                worker = Worker.objects.create(
+                    name="Pictured", service_focus="standard", photo_url=self.photo_url
+                )
+        fetch.assert_not_called()
+        self.assertEqual(Worker.objects.get(pk=worker.pk).photo_thumb, "")
+
+        out = io.StringIO()
+        call_command("build_thumbnails", stdout=out)
+        self.assertIn("Built 1 thumbnail(s), 0 failed.", out.getvalue())
+        worker.refresh_from_db()
+        self.assertRegex(worker.photo_thumb, r"^[0-9a-f]{24}$")
+        storage = thumbnails.get_storage()
+        for ext in thumbnails.FORMATS:
+            self.assertLess(storage.size(f"{worker.photo_thumb}.{ext}"), 20 * 1024)
+        self.assertEqual(roster.get_active_worker(worker.pk).photo_thumb, worker.photo_thumb)
+
+    def test_thumbnail_served_immutable(self):
+        worker = self.create_worker()
+        worker.refresh_from_db()
+        url = worker.avatar["webp"]
+        response = self.client.get(url)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("immutable", response["Cache-Control"])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(reverse("worker_thumbnail", args=["nope.png"])).status_code, 404)
+
+    def test_photo_view_never_fetches(self):
+        remote = "https://example.com/huge.jpg"
+        worker = Worker.objects.create(name="Lazy", service_focus="deep", photo_url=remote)
+        url = reverse("worker_photo", args=[worker.pk])
+        with mock.patch.object(thumbnails, "fetch") as fetch:
+            response = self.client.get(url + "?format=webp")
+        fetch.assert_not_called()
+        self.assertRedirects(response, remote, fetch_redirect_response=False)
+
+        Worker.objects.filter(pk=worker.pk).update(photo_url=self.photo_url)
+        call_command("build_thumbnails", stdout=io.StringIO())
+        worker.refresh_from_db()
+        self.assertRedirects(
+            self.client.get(url + "?format=webp"),
+            thumbnails.thumbnail_url(worker.photo_thumb, "webp"),
+            fetch_redirect_response=False,
+        )
+
+    def test_dashboard_uses_thumbnails(self):
+        worker = self.create_worker()
+        user = get_user_model().objects.create_user("viewer", password="pass-12345")
+        self.client.force_login(user)
+        content = self.client.get(reverse("dashboard")).content.decode()
+        self.assertNotIn(self.photo_url, content)
+        self.assertIn(Worker.objects.get(pk=worker.pk).avatar["jpg"], content)
+
+
+
+class DashboardFragmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = get_user_model().objects.create_user("fragments", password="pass-12345")
+        cls.deep = Worker.objects.create(name="Dana Deep", service_focus="deep")
+        cls.standard = Worker.objects.create(name="Sam Standard", service_focus="standard")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.customer)
+
+    def test_worker_fragment_filters_and_keeps_selection(self):
+        url = reverse("dashboard_workers_fragment")
+        html = self.client.get(url, {"team_service": "deep"}).content.decode()
+        self.assertIn("Dana Deep", html)
+        self.assertNotIn("Sam Standard", html)
+        self.assertNotIn("<html", html)
+
+        html = self.client.get(
+            url, {"team_service": "deep", "worker": self.standard.pk}
+        ).content.decode()
+        self.assertIn(f'is-selected" data-worker-id="{self.standard.pk}"', html)
+
+        cards = self.client.get(url, {"part": "cards", "team_search": "sam"}).content.decode()
+        self.assertIn("Choose Sam Standard", cards)
+        self.assertNotIn("Dana Deep", cards)
+        self.assertEqual(self.client.get(url, {"part": "nope"}).status_code, 404)
+
+    def test_worker_fragment_follows_the_roster_version(self):
+        url = reverse("dashboard_workers_fragment")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Worker.objects.create(name="Nina New", service_focus="deep")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Nina New", response.content.decode())
+
+    def test_bookings_fragment_changes_with_bookings(self):
+        url = reverse("dashboard_bookings_fragment")
+        first = self.client.get(url)
+        self.assertIn("No cleanings scheduled yet.", first.content.decode())
+        booking = Booking.objects.create(
+            user=self.customer,
+            service_type="deep",
+            scheduled_for=timezone.now() + timedelta(days=1),
+            address="8 Fragment Row",
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'data-booking-id="{booking.pk}"', response.content.decode())
+        self.assertIn(reverse("cancel_booking", args=[booking.pk]), response.content.decode())
+
+    def test_bookings_fragment_follows_worker_changes(self):
+        url = reverse("dashboard_bookings_fragment")
+        Booking.objects.create(
+            user=self.customer,
+            service_type="deep",
+            scheduled_for=timezone.now() + timedelta(days=1),
+            address="9 Fragment Row",
+            worker=self.deep,
+        )
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.deep.name = "Dana Renamed"
+        self.deep.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Dana Renamed", response.content.decode())
+
+    def test_fragments_require_login(self):
+        self.client.logout()
+        response = self.client.get(reverse("dashboard_workers_fragment"))
+        self.assertEqual(response.status_code, 302)
+
+
+class WorkerCalendarFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = get_user_model().objects.create_user("ical", password="pass-12345")
+        cls.worker = Worker.objects.create(name="Cal Worker", service_focus="deep")
+        cls.other = Worker.objects.create(name="Other Worker", service_focus="deep")
+
+    def setUp(self):
+        cache.clear()
+
+    def book(self, worker, days, **fields):
+        return Booking.objects.create(
+            user=self.customer,
+            service_type="deep",
+            scheduled_for=timezone.now() + timedelta(days=days),
+            address="9 Calendar Court, Flat 2",
+            worker=worker,
+            **fields,
+        )
+
+    def test_feed_lists_the_workers_bookings_in_the_window(self):
+        upcoming = self.book(self.worker, 2, notes="Key under the mat; ring twice")
+        old = self.book(self.worker, -60)
+        elsewhere = self.book(self.other, 2)
+        response = self.client.get(ical.feed_url(self.worker.pk))
+        body = response.content.decode()
+
+        self.assertEqual(response["Content-Type"], "text/calendar; charset=utf-8")
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertIn(f"UID:booking-{upcoming.pk}@", body)
+        self.assertNotIn(f"UID:booking-{old.pk}@", body)
+        self.assertNotIn(f"UID:booking-{elsewhere.pk}@", body)
+        self.assertIn("LOCATION:9 Calendar Court\\, Flat 2", body)
+        self.assertIn("STATUS:TENTATIVE", body)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in body.split("\r\n")))
+
+    def test_unchanged_feed_is_not_modified(self):
+        booking = self.book(self.worker, 2)
+        url = ical.feed_url(self.worker.pk)
+        response = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        booking.status = "cancelled"
+        booking.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("STATUS:CANCELLED", response.content.decode())
+
+    def test_if_modified_since_alone_never_hides_a_deletion(self):
+        kept = self.book(self.worker, 2)
+        removed = self.book(self.worker, 3)
+        url = ical.feed_url(self.worker.pk)
+        response = self.client.get(url)
+        self.assertFalse(response.has_header("Last-Modified"))
+
+        removed.delete()
+        since = http_date((timezone.now() + timedelta(minutes=1)).timestamp())
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn(f"UID:booking-{kept.pk}@", body)
+        self.assertNotIn(f"UID:booking-{removed.pk}@", body)
+
+    def test_rendered_events_are_cached_per_booking_version(self):
+        booking = self.book(self.worker, 2)
+        self.client.get(ical.feed_url(self.worker.pk))
+        self.assertIsNotNone(cache.get(ical.chunk_key(booking)))
+        cache.set(ical.chunk_key(booking), "BEGIN:VEVENT\r\nX-CACHED:1\r\nEND:VEVENT\r\n")
+        self.book(self.worker, 3)
+        self.assertIn("X-CACHED:1", self.client.get(ical.feed_url(self.worker.pk)).content.decode())
+
+    def test_tampered_or_inactive_tokens_are_rejected(self):
+        token = ical.feed_token(self.worker.pk)
+        url = reverse("worker_calendar", args=[token[:-1] + ("A" if token[-1] != "A" else "B")])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.other.is_active = False
+        self.other.save()
+        self.assertEqual(self.client.get(ical.feed_url(self.other.pk)).status_code, 404)
+
+
+class CapacityForecastTests(TestCase):
+    london = ZoneInfo("Europe/London")
+
+    def test_working_hours_follow_local_time_across_dst(self):
+        with timezone.override(self.london):
+            # Saturday, then the Sunday the clocks go forward, then Monday.
+            start = capacity.horizon_start(datetime(2027, 3, 27, 12, tzinfo=self.london))
+            mask = capacity.working_mask(start, 3)
+            opens = [
+                capacity.slot_time(start, index, timedelta(hours=1))
+                for index in np.flatnonzero(mask)
+            ]
+
+        self.assertEqual(len(opens), 20)
+        self.assertEqual({moment.hour for moment in opens}, set(range(8, 18)))
+        self.assertEqual({moment.day for moment in opens}, {27, 29})
+
+    def test_forecast_counts_booked_working_hours(self):
+        worker = Worker.objects.create(name="Cap Worker", service_focus="standard")
+        customer = get_user_model().objects.create_user("capacity-client")
+        with timezone.override(self.london):
+            now = datetime(2027, 3, 28, 6, tzinfo=self.london)
+            # 17:00 to 20:00 on the Monday after the change: one working hour.
+            Booking.objects.create(
+                user=customer,
+                service_type="standard",
+                scheduled_for=datetime(2027, 3, 29, 17, tzinfo=self.london),
+                address="5 Forecast Road",
+                worker=worker,
+            )
+            forecast = capacity.build_forecast(weeks=1, now=now)
+
+        self.assertEqual(forecast["working_hours_per_worker"], 60)
+        [row] = forecast["workers"]
+        self.assertEqual((row["booked_hours"], row["overbooked_hours"]), (1.0, 0.0))
+        standard = next(s for s in forecast["services"] if s["code"] == "standard")
+        self.assertEqual((standard["workers"], standard["booked_hours"]), (1, 3.0))
+
+
+class AvailabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = get_user_model().objects.create_user("slots", password="pass-12345")
+        cls.anna = Worker.objects.create(name="Anna Avail", service_focus="deep")
+        cls.ben = Worker.objects.create(name="Ben Busy", service_focus="deep")
+
+    def setUp(self):
+        cache.clear()
+        # A Monday at 06:00, so the working day starts two hours later.
+        self.now = capacity.horizon_start(timezone.now()) + timedelta(hours=6)
+        self.now -= timedelta(days=self.now.weekday())
+        self.day = capacity.horizon_start(self.now)
+
+    def at(self, hour, day=0):
+        return self.day + timedelta(days=day, hours=hour)
+
+    def book(self, worker, hour, service_type="standard", day=0):
+        return Booking.objects.create(
+            user=self.customer,
+            service_type=service_type,
+            scheduled_for=self.at(hour, day),
+            address="4 Slot Street",
+            worker=worker,
+        )
+
+    def starts(self, service_type, **kwargs):
+        slots = availability.open_slots(
+            service_type, end=self.at(24), now=self.now, limit=100, **kwargs
+        )
+        return [(slot["start"].hour, slot["start"].minute) for slot in slots]
+
+    def test_bitset_search_matches_a_brute_force_scan(self):
+        free = np.zeros((2, 200), dtype=bool)
+        free[0, 10:40] = True
+        free[0, 50:52] = True
+        free[1, 63:80] = True
+        for length in (1, 2, 6, 10, 12):
+            runs = availability.run_starts(availability.pack(free), length)
+            bits = np.unpackbits(runs.view(np.uint8), axis=1, bitorder="little")[:, :200]
+            for row in range(2):
+                expected = [
+                    i for i in range(200 - length + 1) if free[row, i : i + length].all()
+                ]
+                self.assertEqual(np.flatnonzero(bits[row]).tolist(), expected)
+
+    def test_open_slots_respect_bookings_and_working_hours(self):
+        self.book(self.ben, 8, "standard")
+        roster.get_roster()
+        with self.assertNumQueries(1):
+            availability.get_engine(self.now)
+        # Deep cleans take five hours and the day ends at 18:00.
+        self.assertEqual(self.starts("deep", worker_id=self.anna.pk)[-1], (13, 0))
+        self.assertEqual(self.starts("deep", worker_id=self.ben.pk)[0], (11, 0))
+        any_worker = availability.open_slots("deep", end=self.at(9), now=self.now)
+        self.assertEqual([w.name for w in any_worker[0]["workers"]], ["Anna Avail"])
+
+    def test_booking_changes_are_applied_without_a_rebuild(self):
+        availability.get_engine(self.now)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = self.book(self.anna, 8, "deep")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.starts("standard", worker_id=self.anna.pk)[0], (13, 0))
+        booking.scheduled_for = self.at(10)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.starts("standard", worker_id=self.anna.pk)[0], (15, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.starts("standard", worker_id=self.anna.pk)), 15)
+
+    def test_slots_follow_local_time_across_dst(self):
+        london = ZoneInfo("Europe/London")
+        with timezone.override(london):
+            # Clocks go forward at 01:00 on Sunday 28 March 2027.
+            now = datetime(2027, 3, 28, 6, tzinfo=london)
+            Booking.objects.create(
+                user=self.customer,
+                service_type="standard",
+                scheduled_for=datetime(2027, 3, 29, 8, tzinfo=london),
+                address="4 Slot Street",
+                worker=self.anna,
+            )
+            slots = availability.open_slots(
+                "standard", worker_id=self.anna.pk, now=now, limit=100, per_day=1
+            )
+            starts = [slot["start"] for slot in slots]
+
+        self.assertEqual(starts[0], datetime(2027, 3, 29, 11, tzinfo=london))
+        self.assertEqual(starts[1], datetime(2027, 3, 30, 8, tzinfo=london))
+        self.assertEqual(len({start.date() for start in starts}), len(starts))
+
+    def test_dashboard_shows_open_times(self):
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse("dashboard"))
+        self.assertTrue(response.context["open_slots"])
+        self.assertContains(response, 'class="btn btn-sm btn-outline-secondary open-slot"')
+        response = self.client.get(
+            reverse("dashboard_slots_fragment"), {"service_type": "move_out", "worker": self.anna.pk}
+        )
+        self.assertContains(response, "free")
+
+
+class StatusSweeperTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = get_user_model().objects.create_user("sweep", password="pass-12345")
+        cls.worker = Worker.objects.create(name="Sweep Worker", service_focus="standard")
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def book(self, hours_ago, status="scheduled", worker=None):
+        return Booking.objects.create(
+            user=self.customer,
+            service_type="standard",
+            scheduled_for=self.now - timedelta(hours=hours_ago),
+            address="6 Sweep Street",
+            worker=worker or self.worker,
+            status=status,
+        )
+
+    def statuses(self, bookings):
+        return [Booking.objects.get(pk=booking.pk).status for booking in bookings]
+
+    def test_elapsed_bookings_advance(self):
+        done = [self.book(48), self.book(4, status="in_progress")]
+        running = self.book(1)
+        future = self.book(-5)
+        cancelled = self.book(10, status="cancelled")
+
+        moved = sweeper.sweep(batch_size=2, now=self.now)
+        self.assertEqual(moved, {"in_progress": 1, "completed": 2})
+        self.assertEqual(self.statuses(done), ["completed", "completed"])
+        self.assertEqual(self.statuses([running, future, cancelled]), ["in_progress", "scheduled", "cancelled"])
+
+        self.worker.refresh_from_db()
+        self.assertEqual(self.worker.completed_count, 2)
+        self.assertEqual(counters.reconcile(), 0)
+        self.assertEqual(
+            sorted(BookingEvent.objects.values_list("booking_id", flat=True)),
+            sorted(booking.pk for booking in [*done, running]),
+        )
+        self.assertEqual(BookingEvent.objects.filter(data__status="completed").count(), 2)
+        self.assertEqual(sweeper.sweep(now=self.now), {"in_progress": 0, "completed": 0})
+
+    def test_resumes_from_checkpoint(self):
+        oldest, middle, newest = self.book(30), self.book(20), self.book(10)
+        sweeper.sweep(batch_size=1, max_batches=2, now=self.now)
+        checkpoint = SweepCheckpoint.objects.get(name=sweeper.CHECKPOINT_NAME)
+        self.assertEqual(checkpoint.booking_id, middle.pk)
+        self.assertEqual(self.statuses([oldest, middle, newest]), ["completed", "completed", "scheduled"])
+
+        # The next run continues after the checkpoint and resets it at the end.
+        with self.assertNumQueries(14):
+            sweeper.sweep(batch_size=1, max_batches=2, now=self.now)
+        self.assertEqual(self.statuses([newest]), ["completed"])
+        checkpoint.refresh_from_db()
+        self.assertIsNone(checkpoint.scheduled_for)
+
+    def test_concurrent_changes_are_not_overwritten(self):
+        booking = self.book(30)
+        classify = sweeper.target_status
+
+        def cancel_then_classify(row, now):
+            # Cancelled after the batch was read, before it is updated.
+            Booking.objects.filter(pk=row.pk).update(status="cancelled")
+            return classify(row, now)
+
+        with mock.patch.object(sweeper, "target_status", side_effect=cancel_then_classify):
+            moved = sweeper.sweep(now=self.now)
+        self.assertEqual(moved["completed"], 0)
+        self.assertEqual(self.statuses([booking]), ["cancelled"])
+        self.assertFalse(BookingEvent.objects.exists())
+
+    def test_rescheduled_bookings_are_not_completed(self):
+        booking = self.book(30)
+        classify = sweeper.target_status
+
+        def reschedule_then_classify(row, now):
+            Booking.objects.filter(pk=row.pk).update(scheduled_for=now + timedelta(days=2))
+            return classify(row, now)
+
+        with mock.patch.object(sweeper, "target_status", side_effect=reschedule_then_classify):
+            moved = sweeper.sweep(now=self.now)
+        self.assertEqual(moved, {"in_progress": 0, "completed": 0})
+        self.assertEqual(self.statuses([booking]), ["scheduled"])
+
+    def test_writes_are_stamped_with_the_write_time(self):
+        booking = self.book(30)
+        started = timezone.now()
+        sweeper.sweep(now=self.now - timedelta(hours=1))
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, "completed")
+        self.assertGreaterEqual(booking.updated_at, started)
+        event = BookingEvent.objects.get(booking_id=booking.pk)
+        # Serialized at millisecond precision.
+        self.assertLess(
+            abs(parse_datetime(event.data["updated_at"]) - booking.updated_at),
+            timedelta(milliseconds=1),
+        )
+
+    def test_command(self):
+        self.book(30)
+        out = io.StringIO()
+        call_command("sweep_booking_statuses", dry_run=True, stdout=out)
+        self.assertIn("1 booking(s) to check.", out.getvalue())
+        call_command("sweep_booking_statuses", stdout=out)
+        self.assertIn("Started 0 and completed 1 booking(s).", out.getvalue())
+
+
+class QueryAuditTests(TestCase):
+    databases = {"default", "telemetry"}
+
+    def setUp(self):
+        # The test databases are already throwaway; building another set from
+        # inside a test would replace them under the open transaction.
+        patcher = mock.patch.object(
+            query_audit, "scratch_databases", side_effect=contextlib.nullcontext
+        )
+        self.scratch = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_explains_every_path_and_rolls_back(self):
+        out = io.StringIO()
+        call_command("explain_queries", json=True, workers=3, clients=4, stdout=out)
+        results = json.loads(out.getvalue())
+
+        self.scratch.assert_called_once_with()
+
+        self.assertEqual({row["path"] for row in results}, set(query_audit.PATHS))
+        self.assertTrue(all(row["plan"] and row["calls"] >= 1 for row in results))
+        schedule = [
+            row
+            for row in results
+            if row["path"] == "worker-change-form" and 'FROM "scheduler_booking"' in row["sql"]
+        ]
+        self.assertTrue(schedule)
+        self.assertFalse(any("scheduler_booking" in row["full_scans"] for row in schedule))
+        self.assertFalse(Worker.objects.exists())
+        self.assertFalse(get_user_model().objects.filter(username=query_audit.AUDIT_USERNAME).exists())
+
+    def test_table_report(self):
+        out = io.StringIO()
+        call_command("explain_queries", path=["booking-form"], workers=2, clients=2, stdout=out)
+        self.assertIn("booking-form", out.getvalue())
+        self.assertRegex(out.getvalue(), r"\d+ statement\(s\); \d+ with full scans")
+
+    def test_postgresql_plan_reports_sorts_and_grouping(self):
+        plan = [
+            {
+                "Plan": {
+                    "Node Type": "Sort",
+                    "Sort Key": ["count(*) DESC"],
+                    "Plan Rows": 4,
+                    "Plans": [
+                        {
+                            "Node Type": "Aggregate",
+                            "Strategy": "Hashed",
+                            "Group Key": ["scheduler_booking.worker_id"],
+                            "Plans": [
+                                {"Node Type": "Seq Scan", "Relation Name": "scheduler_booking"}
+                            ],
+                        }
+                    ],
+                }
+            }
+        ]
+        cursor = mock.Mock()
+        cursor.fetchone.return_value = (plan,)
+
+        result = query_audit.explain_postgresql(cursor, "SELECT 1", ())
+
+        self.assertEqual(result["rows"], 4)
+        self.assertEqual(result["full_scans"], ["scheduler_booking"])
+        self.assertEqual(
+            result["temp_btrees"],
+            ["SORT count(*) DESC", "GROUP BY (HASHED) scheduler_booking.worker_id"],
+        )
+
+
+class BookingSnapshotTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.tmp)
+        cls.settings_override = override_settings(SCHEDULER_SNAPSHOT_DIR=cls.tmp)
+        cls.settings_override.enable()
+        cls.addClassCleanup(cls.settings_override.disable)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset(workers=3, clients=6, bookings_per_client=4)
+
+    def setUp(self):
+        snapshot.refresh(full=True)
+
+    def test_metrics_match_the_database(self):
+        now = timezone.now()
+        metrics = snapshot.load().dashboard_metrics(now=now)
+        recent = Booking.objects.filter(scheduled_for__gte=now - timedelta(days=30))
+        self.assertEqual(metrics["total_bookings"], Booking.objects.count())
+        self.assertEqual(
+            {row["code"]: row["total"] for row in metrics["status_summary"]},
+            {code: Booking.objects.filter(status=code).count() for code, _ in Booking.STATUS_CHOICES},
+        )
+        self.assertEqual(metrics["rush_total"], Booking.objects.filter(rush_cleaning=True).count())
+        self.assertEqual(metrics["unassigned_total"], Booking.objects.filter(worker__isnull=True).count())
+        self.assertEqual(metrics["recent_cancelled"], recent.filter(status="cancelled").count())
+        self.assertEqual(
+            metrics["created_last_7"],
+            Booking.objects.filter(created_at__gte=now - timedelta(days=7)).count(),
+        )
+        by_hour = snapshot.load().rush_ratio_by_hour()
+        self.assertEqual(sum(row["bookings"] for row in by_hour), Booking.objects.count())
+        by_age = snapshot.load().cancellations_by_client_age()
+        self.assertEqual(
+            sum(row["cancelled"] for row in by_age), Booking.objects.filter(status="cancelled").count()
+        )
+
+    def test_incremental_refresh(self):
+        changed = self.data["bookings"][0]
+        changed.status = "cancelled"
+        changed.save()
+        removed = self.data["bookings"][1].pk
+        Booking.objects.filter(pk=removed).delete()
+
+        stats = snapshot.refresh()
+        self.assertEqual((stats["appended"], stats["removed"]), (0, 1))
+        view = snapshot.load()
+        ids = np.asarray(view.columns["id"])
+        self.assertEqual(view.codes["status"][view.columns["status"][ids == changed.pk][0]], "cancelled")
+        self.assertFalse(view.live[ids == removed][0])
+        self.assertEqual(view.total, Booking.objects.count())
+
+        # Ids can commit out of order; appended rows are kept sorted.
+        top = int(ids.max())
+        for pk in (top + 10, top + 5):
+            Booking.objects.create(
+                pk=pk,
+                user=self.data["clients"][0],
+                service_type="office",
+                scheduled_for=timezone.now() + timedelta(days=2),
+                address="9 Snapshot Road",
+            )
+            self.assertEqual(snapshot.refresh()["appended"], 1)
+        view = snapshot.load()
+        ids = np.asarray(view.columns["id"])
+        self.assertTrue((np.diff(ids) > 0).all())
+        self.assertEqual(view.codes["service"][view.columns["service"][ids == top + 5][0]], "office")
+        self.assertEqual(view.total, Booking.objects.count())
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command("build_booking_snapshot", full=True, stdout=out)
+        self.assertIn(f"has {Booking.objects.count()} booking(s)", out.getvalue())
+
+@override_settings(SCHEDULER_TELEMETRY_DB="telemetry")
+class TelemetryDatabaseTests(TestCase):
+    databases = {"default", "telemetry"}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = get_user_model().objects.create_superuser(
+            "telemetry-admin", "telemetry@example.com", "pass-12345"
+        )
+
+    def test_page_views_are_written_to_the_telemetry_database(self):
+        self.client.force_login(self.superuser)
+        self.client.get(reverse("superuser_admin:index"))
+        view = AdminPageView.objects.get()
+        self.assertEqual(view._state.db, "telemetry")
+        self.assertEqual(view.user, self.superuser)
+        router = telemetry.TelemetryRouter()
+        self.assertFalse(router.allow_migrate("default", "scheduler", "adminpageview"))
+        self.assertTrue(router.allow_migrate("telemetry", "scheduler", "adminpageview"))
+
+    def test_telemetry_stays_on_default_until_enabled(self):
+        # A deployment that only ran the usual single ``migrate``.
+        with self.settings(SCHEDULER_TELEMETRY_DB=None):
+            self.client.force_login(self.superuser)
+            self.assertEqual(self.client.get(reverse("superuser_admin:index")).status_code, 200)
+            self.assertEqual(AdminPageView.objects.get()._state.db, "default")
+            self.assertIsNone(
+                telemetry.TelemetryRouter().allow_migrate("default", "scheduler", "adminpageview")
+            )
+        with self.settings(SCHEDULER_TELEMETRY_DB="missing"):
+            self.assertEqual(telemetry.get_alias(), "default")
+
+    def test_deleting_a_user_detaches_their_telemetry(self):
+        user = get_user_model().objects.create_user("leaving", password="pass-12345")
+        AdminPageView.objects.create(user=user, path="/admin/")
+        RequestProfile.objects.create(
+            user=user,
+            method="GET",
+            path="/",
+            status_code=200,
+            duration_ms=1,
+            trigger="header",
+            stats=b"",
+        )
+        user.delete()
+        self.assertEqual(AdminPageView.objects.get().user_id, None)
+        self.assertEqual(RequestProfile.objects.get().user_id, None)
+
+    def test_prune_keeps_the_retention_window(self):
+        old = AdminPageView.objects.create(path="/admin/")
+        AdminPageView.objects.filter(pk=old.pk).update(viewed_at=timezone.now() - timedelta(days=40))
+        AdminPageView.objects.create(path="/admin/")
+        self.assertEqual(telemetry.prune(days=30)["admin page views"], 1)
+        self.assertEqual(AdminPageView.objects.count(), 1)
+
+        out = io.StringIO()
+        call_command("prune_telemetry", days=1, stdout=out)
+        self.assertIn("Deleted 0 admin page views.", out.getvalue())
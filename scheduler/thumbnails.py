@@ -0,0 +1,185 @@
+"""Local thumbnails for worker photos.
+
+``Worker.photo_url`` may point at a multi-megabyte image on any host. Each
+photo is fetched once, cropped to a small square and stored next to the app
+as WebP and JPEG files named by a hash of the source image, so the files are
+never rewritten and are served with a one-year ``immutable`` cache lifetime.
+The stored name stem lives in ``Worker.photo_thumb``.
+
+Fetching and resizing a remote image can take seconds, so it never happens
+inside a request: ``manage.py build_thumbnails`` builds the missing ones and
+should run on a schedule (every few minutes). Until a worker's thumbnail
+exists, ``worker_photo`` redirects to the original image.
+
+Settings:
+
+* ``SCHEDULER_THUMBNAIL_ROOT`` - directory for the files
+  (default ``<BASE_DIR>/media/thumbnails``).
+* ``SCHEDULER_THUMBNAIL_SCHEMES`` - URL schemes photos may be fetched from
+  (default ``("http", "https")``; tests add ``"file"``).
+"""
+
+import hashlib
+import io
+import logging
+import re
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.shortcuts import get_object_or_404, redirect
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import roster
+from .models import Worker
+
+logger = logging.getLogger(__name__)
+
+SIZE = 96
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+FETCH_TIMEOUT = 5
+FAILURE_BACKOFF_SECONDS = 600
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 6}),
+    "jpg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+NAME_PATTERN = re.compile(r"^(?P<stem>[0-9a-f]{24})\.(?P<ext>webp|jpg)$")
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+def get_storage():
+    root = getattr(settings, "SCHEDULER_THUMBNAIL_ROOT", None)
+    return FileSystemStorage(location=root or Path(settings.BASE_DIR) / "media" / "thumbnails")
+
+
+def fetch(url):
+    """Download ``url`` (capped at ``MAX_SOURCE_BYTES``) from an allowed scheme."""
+    schemes = getattr(settings, "SCHEDULER_THUMBNAIL_SCHEMES", ("http", "https"))
+    if urllib.parse.urlsplit(url).scheme not in schemes:
+        raise ThumbnailError(f"Refusing to fetch {url!r}: scheme not allowed.")
+    request = urllib.request.Request(url, headers={"User-Agent": "ImproveClean thumbnails"})
+    try:
+        with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+            data = response.read(MAX_SOURCE_BYTES + 1)
+    except (OSError, ValueError) as exc:
+        raise ThumbnailError(f"Could not fetch {url!r}: {exc}") from exc
+    if len(data) > MAX_SOURCE_BYTES:
+        raise ThumbnailError(f"{url!r} is larger than {MAX_SOURCE_BYTES} bytes.")
+    return data
+
+
+def render(data):
+    """Square-crop ``data`` to ``SIZE`` pixels; returns ``{ext: bytes}``."""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            image = ImageOps.fit(image, (SIZE, SIZE), Image.Resampling.LANCZOS)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+        raise ThumbnailError(f"Not a usable image: {exc}") from exc
+    encoded = {}
+    for ext, (pil_format, _content_type, options) in FORMATS.items():
+        buffer = io.BytesIO()
+        image.save(buffer, pil_format, **options)
+        encoded[ext] = buffer.getvalue()
+    return encoded
+
+
+def store(data):
+    """Write thumbnails for the source image ``data`` and return their stem."""
+    stem = hashlib.sha256(data + f":{SIZE}".encode()).hexdigest()[:24]
+    storage = get_storage()
+    if all(storage.exists(f"{stem}.{ext}") for ext in FORMATS):
+        return stem
+    for ext, content in render(data).items():
+        name = f"{stem}.{ext}"
+        if not storage.exists(name):
+            storage.save(name, ContentFile(content))
+    return stem
+
+
+def build_for_worker(worker_id):
+    """Fetch and store the worker's photo thumbnail; returns the stem or ``None``.
+
+    Failures are logged and not retried for ``FAILURE_BACKOFF_SECONDS`` so a
+    broken URL does not trigger a fetch on every page view.
+    """
+    worker = Worker.objects.filter(pk=worker_id).values("photo_url").first()
+    if not worker or not worker["photo_url"]:
+        return None
+    url = worker["photo_url"]
+    failure_key = "scheduler:thumb-failed:" + hashlib.sha256(url.encode()).hexdigest()
+    if cache.get(failure_key):
+        return None
+    try:
+        stem = store(fetch(url))
+    except ThumbnailError as exc:
+        logger.warning("Thumbnail for worker %s failed: %s", worker_id, exc)
+        cache.set(failure_key, True, FAILURE_BACKOFF_SECONDS)
+        return None
+    # Only record the stem if the photo was not changed meanwhile; update()
+    # skips signals, so bump the roster version by hand.
+    if Worker.objects.filter(pk=worker_id, photo_url=url).update(photo_thumb=stem):
+        roster.invalidate()
+    return stem
+
+
+def thumbnail_url(stem, ext):
+    return reverse("worker_thumbnail", args=[f"{stem}.{ext}"])
+
+
+def avatar_urls(worker_id, photo_url, photo_thumb):
+    """``{"webp": url, "jpg": url}`` for a worker avatar, or ``None`` without a photo."""
+    if photo_thumb:
+        return {ext: thumbnail_url(photo_thumb, ext) for ext in FORMATS}
+    if photo_url:
+        lazy = reverse("worker_photo", args=[worker_id])
+        return {"webp": lazy + "?format=webp", "jpg": lazy}
+    return None
+
+
+@require_safe
+def thumbnail_file(request, name):
+    """Serve a stored thumbnail; names are content hashes, so cache forever."""
+    match = NAME_PATTERN.match(name)
+    if not match:
+        raise Http404("Unknown thumbnail.")
+    etag = f'"{match["stem"]}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+    else:
+        storage = get_storage()
+        if not storage.exists(name):
+            raise Http404("Unknown thumbnail.")
+        response = FileResponse(
+            storage.open(name), content_type=FORMATS[match["ext"]][1]
+        )
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    return response
+
+
+@require_safe
+def worker_photo(request, pk):
+    """Redirect to a worker's thumbnail, or to the original until one is built."""
+    worker = get_object_or_404(Worker.objects.only("photo_url", "photo_thumb"), pk=pk)
+    if worker.photo_thumb:
+        ext = "webp" if request.GET.get("format") == "webp" else "jpg"
+        response = redirect(thumbnail_url(worker.photo_thumb, ext))
+    elif worker.photo_url:
+        response = redirect(worker.photo_url)
+    else:
+        raise Http404("This worker has no photo.")
+    patch_cache_control(response, public=True, max_age=300)
+    return response
@@ -1,5 +1,15 @@
 from django.urls import path
 
+from .api import (
+    BookingEventFeedAPIView,
+    BookingListAPIView,
+    StaffBookingFeedAPIView,
+    WorkerListAPIView,
+)
+from .fragments import booking_table_fragment, slots_fragment, worker_fragment
+from .ical import worker_calendar
+from .live import live_booking_events
+from .thumbnails import thumbnail_file, worker_photo
 from .views import (
     AboutView,
     AccountView,
@@ -23,6 +33,13 @@ urlpatterns = [
     path("login/", AuthLoginView.as_view(), name="login"),
     path("logout/", AuthLogoutView.as_view(), name="logout"),
     path("dashboard/", DashboardView.as_view(), name="dashboard"),
+    path("dashboard/fragments/workers/", worker_fragment, name="dashboard_workers_fragment"),
+    path(
+        "dashboard/fragments/bookings/",
+        booking_table_fragment,
+        name="dashboard_bookings_fragment",
+    ),
+    path("dashboard/fragments/slots/", slots_fragment, name="dashboard_slots_fragment"),
     path("bookings/<int:pk>/cancel/", cancel_booking, name="cancel_booking"),
     path(
         "worker/bookings/<int:pk>/",
@@ -30,4 +47,20 @@ urlpatterns = [
         name="worker_booking_detail",
     ),
     path("work-with-us/", WorkWithUsView.as_view(), name="work_with_us"),
+    path("api/v1/bookings/", BookingListAPIView.as_view(), name="api_bookings"),
+    path("api/v1/workers/", WorkerListAPIView.as_view(), name="api_workers"),
+    path(
+        "api/v1/staff/bookings/",
+        StaffBookingFeedAPIView.as_view(),
+        name="api_staff_bookings",
+    ),
+    path(
+        "api/v1/staff/booking-events/",
+        BookingEventFeedAPIView.as_view(),
+        name="api_booking_events",
+    ),
+    path("calendar/workers/<str:token>/feed.ics", worker_calendar, name="worker_calendar"),
+    path("live/bookings/", live_booking_events, name="live_bookings"),
+    path("workers/<int:pk>/photo/", worker_photo, name="worker_photo"),
+    path("media/thumbnails/<str:name>", thumbnail_file, name="worker_thumbnail"),
 ]
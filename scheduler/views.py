@@ -5,19 +5,25 @@ from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.views import LoginView, LogoutView
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
 from django.views.generic import TemplateView
 from django.views.generic.edit import FormView
 
+from . import availability, idempotency
+from .archive import archived_history
+from .fragments import dashboard_slots, filter_workers
+from .geo import nearest_available_workers
+from .live import publish_booking
 from .forms import (
     BookingForm,
     SignupForm,
     StyledAuthenticationForm,
     WorkWithUsForm,
 )
-from .models import Booking, SERVICE_CHOICES, Worker
+from .models import Booking, ClientProfile, SERVICE_CHOICES
 
 
 class LandingView(TemplateView):
@@ -35,6 +41,14 @@ class ServicesView(TemplateView):
 class AccountView(LoginRequiredMixin, TemplateView):
     template_name = "scheduler/account.html"
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["upcoming_bookings"] = self.request.user.bookings.filter(
+            status__in=("scheduled", "in_progress")
+        ).count()
+        context["profile"] = ClientProfile.objects.filter(user=self.request.user).first()
+        return context
+
 
 class RegisterView(FormView):
     form_class = SignupForm
@@ -73,6 +87,10 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             self.request.user.bookings.select_related("worker").all()
         )
         context["bookings"] = bookings
+        include_archived = self.request.GET.get("history") == "all"
+        context["include_archived"] = include_archived
+        if include_archived:
+            context["archived_bookings"] = archived_history(self.request.user)
 
         form = kwargs.get("form") or BookingForm()
         context["form"] = form
@@ -80,15 +98,8 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         selected_worker_id = form["worker"].value()
         service_focus = self.request.GET.get("team_service")
         search_query = self.request.GET.get("team_search", "").strip()
-
-        workers = Worker.objects.filter(is_active=True)
-        if service_focus:
-            workers = workers.filter(service_focus=service_focus)
-        if search_query:
-            workers = workers.filter(name__icontains=search_query)
-        if selected_worker_id:
-            workers = workers | Worker.objects.filter(pk=selected_worker_id)
-        workers = workers.distinct().order_by("name")
+        workers = filter_workers(service_focus, search_query, selected_worker_id)
+        open_slots = dashboard_slots(form["service_type"].value(), selected_worker_id)
 
         context.update(
             {
@@ -97,7 +108,10 @@ class DashboardView(LoginRequiredMixin, TemplateView):
                 "team_search": search_query,
                 "service_choices": SERVICE_CHOICES,
                 "selected_worker_id": selected_worker_id,
+                "open_slots": open_slots,
+                "availability_days": availability.horizon_days(),
                 "rush_threshold_hours": 5,
+                "idempotency_key": idempotency.issue_key(self.request),
             }
         )
         return context
@@ -105,14 +119,18 @@ class DashboardView(LoginRequiredMixin, TemplateView):
     def post(self, request, *args, **kwargs):
         form = BookingForm(request.POST)
         if form.is_valid():
-            booking = form.save(commit=False)
-            booking.user = request.user
-            rush_threshold = timezone.now() + timedelta(hours=5)
-            booking.rush_cleaning = booking.scheduled_for <= rush_threshold
-            booking.save()
-            worker_text = (
-                f" with {booking.worker.name}" if booking.worker else ""
-            )
+            with transaction.atomic():
+                replay = idempotency.claim(request, "booking.create", reverse("dashboard"))
+                if replay is not None:
+                    return replay
+                booking = form.save(commit=False)
+                booking.user = request.user
+                rush_threshold = timezone.now() + timedelta(hours=5)
+                booking.rush_cleaning = booking.scheduled_for <= rush_threshold
+                booking.save()
+                publish_booking(booking, "booking.created")
+            worker = form.cleaned_data["worker"]
+            worker_text = f" with {worker.name}" if worker else ""
             rush_text = (
                 " Rush service applied automatically based on your requested time."
                 if booking.rush_cleaning
@@ -132,8 +150,13 @@ class DashboardView(LoginRequiredMixin, TemplateView):
 def cancel_booking(request, pk):
     booking = get_object_or_404(Booking, pk=pk, user=request.user)
     if request.method == "POST":
-        booking.status = "cancelled"
-        booking.save(update_fields=["status"])
+        with transaction.atomic():
+            replay = idempotency.claim(request, f"booking.cancel:{pk}", reverse("dashboard"))
+            if replay is not None:
+                return replay
+            booking.status = "cancelled"
+            booking.save(update_fields=["status", "updated_at"])
+            publish_booking(booking, "booking.status")
         messages.info(request, "The booking has been cancelled.")
     return redirect("dashboard")
 
@@ -156,6 +179,7 @@ class WorkerBookingDetailView(LoginRequiredMixin, UserPassesTestMixin, TemplateV
         context.update(
             {
                 "booking": booking,
+                "nearby_workers": nearest_available_workers(booking),
                 "back_url": self.request.GET.get("next") or reverse("superuser_admin:index"),
             }
         )
@@ -164,17 +188,17 @@ class WorkerBookingDetailView(LoginRequiredMixin, UserPassesTestMixin, TemplateV
     def post(self, request, *args, **kwargs):
         booking = self.get_booking()
         action = request.POST.get("action")
+        responses = {"accept": "accepted", "decline": "declined", "reset": "pending"}
+        if action in responses:
+            with transaction.atomic():
+                booking.worker_response = responses[action]
+                booking.save(update_fields=["worker_response", "updated_at"])
+                publish_booking(booking, "booking.worker_response")
         if action == "accept":
-            booking.worker_response = "accepted"
-            booking.save(update_fields=["worker_response"])
             messages.success(request, "The assignment has been marked as accepted.")
         elif action == "decline":
-            booking.worker_response = "declined"
-            booking.save(update_fields=["worker_response"])
             messages.warning(request, "The assignment has been marked as declined.")
         elif action == "reset":
-            booking.worker_response = "pending"
-            booking.save(update_fields=["worker_response"])
             messages.info(request, "The assignment response has been reset to pending.")
         else:
             messages.error(request, "Unknown action requested.")
@@ -190,8 +214,17 @@ class WorkWithUsView(FormView):
     form_class = WorkWithUsForm
     success_url = reverse_lazy("work_with_us")
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["idempotency_key"] = idempotency.issue_key(self.request)
+        return context
+
     def form_valid(self, form):
-        form.save()
+        with transaction.atomic():
+            replay = idempotency.claim(self.request, "application.create", self.get_success_url())
+            if replay is not None:
+                return replay
+            form.save()
         messages.success(
             self.request,
             "Thank you for reaching out! Our team will connect with you soon about opportunities at ImproveClean.",